@@ -21,7 +21,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = //your security key
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'django-insecure-set-DJANGO_SECRET_KEY')  # your security key
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'main.backends.router.ReplicaStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -79,24 +80,47 @@ WSGI_APPLICATION = 'chatbot.wsgi.application'
 
 
 # Disable MariaDB version check
-from django.db.backends.mysql.base import DatabaseWrapper
-DatabaseWrapper.check_database_version_supported = lambda *args, **kwargs: None
+from django.core.exceptions import ImproperlyConfigured
+try:
+    from django.db.backends.mysql.base import DatabaseWrapper
+    DatabaseWrapper.check_database_version_supported = lambda *args, **kwargs: None
+except ImproperlyConfigured:
+    # mysqlclient not installed: only the SQLite stand-in (settings_sqlite) can run
+    pass
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'xyz',  //your database
+        # Pooled MySQL backend (main/backends). Connections go back to the pool
+        # at the end of each request instead of being closed.
+        'ENGINE': 'main.backends.mysql',
+        'NAME': os.environ.get('DB_NAME', 'xyz'),  # your database
         'USER': 'root',
-        'PASSWORD': 'xyz', //your datbase password
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'xyz'),  # your database password
         'HOST': 'localhost',
         'PORT': '3307', 
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'isolation_level': 'read committed',
         },
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'ENABLED': True,
+            'MAX_SIZE': 10,   # per worker process
+            'TIMEOUT': 5,     # seconds to wait when all connections are busy
+            'RECYCLE': 3600,  # stay below MySQL wait_timeout
+            'PRE_PING': True,
+        },
     }
 }
 
+# Read replicas (main/backends/router.py): add them to DATABASES (same options as 'default',
+# plus 'TEST': {'MIRROR': 'default'}) and list their aliases here
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['main.backends.router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5   # a session reads from the primary this long after it wrote (> replica lag)
+REPLICA_HEALTH_CHECK_INTERVAL = 5  # seconds between SELECT 1 checks of a replica, per process
+
 # Silence system checks about MySQL version
 SILENCED_SYSTEM_CHECKS = ['mysql.W002']
 DJANGO_NO_RETURNING = True 
@@ -108,7 +132,7 @@ DJANGO_NO_RETURNING = True
 
 HAYSTACK_CONNECTIONS = {
     'default': {
-        'ENGINE': 'haystack.backends.whoosh_backend.WhooshEngine',
+        'ENGINE': 'main.backends.whoosh.CachedWhooshEngine',
         'PATH': os.path.join(BASE_DIR, 'whoosh_index'),
     },
 }
@@ -155,6 +179,12 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Export downloads (main/utils/downloads.py)
+EXPORT_SENDFILE = None       # 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx): front end sends the bytes
+EXPORT_ACCEL_PREFIX = '/protected-exports/'  # nginx internal location aliased to MEDIA_ROOT/exports/
+EXPORT_GZIP_CSV = True       # gzip CSV exports for clients that accept it (compressed copy kept next to the file)
+EXPORT_DOWNLOAD_MAX_AGE = 3600  # seconds browsers may reuse a download without revalidating
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -163,9 +193,91 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 HAYSTACK_CONNECTIONS = {
     'default': {
-        'ENGINE': 'haystack.backends.whoosh_backend.WhooshEngine',
+        'ENGINE': 'main.backends.whoosh.CachedWhooshEngine',  # reuses the searcher (main/backends/whoosh.py)
         'PATH': BASE_DIR / 'whoosh_index',
+        'REFRESH_INTERVAL': 1.0,     # seconds between index generation checks
+        'RESULT_CACHE_SIZE': 256,    # cached searches per process (0 disables)
     },
 }
 
 HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+
+# Caches: 'default' is per process; 'shared' is one SQLite file every worker on the host uses
+# (main/backends/sqlite_cache.py, main/utils/shared_cache.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'main.backends.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'shared.sqlite3'),
+        'TIMEOUT': 300,              # seconds an officer lookup / chatbot answer is kept
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+SHARED_CACHE_ENABLED = True
+SHARED_CACHE_ALIAS = 'shared'
+SHARED_CACHE_VERSION_CHECK = 1.0  # seconds a worker trusts its copy of a namespace version
+SHARED_ANSWER_TTL = 300      # seconds a count / search answer is shared between workers
+SHARED_EXPORT_TTL = 3600     # seconds an identical export reuses the file already written
+
+# Chatbot
+CHATBOT_ASYNC = False       # serve /chatbot/ with the async view (enable under ASGI)
+CHAT_ASYNC_WORKERS = 8      # threads for fuzzy matching, search and exports in the async view
+CHAT_BATCH_MAX_QUERIES = 100  # per request to /chatbot/batch/
+OFFICER_CACHE_SIZE = 1024    # army-number lookups kept per worker (LRU, misses included)
+OFFICER_CACHE_TTL = 300      # seconds
+OFFICER_BLOOM_REFRESH = 300  # rebuild the army-number bloom filter this often (seconds)
+OFFICER_BLOOM_MIN_INTERVAL = 5  # at most one rebuild this often, e.g. after other workers added officers
+CHAT_TRACING = True          # per-stage latency histograms at /metrics/chat/
+CHAT_TRACE_RESPONSES = DEBUG # attach the per-request trace to chatbot JSON responses
+CHAT_CONTEXT_TTL = 900       # seconds a session remembers the officer / list it last asked about
+CHAT_CONTEXT_MAX_RESULTS = 50  # army numbers of a listed result set kept for "their ..." follow-ups
+
+# Admission control (main/admission.py), per worker process
+ADMISSION_CONTROL = True
+ADMISSION_CLASSES = {        # class: (running at once, queued, per user running + queued); None = no limit
+    'chat': (None, 0, None),  # single-officer lookups, counts, searches
+    'heavy_chat': (4, 16, 2),  # list/complex queries, /chatbot/batch/
+    'ocr': (2, 8, 1),          # document uploads
+    'export': (2, 8, 1),       # PDF/Word/Excel answers, record export/import
+}
+ADMISSION_QUEUE_TIMEOUT = 10  # seconds a request waits for a slot before it gets a 503
+ADMISSION_CLIENT_IP_HEADER = None  # e.g. 'HTTP_X_FORWARDED_FOR' behind a proxy that sets it; keys anonymous quotas
+
+# Similarity fallback when Whoosh finds nothing (main/chat_similarity.py)
+SIMILARITY_INDEX_DIR = os.path.join(BASE_DIR, 'similarity_index')  # built by manage.py build_similarity_index
+SIMILARITY_N_FEATURES = 2 ** 18  # hashed character n-gram columns
+SIMILARITY_TOP_K = 5         # records listed in a fallback answer
+SIMILARITY_MIN_SCORE = 0.3   # cosine similarity below this is not a match
+
+# Duplicate officer detection (main/dedup.py)
+DEDUP_THRESHOLD = 0.85       # weighted name/army number/DOB/phone similarity that counts as a duplicate
+DEDUP_MAX_BLOCK = 500        # officers sharing one blocking key; bigger blocks are skipped
+
+# Bulk import (main/bulk_records.py)
+IMPORT_CHUNK_SIZE = 1000     # rows per transaction / bulk_create
+IMPORT_MAX_ERRORS = 100      # invalid rows listed in an import report
+
+# Change log / delta exports (main/change_log.py)
+CHANGELOG_SETTLE_SECONDS = 60  # a delta export's cursor stops at changes this old (> longest write transaction)
+CHANGELOG_RETENTION_DAYS = 30  # manage.py prune_change_log default
+
+# Officer photos (main/utils/thumbnails.py)
+PHOTO_VARIANTS = {           # name: (max width, max height, JPEG quality)
+    'thumb': (96, 96, 75),
+    'chat': (240, 240, 80),
+    'profile': (640, 640, 82),
+}
+PHOTO_DERIVATIVES_DIR = 'photos/derived'
+PHOTO_WORKERS = 1            # background threads generating derivatives
+
+# OCR
+OCR_ENGINE = 'auto'          # auto | pool | tesserocr | pytesseract (see main/utils/ocr_engine.py)
+OCR_POOL_SIZE = 2            # long-lived Tesseract worker processes per web worker
+OCR_PDF_DPI = 300            # rasterisation resolution for PDF pages
+OCR_PAGE_WORKERS = 2         # pages of one document OCR'd in parallel (bounds page bitmaps in memory)
+OCR_MAX_PAGES = 50           # pages beyond this are ignored
+OCR_ADAPTIVE = True          # cheap pass first, heavy denoise/deskew pass only for weak fields
+OCR_CONFIDENCE_THRESHOLD = 0.6  # fields scoring below this trigger the heavy pass
+
@@ -0,0 +1,45 @@
+"""
+SQLite stand-in settings for running the app, benchmarks and tests locally
+without a MySQL server.
+
+    python manage.py migrate --settings=chatbot.settings_sqlite
+    python manage.py bench_db_pool --settings=chatbot.settings_sqlite
+
+A second SQLite file stands in for a read replica. There is no replication
+between the two: copy local.sqlite3 over local_replica.sqlite3 to "catch up".
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'main.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'local.sqlite3'),
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'ENABLED': True,
+            'MAX_SIZE': 10,
+            'TIMEOUT': 5,
+            'RECYCLE': 3600,
+            'PRE_PING': True,
+        },
+    },
+    'replica': {
+        'ENGINE': 'main.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'local_replica.sqlite3'),
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'ENABLED': True,
+            'MAX_SIZE': 10,
+            'TIMEOUT': 5,
+            'RECYCLE': 3600,
+            'PRE_PING': True,
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_REPLICAS = ['replica']
+
+SILENCED_SYSTEM_CHECKS = []
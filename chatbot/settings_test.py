@@ -0,0 +1,23 @@
+"""
+Settings for the test suite: the SQLite stand-in, with the Whoosh index,
+similarity index, shared cache and media kept in a scratch directory so
+tests never write to the checked-in index or reuse another run's cache.
+
+    python manage.py test main --settings=chatbot.settings_test
+"""
+import tempfile
+
+from .settings_sqlite import *  # noqa: F401,F403
+
+TEST_DATA_DIR = tempfile.mkdtemp(prefix='army_chatbot_tests_')
+
+HAYSTACK_CONNECTIONS = {
+    'default': dict(HAYSTACK_CONNECTIONS['default'], PATH=os.path.join(TEST_DATA_DIR, 'whoosh_index')),
+}
+SIMILARITY_INDEX_DIR = os.path.join(TEST_DATA_DIR, 'similarity_index')
+MEDIA_ROOT = os.path.join(TEST_DATA_DIR, 'media')
+CACHES = dict(CACHES, shared=dict(CACHES['shared'], LOCATION=os.path.join(TEST_DATA_DIR, 'shared.sqlite3')))
+# Background filter rebuilds run on their own connection and can't see a TestCase's rows
+OFFICER_BLOOM_REFRESH = None
+# Responses as in production; tests that check traces turn it on
+CHAT_TRACE_RESPONSES = False
@@ -0,0 +1,291 @@
+# main/admission.py
+"""Admission control for expensive endpoints.
+
+Every request is put in a class before it runs:
+
+    chat        single-officer lookups, counts, searches
+    heavy_chat  list/complex chat queries, batches
+    ocr         document uploads (extract_officer_data, test_ocr)
+    export      PDF/Word/Excel answers, record export/import
+
+Each class has its own per-process limit on requests running at once, a
+short queue in front of it and a cap on how many requests one user may
+have running or queued (ADMISSION_CLASSES). A request that finds its class
+full waits up to ADMISSION_QUEUE_TIMEOUT seconds; one that finds the queue
+full, or that goes over its user's quota, is turned away at once with 503 /
+429 and a Retry-After header. 'chat' has no limit, so cheap lookups never
+wait behind OCR or exports: keep the other limits well below the worker's
+thread count and the leftover threads are always free for them.
+
+Anonymous clients without a session are told apart by address. Behind a
+reverse proxy every request comes from the proxy, so set
+ADMISSION_CLIENT_IP_HEADER to the header it sets (e.g.
+'HTTP_X_FORWARDED_FOR'); otherwise all of them share one quota.
+"""
+import functools
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+from .chat_utils import detect_export_type, route_query
+
+logger = logging.getLogger(__name__)
+
+# class: (running at once, queued, per user running + queued); None = no limit
+DEFAULT_CLASSES = {
+    'chat': (None, 0, None),
+    'heavy_chat': (4, 16, 2),
+    'ocr': (2, 8, 1),
+    'export': (2, 8, 1),
+}
+
+MESSAGES = {
+    'busy': "The server is busy with other requests. Please try again shortly.",
+    'quota': "You already have requests of this kind in progress. Please wait for them to finish.",
+}
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """Concurrency limit + bounded wait queue + per-user quota for one request class"""
+
+    def __init__(self, name, limit, max_queue, per_user, timeout):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.timeout = timeout
+
+        self.active = 0
+        self.waiting = 0
+        self._users = {}   # user -> running + queued
+        self._cond = threading.Condition()
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_busy': 0, 'shed_quota': 0, 'timeouts': 0, 'max_waiting': 0}
+
+    def _retry_after(self):
+        return max(1, int(self.timeout))
+
+    def acquire(self, user):
+        with self._cond:
+            if self.per_user is not None and self._users.get(user, 0) >= self.per_user:
+                self.stats['shed_quota'] += 1
+                raise Rejected('quota', self._retry_after())
+
+            if self.limit is not None and self.active >= self.limit:
+                if self.waiting >= self.max_queue:
+                    self.stats['shed_busy'] += 1
+                    raise Rejected('busy', self._retry_after())
+                self._users[user] = self._users.get(user, 0) + 1
+                self.waiting += 1
+                self.stats['queued'] += 1
+                self.stats['max_waiting'] = max(self.stats['max_waiting'], self.waiting)
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._release_user(user)
+                            self.stats['timeouts'] += 1
+                            raise Rejected('busy', self._retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            else:
+                self._users[user] = self._users.get(user, 0) + 1
+
+            self.active += 1
+            self.stats['admitted'] += 1
+
+    def release(self, user):
+        with self._cond:
+            self.active -= 1
+            self._release_user(user)
+            self._cond.notify()
+
+    def _release_user(self, user):
+        count = self._users.get(user, 0) - 1
+        if count > 0:
+            self._users[user] = count
+        else:
+            self._users.pop(user, None)
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, active=self.active, waiting=self.waiting, limit=self.limit,
+                        max_queue=self.max_queue, per_user=self.per_user)
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate(name):
+    with _gates_lock:
+        gate = _gates.get(name)
+        if gate is None:
+            classes = getattr(settings, 'ADMISSION_CLASSES', DEFAULT_CLASSES)
+            limit, max_queue, per_user = classes.get(name, DEFAULT_CLASSES.get(name, (None, 0, None)))
+            gate = _gates[name] = AdmissionGate(name, limit, max_queue, per_user,
+                                                getattr(settings, 'ADMISSION_QUEUE_TIMEOUT', 10))
+        return gate
+
+
+def admission_stats():
+    """Per class: running, queue depth and shed counts in this process"""
+    with _gates_lock:
+        gates = list(_gates.values())
+    return {gate.name: gate.snapshot() for gate in gates}
+
+
+def reset_gates():
+    """Forget all gates so changed settings take effect (used by benchmarks/tests)"""
+    with _gates_lock:
+        _gates.clear()
+
+
+# -------------------- classification -------------------- #
+def classify_chat(message):
+    message = (message or "").lower()
+    if detect_export_type(message):
+        return 'export'
+    if route_query(message) in ('bulk', 'complex'):
+        return 'heavy_chat'
+    return 'chat'
+
+
+def classify_chat_request(request):
+    return classify_chat(request.POST.get("message", ""))
+
+
+def client_address(request):
+    """The client's address; behind a proxy, the one it put in ADMISSION_CLIENT_IP_HEADER"""
+    header = getattr(settings, 'ADMISSION_CLIENT_IP_HEADER', None)
+    forwarded = request.META.get(header, '') if header else ''
+    if forwarded:
+        # The proxy appends the address it saw; anything before it came from the client
+        return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def request_user(request):
+    """Quota key: the logged-in user, else the session, else the client address"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        return f"session:{session_key}"
+    return f"ip:{client_address(request)}"
+
+
+def rejected_response(gate, rejected):
+    message = MESSAGES[rejected.reason]
+    # "response" so the chat UI shows it like any other answer
+    response = JsonResponse({"response": message, "error": message, "class": gate.name},
+                            status=429 if rejected.reason == 'quota' else 503)
+    response["Retry-After"] = str(rejected.retry_after)
+    return response
+
+
+class _ReleaseOnClose:
+    """Streamed body that holds the slot until it is fully sent (or dropped)"""
+
+    def __init__(self, content, release):
+        self._content = content
+        self._release = release
+
+    def __iter__(self):
+        yield from self._content
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+        close = getattr(self._content, 'close', None)
+        if close is not None:
+            close()
+
+
+class _AsyncReleaseOnClose:
+    """_ReleaseOnClose for async iterators (Django calls close() once the body is sent);
+    no __iter__, which is how StreamingHttpResponse tells the two apart"""
+
+    def __init__(self, content, release):
+        self._content = content
+        self._release = release
+
+    async def __aiter__(self):
+        async for part in self._content:
+            yield part
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+def _release_after(response, release):
+    """Release at once, or once a streamed body has been sent"""
+    if not getattr(response, 'streaming', False):
+        release()
+    elif response.is_async:
+        response.streaming_content = _AsyncReleaseOnClose(response.streaming_content, release)
+    else:
+        response.streaming_content = _ReleaseOnClose(response.streaming_content, release)
+    return response
+
+
+def admit(request_class):
+    """View decorator: run the view only once its class admits the request.
+
+    `request_class` is a class name or a function(request) -> class name.
+    """
+    classify = request_class if callable(request_class) else (lambda request: request_class)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                if not getattr(settings, 'ADMISSION_CONTROL', True):
+                    return await view(request, *args, **kwargs)
+                gate, user = get_gate(classify(request)), request_user(request)
+                try:
+                    # Waiting for a slot blocks, so do it off the event loop
+                    await sync_to_async(gate.acquire, thread_sensitive=False)(user)
+                except Rejected as rejected:
+                    return rejected_response(gate, rejected)
+                try:
+                    response = await view(request, *args, **kwargs)
+                except BaseException:
+                    gate.release(user)
+                    raise
+                return _release_after(response, functools.partial(gate.release, user))
+            return async_wrapped
+
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not getattr(settings, 'ADMISSION_CONTROL', True):
+                return view(request, *args, **kwargs)
+            gate, user = get_gate(classify(request)), request_user(request)
+            try:
+                gate.acquire(user)
+            except Rejected as rejected:
+                return rejected_response(gate, rejected)
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                gate.release(user)
+                raise
+            return _release_after(response, functools.partial(gate.release, user))
+        return wrapped
+    return decorator
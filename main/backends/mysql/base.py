@@ -0,0 +1,8 @@
+# main/backends/mysql/base.py
+from django.db.backends.mysql import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """MySQL backend with a per-process connection pool (see DATABASES['POOL'])"""
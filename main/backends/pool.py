@@ -0,0 +1,228 @@
+# main/backends/pool.py
+import functools
+import logging
+import os
+import threading
+import time
+
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Defaults used when DATABASES[alias]['POOL'] leaves a key out
+POOL_DEFAULTS = {
+    'ENABLED': True,
+    'MAX_SIZE': 10,       # total connections (idle + in use) per process
+    'TIMEOUT': 5,         # seconds to wait for a free connection
+    'RECYCLE': 3600,      # close connections older than this (seconds)
+    'PRE_PING': True,     # health check a connection before handing it out
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of raw DB-API connections for one alias"""
+
+    def __init__(self, alias, max_size, timeout, recycle, pre_ping):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.pid = os.getpid()
+
+        self._idle = []          # [(connection, created_at)]
+        self._created_at = {}    # id(connection) -> created_at, for checked out ones
+        self._size = 0
+        self._cond = threading.Condition()
+
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'released': 0,
+            'discarded': 0,
+            'recycled': 0,
+            'health_check_failures': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def acquire(self, connect):
+        """Return an idle healthy connection, or open a new one with connect()"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn, created_at = self._idle.pop()
+                    if self._is_expired(created_at):
+                        self.stats['recycled'] += 1
+                        self._drop(conn)
+                        continue
+                    if self.pre_ping and not self._ping(conn):
+                        self.stats['health_check_failures'] += 1
+                        self._drop(conn)
+                        continue
+                    self._created_at[id(conn)] = created_at
+                    self.stats['reused'] += 1
+                    return conn
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise OperationalError(
+                        f"Connection pool '{self.alias}' exhausted "
+                        f"({self.max_size} connections in use)"
+                    )
+                self.stats['waits'] += 1
+                self._cond.wait(remaining)
+
+        # Open the connection outside the lock so slow connects don't block releases
+        try:
+            conn = connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self.stats['created'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Give a connection back to the pool (or close it if it is unusable)"""
+        with self._cond:
+            created_at = self._created_at.pop(id(conn), time.monotonic())
+            if discard or self._is_expired(created_at):
+                self.stats['discarded' if discard else 'recycled'] += 1
+                self._drop(conn)
+            else:
+                self._idle.append((conn, created_at))
+                self.stats['released'] += 1
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._drop(conn)
+
+    def snapshot(self):
+        with self._cond:
+            data = dict(self.stats)
+            data.update({
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+            })
+        return data
+
+    # -------------------- internals -------------------- #
+    def _is_expired(self, created_at):
+        return self.recycle is not None and time.monotonic() - created_at > self.recycle
+
+    def _ping(self, conn):
+        try:
+            if hasattr(conn, 'ping'):  # MySQLdb
+                conn.ping()
+            else:
+                conn.cursor().execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def _drop(self, conn):
+        # Caller holds the lock
+        self._size -= 1
+        try:
+            conn.close()
+        except Exception:
+            logger.debug("Error closing pooled connection", exc_info=True)
+
+
+def get_pool(alias, settings_dict):
+    """Return the pool for an alias, or None when pooling is disabled"""
+    options = dict(POOL_DEFAULTS)
+    options.update(settings_dict.get('POOL') or {})
+    if not options['ENABLED'] or not options['MAX_SIZE']:
+        return None
+
+    pool = _pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(alias)
+        # A forked worker must not share sockets with its parent
+        if pool is None or pool.pid != os.getpid():
+            pool = ConnectionPool(
+                alias,
+                max_size=options['MAX_SIZE'],
+                timeout=options['TIMEOUT'],
+                recycle=options['RECYCLE'],
+                pre_ping=options['PRE_PING'],
+            )
+            _pools[alias] = pool
+    return pool
+
+
+def pool_stats():
+    """Metrics for every pool created in this process"""
+    return {alias: pool.snapshot() for alias, pool in _pools.items()}
+
+
+def reset_pools():
+    """Close idle connections and forget all pools (used by benchmarks/tests)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+
+class PooledDatabaseWrapperMixin:
+    """Mix into a backend DatabaseWrapper so connect/close go through the pool"""
+
+    def _get_pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self._get_pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.acquire(functools.partial(super().get_new_connection, conn_params))
+
+    def connect(self):
+        try:
+            super().connect()
+        except Exception:
+            # Acquired but not set up (e.g. init_connection_state failed): free the slot
+            pool = self._get_pool()
+            if pool is not None and self.connection is not None:
+                pool.release(self.connection, discard=True)
+                self.connection = None
+            raise
+
+    def _close(self):
+        pool = self._get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Inside atomic() Django keeps the connection object around, so really close it,
+        # through the pool so its slot is freed
+        if self.in_atomic_block:
+            return pool.release(self.connection, discard=True)
+
+        discard = self.errors_occurred
+        if not discard and not self.autocommit:
+            try:
+                self.connection.rollback()
+            except Exception:
+                discard = True
+        pool.release(self.connection, discard=discard)
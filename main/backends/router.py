@@ -0,0 +1,202 @@
+# main/backends/router.py
+"""Send read-only chatbot, search and export reads to replica databases.
+
+Only code running inside use_replicas() (the replica_reads view decorator)
+reads from the aliases in DATABASE_REPLICAS; everything else, and every
+write, stays on 'default'. Reads fall back to 'default' when:
+
+  * the request (or the session, for REPLICA_STICKY_SECONDS after it last
+    wrote) has written, so a user sees their own registration right away
+    even if the replicas lag behind;
+  * a transaction is open on 'default';
+  * no replica passed its health check (SELECT 1, re-run every
+    REPLICA_HEALTH_CHECK_INTERVAL seconds per process).
+
+    DATABASE_ROUTERS = ['main.backends.router.ReplicaRouter']
+    MIDDLEWARE = [..., 'django.contrib.sessions.middleware.SessionMiddleware',
+                  'main.backends.router.ReplicaStickinessMiddleware', ...]
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'db_written_at'
+
+# Routing state of the current request / task: {'replicas', 'pinned', 'wrote'}
+_state = contextvars.ContextVar('db_routing', default=None)
+
+_lock = threading.Lock()
+_health = {}   # alias -> (healthy, checked_at)
+_stats = {'replica_reads': {}, 'primary_reads': 0, 'pinned_reads': 0, 'fallbacks': 0, 'failed_checks': 0}
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def _new_state(pinned=False):
+    return {'replicas': False, 'pinned': pinned, 'wrote': False}
+
+
+def _count(key, alias=None):
+    with _lock:
+        if alias is None:
+            _stats[key] += 1
+        else:
+            _stats[key][alias] = _stats[key].get(alias, 0) + 1
+
+
+# -------------------- health -------------------- #
+def replica_healthy(alias):
+    now = time.monotonic()
+    with _lock:
+        cached = _health.get(alias)
+    if cached is not None and now - cached[1] < getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 5):
+        return cached[0]
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+        healthy = True
+    except Exception as e:
+        logger.error(f"Replica {alias} failed its health check: {str(e)}")
+        _count('failed_checks')
+        healthy = False
+    with _lock:
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def routing_stats():
+    with _lock:
+        return dict(_stats, replica_reads=dict(_stats['replica_reads']),
+                    health={alias: healthy for alias, (healthy, _) in _health.items()})
+
+
+# -------------------- scope -------------------- #
+@contextmanager
+def use_replicas():
+    """Let reads in this block go to the replicas (unless pinned to the primary)"""
+    state = _state.get()
+    created = state is None
+    if created:
+        state = _new_state()
+        _state.set(state)
+    previous = state['replicas']
+    state['replicas'] = True
+    try:
+        yield state
+    finally:
+        state['replicas'] = previous
+        if created:
+            _state.set(None)
+
+
+def reads_from_replicas():
+    """True if reads here may be answered by a (possibly lagging) replica"""
+    state = _state.get()
+    return bool(state is not None and state['replicas'] and not state['pinned'] and replica_aliases())
+
+
+def _stream_from_replicas(content, pinned):
+    # Streaming bodies are read after the view (and the middleware) returned
+    with use_replicas() as state:
+        state['pinned'] = state['pinned'] or pinned
+        yield from content
+
+
+async def _astream_from_replicas(content, pinned):
+    with use_replicas() as state:
+        state['pinned'] = state['pinned'] or pinned
+        async for part in content:
+            yield part
+
+
+def _replica_stream(response, pinned):
+    if getattr(response, 'streaming', False):
+        stream = _astream_from_replicas if response.is_async else _stream_from_replicas
+        response.streaming_content = stream(response.streaming_content, pinned)
+    return response
+
+
+def replica_reads(view):
+    """View decorator: the view only reads, so its queries may use a replica"""
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapped(request, *args, **kwargs):
+            with use_replicas() as state:
+                return _replica_stream(await view(request, *args, **kwargs), state['pinned'])
+        return async_wrapped
+
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with use_replicas() as state:
+            return _replica_stream(view(request, *args, **kwargs), state['pinned'])
+    return wrapped
+
+
+class ReplicaStickinessMiddleware:
+    """Pin a session's reads to the primary for REPLICA_STICKY_SECONDS after it wrote"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, 'session', None)
+        written_at = session.get(SESSION_KEY, 0) if session is not None else 0
+        state = _new_state(pinned=time.time() - written_at < getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state['wrote'] and session is not None:
+            session[SESSION_KEY] = time.time()
+        return response
+
+
+# -------------------- router -------------------- #
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state['replicas']:
+            _count('primary_reads')
+            return DEFAULT_DB_ALIAS
+        if state['pinned'] or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            _count('pinned_reads')
+            return DEFAULT_DB_ALIAS
+
+        replicas = replica_aliases()
+        random.shuffle(replicas)
+        for alias in replicas:
+            if replica_healthy(alias):
+                _count('replica_reads', alias)
+                return alias
+        if replicas:
+            _count('fallbacks')
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Read our own writes: the rest of this request, and the session for a while
+            state['wrote'] = state['pinned'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,14 @@
+# main/backends/sqlite3/base.py
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """SQLite stand-in for the pooled MySQL backend (local benchmarks/tests)"""
+
+    def _get_pool(self):
+        # Every in-memory connection is its own database, so never pool them
+        if self.is_in_memory_db():
+            return None
+        return super()._get_pool()
@@ -0,0 +1,176 @@
+# main/backends/sqlite_cache.py
+"""Django cache backend on a local SQLite file, shared by every worker on the host.
+
+LocMemCache is private to one process, so with several gunicorn workers
+each one warms its own copy (and starts cold after a restart); memcached
+or Redis would be a service to run. This backend keeps entries in one
+SQLite database in WAL mode: readers never block, writes are short
+transactions, and incr()/add() are atomic across processes, which is what
+versioned invalidation (main/utils/shared_cache.py) relies on.
+
+    CACHES = {
+        'shared': {
+            'BACKEND': 'main.backends.sqlite_cache.SQLiteCache',
+            'LOCATION': '/path/to/shared_cache.sqlite3',
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 50000, 'CULL_FREQUENCY': 3},
+        },
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Check the entry count every this many writes per process
+CULL_EVERY = 100
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    # -------------------- connection -------------------- #
+    def _connection(self):
+        """One connection per thread (and per process, after a fork)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit; multi-statement operations open their own BEGIN IMMEDIATE
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _live(expires, now=None):
+        return expires is None or expires > (now or time.time())
+
+    # -------------------- reads -------------------- #
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or not self._live(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        placeholders = ",".join("?" * len(key_map))
+        rows = self._connection().execute(
+            f"SELECT key, value, expires FROM cache WHERE key IN ({placeholders})", list(key_map)
+        ).fetchall()
+        now = time.time()
+        return {key_map[key]: pickle.loads(value) for key, value, expires in rows if self._live(expires, now)}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute("SELECT expires FROM cache WHERE key = ?", (key,)).fetchone()
+        return row is not None and self._live(row[0])
+
+    # -------------------- writes -------------------- #
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        connection = self._connection()
+        if expires is not None and expires <= time.time():
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return
+        connection.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                           (key, self._dumps(value), expires))
+        self._maybe_cull(connection)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._live(row[0]):
+                connection.execute("ROLLBACK")
+                return False
+            connection.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                               (key, self._dumps(value), expires))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._maybe_cull(connection)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            "UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Atomic across processes: read and write happen in one write transaction"""
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or not self._live(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute("UPDATE cache SET value = ? WHERE key = ?", (self._dumps(value), key))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self._connection().execute(f"DELETE FROM cache WHERE key IN ({','.join('?' * len(keys))})", keys)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+    # -------------------- size limit -------------------- #
+    def _maybe_cull(self, connection):
+        # The instance may be shared between threads, each with its own connection
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % CULL_EVERY == 0
+        if not due:
+            return
+        connection.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        count = connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self._max_entries:
+            # INSERT OR REPLACE gives a rewritten key a new rowid, so low rowids are the oldest writes
+            # Back under MAX_ENTRIES, plus 1/CULL_FREQUENCY of it (all of it for 0) so we don't cull every time
+            headroom = self._max_entries // self._cull_frequency if self._cull_frequency else self._max_entries
+            excess = count - self._max_entries + headroom
+            connection.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY rowid LIMIT ?)", (excess,)
+            )
@@ -0,0 +1,245 @@
+# main/backends/whoosh.py
+"""Haystack Whoosh engine that keeps its searcher open between queries.
+
+Haystack's WhooshSearchBackend re-reads the index TOC and opens a new
+searcher (every segment's files) for each query. This backend keeps one
+searcher per thread and only refreshes it when the index generation
+changes; Whoosh then reuses the readers of unchanged segments. Writes made
+by this process (the realtime signal processor, bulk imports) are picked up
+on the next query; writes from other processes within REFRESH_INTERVAL
+seconds. Search results are cached per generation, so a new generation
+drops them.
+
+    HAYSTACK_CONNECTIONS = {
+        'default': {
+            'ENGINE': 'main.backends.whoosh.CachedWhooshEngine',
+            'PATH': ...,
+            'REFRESH_INTERVAL': 1.0,    # seconds between generation checks
+            'RESULT_CACHE_SIZE': 256,   # cached searches per process (0 disables)
+        },
+    }
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from haystack.backends.whoosh_backend import WhooshEngine, WhooshSearchBackend
+
+logger = logging.getLogger(__name__)
+
+# Bumped by every write in this process, so other threads' searchers refresh without waiting
+_writes = 0
+_writes_lock = threading.Lock()
+
+_result_caches = {}
+_result_caches_lock = threading.Lock()
+
+
+def _note_write():
+    global _writes
+    with _writes_lock:
+        _writes += 1
+
+
+def _freeze(value):
+    """Hashable, order-independent form of search kwargs"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(_freeze(v)) for v in value))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    return value
+
+
+class ResultCache:
+    """LRU of search results, keyed by index generation"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def get(self, generation, key):
+        with self._lock:
+            if generation == self._generation and key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def store(self, generation, key, results):
+        with self._lock:
+            if self._generation is None or generation > self._generation:
+                self._entries.clear()
+                self._generation = generation
+            elif generation < self._generation:
+                return
+            self._entries[key] = results
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation = None
+
+    def snapshot(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'generation': self._generation,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def result_cache(alias, max_size):
+    with _result_caches_lock:
+        if alias not in _result_caches:
+            _result_caches[alias] = ResultCache(max_size)
+        return _result_caches[alias]
+
+
+def search_stats():
+    """{alias: result cache counters} for this process"""
+    with _result_caches_lock:
+        return {alias: cache.snapshot() for alias, cache in _result_caches.items()}
+
+
+def _copy_results(results):
+    # SearchResult caches the loaded model instance on itself; callers get copies so
+    # the cached originals never hold ORM objects
+    return dict(results, results=[copy.copy(r) for r in results.get('results', [])])
+
+
+class _SearcherHandle:
+    """The shared searcher, with close() made a no-op for haystack's per-query close"""
+
+    def __init__(self, searcher):
+        self._searcher = searcher
+
+    def close(self):
+        pass
+
+    def __getattr__(self, attr):
+        return getattr(self._searcher, attr)
+
+
+class _SharedIndex:
+    """What haystack's search code sees as self.index"""
+
+    def __init__(self, backend, index):
+        self._backend = backend
+        self._index = index
+
+    def refresh(self):
+        # The backend checks the generation itself, at most every REFRESH_INTERVAL
+        return self
+
+    def doc_count(self):
+        return self._backend.get_searcher().doc_count()
+
+    def searcher(self, **kwargs):
+        if kwargs:
+            return self._index.searcher(**kwargs)
+        return _SearcherHandle(self._backend.get_searcher())
+
+    def __getattr__(self, attr):
+        return getattr(self._index, attr)
+
+
+class CachedWhooshSearchBackend(WhooshSearchBackend):
+    def __init__(self, connection_alias, **connection_options):
+        super().__init__(connection_alias, **connection_options)
+        self.refresh_interval = connection_options.get('REFRESH_INTERVAL', 1.0)
+        cache_size = connection_options.get('RESULT_CACHE_SIZE', 256)
+        self.result_cache = result_cache(connection_alias, cache_size) if cache_size else None
+        # Whoosh searchers are not meant to be shared between threads
+        self._local = threading.local()
+
+    # haystack assigns self.index in setup(), clear() and search(); keep it wrapped
+    @property
+    def index(self):
+        raw = self.__dict__.get('_raw_index')
+        return _SharedIndex(self, raw) if raw is not None else None
+
+    @index.setter
+    def index(self, value):
+        if isinstance(value, _SharedIndex):
+            value = value._index
+        self.__dict__['_raw_index'] = value
+
+    def _drop_searcher(self):
+        local = self.__dict__.get('_local')
+        searcher = getattr(local, 'searcher', None)
+        if searcher is not None:
+            local.searcher = None
+            try:
+                searcher.close()
+            except Exception as e:
+                logger.error(f"Closing Whoosh searcher failed: {str(e)}")
+
+    def get_searcher(self):
+        """This thread's searcher, refreshed if the index has a newer generation"""
+        if not self.setup_complete:
+            self.setup()
+        local = self._local
+        raw = self.__dict__['_raw_index']
+        now = time.monotonic()
+        if getattr(local, 'searcher', None) is None or local.index is not raw:
+            # First query on this thread, or setup()/clear() replaced the index
+            self._drop_searcher()
+            local.searcher, local.index = raw.searcher(), raw
+            local.checked_at, local.seen_writes = now, _writes
+        elif local.seen_writes != _writes or now - local.checked_at >= self.refresh_interval:
+            # refresh() returns the same searcher when nothing changed, and otherwise
+            # reuses the readers of segments that are still current
+            local.searcher = local.searcher.refresh()
+            local.checked_at, local.seen_writes = now, _writes
+        return local.searcher
+
+    def generation(self):
+        """Generation of the index this thread's searcher reads (None for an empty index)"""
+        return self.get_searcher().reader().generation()
+
+    def search(self, query_string, **kwargs):
+        generation = self.generation() if self.result_cache is not None and query_string else None
+        if generation is None:
+            return super().search(query_string, **kwargs)
+
+        key = (query_string, _freeze(kwargs))
+        cached = self.result_cache.get(generation, key)
+        if cached is None:
+            cached = super().search(query_string, **kwargs)
+            self.result_cache.store(generation, key, cached)
+        return _copy_results(cached)
+
+    def update(self, index, iterable, commit=True):
+        try:
+            return super().update(index, iterable, commit=commit)
+        finally:
+            _note_write()
+
+    def remove(self, obj_or_string, commit=True):
+        try:
+            return super().remove(obj_or_string, commit=commit)
+        finally:
+            _note_write()
+
+    def clear(self, models=None, commit=True):
+        try:
+            return super().clear(models=models, commit=commit)
+        finally:
+            self._drop_searcher()
+            if self.result_cache is not None:
+                self.result_cache.clear()
+            _note_write()
+
+
+class CachedWhooshEngine(WhooshEngine):
+    backend = CachedWhooshSearchBackend
@@ -0,0 +1,307 @@
+# main/bulk_records.py
+"""Bulk import and export of officer records.
+
+Rows come as CSV or JSON Lines, one file per model or mixed with a "model"
+column (officer, education, family, award). Related rows name their
+officer in an "army_number" column. Every row is validated with the same
+ModelForm as the data-entry pages, then written with bulk_create /
+bulk_update in chunks of IMPORT_CHUNK_SIZE rows, one transaction per chunk
+(officers of a chunk go in before the rows that reference them).
+
+bulk_create sends no post_save, so there is no realtime Whoosh write per
+record; the search index is updated once, in batches, after the import,
+and the change log (main/change_log.py) is written per chunk.
+"""
+import csv
+import io
+import json
+import logging
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .change_log import log_changes
+from .forms import AwardForm, EducationForm, FamilyForm, OfficerForm
+from .models import Award, Education, Family, Officer
+from .utils import shared_cache
+from .utils.officer_cache import officer_cache
+
+logger = logging.getLogger(__name__)
+
+
+class BulkOfficerForm(OfficerForm):
+    """OfficerForm without the per-row existence query; import_records checks army numbers per chunk"""
+
+    class Meta(OfficerForm.Meta):
+        exclude = ['photo']
+
+    def validate_unique(self):
+        pass
+
+
+MODELS = {
+    'officer': (Officer, BulkOfficerForm),
+    'education': (Education, EducationForm),
+    'family': (Family, FamilyForm),
+    'award': (Award, AwardForm),
+}
+# Officers first, so related rows in the same chunk can point at them
+MODEL_ORDER = ['officer', 'education', 'family', 'award']
+FORMATS = ('csv', 'jsonl')
+CONFLICT_MODES = ('skip', 'update', 'error')
+
+OFFICER_FIELDS = ['army_number', 'full_name', 'rank', 'position', 'unit', 'dob', 'enlistment_date',
+                  'phone', 'email', 'address', 'blood_group']
+EXPORT_FIELDS = {
+    'officer': OFFICER_FIELDS,
+    'education': ['army_number', 'degree', 'institution', 'year_of_passing', 'grade'],
+    'family': ['army_number', 'name', 'relation', 'dob', 'occupation', 'contact'],
+    'award': ['army_number', 'award_name', 'reason', 'date_awarded', 'location'],
+}
+INDEX_BATCH_SIZE = 1000
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# -------------------- reading -------------------- #
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    """Yield row dicts from a binary or text stream, lazily"""
+    stream = getattr(stream, 'file', stream)  # Django's UploadedFile wraps the real file
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield {'__error__': f"line {number}: invalid JSON ({e})"}
+
+
+# -------------------- import -------------------- #
+class ImportReport:
+    def __init__(self, max_errors):
+        self.counts = {name: {'created': 0, 'updated': 0, 'skipped': 0, 'invalid': 0} for name in MODEL_ORDER}
+        self.errors = []
+        self.invalid = 0
+        self.max_errors = max_errors
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def error(self, name, row_number, message):
+        self.invalid += 1
+        if name in self.counts:
+            self.counts[name]['invalid'] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'model': name, 'error': message})
+
+    def as_dict(self, dry_run=False):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'rows': self.rows,
+            'dry_run': dry_run,
+            'models': {name: c for name, c in self.counts.items() if any(c.values())},
+            'invalid': self.invalid,
+            'errors': self.errors,
+            'elapsed_s': round(elapsed, 3),
+            'rows_per_sec': round(self.rows / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def _form_errors(form):
+    return "; ".join(f"{field}: {' '.join(messages)}" for field, messages in form.errors.items())
+
+
+def _import_officers(rows, on_conflict, report, touched):
+    numbers = [str(row.get('army_number') or '').strip() for _, row in rows]
+    existing = Officer.objects.in_bulk([n for n in numbers if n])
+    created, updated, seen = [], [], set()
+
+    for (row_number, row), number in zip(rows, numbers):
+        if number and number in seen:
+            report.error('officer', row_number, f"army_number {number} appears more than once")
+            continue
+        seen.add(number)
+
+        instance = existing.get(number)
+        if instance is not None and on_conflict == 'skip':
+            report.counts['officer']['skipped'] += 1
+            continue
+        if instance is not None and on_conflict == 'error':
+            report.error('officer', row_number, f"Officer {number} already exists")
+            continue
+
+        form = BulkOfficerForm(row, instance=instance)
+        if not form.is_valid():
+            report.error('officer', row_number, _form_errors(form))
+            continue
+        (updated if instance is not None else created).append(form.save(commit=False))
+
+    Officer.objects.bulk_create(created)
+    if updated:
+        Officer.objects.bulk_update(updated, [f for f in OFFICER_FIELDS if f != 'army_number'])
+    report.counts['officer']['created'] += len(created)
+    report.counts['officer']['updated'] += len(updated)
+    touched['officer'].update(o.army_number for o in created + updated)
+    # bulk_create/bulk_update send no post_save, so the change log is written here
+    log_changes('officer', [o.army_number for o in created + updated])
+
+
+def _import_related(name, rows, report, touched):
+    model, form_class = MODELS[name]
+    numbers = {str(row.get('army_number') or '').strip() for _, row in rows}
+    known = set(Officer.objects.filter(army_number__in=numbers).values_list('army_number', flat=True))
+    objects = []
+
+    for row_number, row in rows:
+        number = str(row.get('army_number') or '').strip()
+        if number not in known:
+            report.error(name, row_number, f"Officer {number or '(blank army_number)'} not found")
+            continue
+        form = form_class(row)
+        if not form.is_valid():
+            report.error(name, row_number, _form_errors(form))
+            continue
+        obj = form.save(commit=False)
+        obj.officer_id = number
+        objects.append(obj)
+
+    model.objects.bulk_create(objects)
+    report.counts[name]['created'] += len(objects)
+    touched[name].update(o.officer_id for o in objects)
+    log_changes(name, sorted({o.officer_id for o in objects}))
+
+
+def import_records(rows, model=None, chunk_size=None, on_conflict='skip', dry_run=False, index=True):
+    """Validate and bulk-write rows; returns a report dict (counts, errors, rows/sec).
+
+    model is the default for rows without a "model" value. on_conflict
+    decides what happens to officers that already exist: skip, update or
+    error. With dry_run every chunk is rolled back after validation.
+    """
+    chunk_size = chunk_size or getattr(settings, 'IMPORT_CHUNK_SIZE', 1000)
+    report = ImportReport(getattr(settings, 'IMPORT_MAX_ERRORS', 100))
+    touched = {name: set() for name in MODEL_ORDER}
+
+    for chunk in _chunks(enumerate(rows, start=1), chunk_size):
+        report.rows += len(chunk)
+        by_model = {name: [] for name in MODEL_ORDER}
+        for row_number, row in chunk:
+            if '__error__' in row:
+                report.error(model, row_number, row['__error__'])
+                continue
+            name = str(row.pop('model', None) or model or '').strip().lower()
+            if name not in MODELS:
+                report.error(name, row_number, f"Unknown model '{name}' (expected one of {', '.join(MODEL_ORDER)})")
+                continue
+            by_model[name].append((row_number, row))
+
+        with transaction.atomic():
+            if by_model['officer']:
+                _import_officers(by_model['officer'], on_conflict, report, touched)
+            for name in MODEL_ORDER[1:]:
+                if by_model[name]:
+                    _import_related(name, by_model[name], report, touched)
+            if dry_run:
+                transaction.set_rollback(True)
+
+    if not dry_run:
+        for army_number in touched['officer']:
+            officer_cache.invalidate(army_number)
+        # bulk_create sends no signals; invalidate the other workers' caches here
+        if touched['officer']:
+            shared_cache.bump('officer')
+        if any(touched.values()):
+            shared_cache.bump('data')
+        if index:
+            update_search_index(touched)
+
+    return report.as_dict(dry_run=dry_run)
+
+
+def update_search_index(touched):
+    """One batched Whoosh update for everything an import wrote"""
+    try:
+        from haystack import connections
+        from haystack.exceptions import NotHandled
+    except ImportError:
+        return
+
+    connection = connections['default']
+    backend = connection.get_backend()
+    unified_index = connection.get_unified_index()
+    for name, army_numbers in touched.items():
+        if not army_numbers:
+            continue
+        model = MODELS[name][0]
+        try:
+            search_index = unified_index.get_index(model)
+        except NotHandled:
+            continue
+        lookup = 'army_number__in' if name == 'officer' else 'officer_id__in'
+        try:
+            for numbers in _chunks(army_numbers, INDEX_BATCH_SIZE):
+                records = model.objects.filter(**{lookup: numbers})
+                for batch in _chunks(records.iterator(chunk_size=INDEX_BATCH_SIZE), INDEX_BATCH_SIZE):
+                    backend.update(search_index, batch)
+        except Exception as e:
+            # The rows are committed; `manage.py update_index` can catch the index up
+            logger.error(f"Search index update failed for {name}: {str(e)}")
+
+
+# -------------------- export -------------------- #
+def export_rows(name, queryset=None):
+    """Yield row dicts in the import column layout"""
+    model = MODELS[name][0]
+    fields = EXPORT_FIELDS[name]
+    queryset = queryset if queryset is not None else model.objects.all()
+    columns = [f if not (f == 'army_number' and name != 'officer') else 'officer_id' for f in fields]
+    for values in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=2000):
+        yield dict(zip(fields, values))
+
+
+def _cell(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def export_lines(name, fmt='csv', queryset=None):
+    """Yield the export as text lines (CSV with a header row, or JSON Lines)"""
+    fields = EXPORT_FIELDS[name]
+    if fmt == 'jsonl':
+        for row in export_rows(name, queryset):
+            yield json.dumps({k: _cell(v) for k, v in row.items()}) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in export_rows(name, queryset):
+        writer.writerow([_cell(row[f]) for f in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
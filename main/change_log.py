@@ -0,0 +1,175 @@
+# main/change_log.py
+"""Change log and delta exports.
+
+Every save/delete of an Officer, Education, Family or Award row adds a
+RecordChange (model, army_number) in the same transaction: from
+main/signals.py for single records, from bulk_records.import_records for
+bulk_create/bulk_update. A delta export reads the changes after the
+caller's cursor and sends the *current* state of every officer they name:
+
+    officer rows     op=upsert with the full row, or op=delete (army_number only)
+    related rows     op=clear (army_number only), then op=insert for each of
+                     the officer's current rows; Education/Family/Award rows
+                     have no natural key, so an officer's set is replaced whole
+
+The next cursor is the highest change id that is CHANGELOG_SETTLE_SECONDS
+old: ids are handed out at insert but become visible at commit, so a
+newer id can show up before an older one commits. Keep the setting above
+the longest import transaction. A sync starts with a full export, which
+returns the cursor to continue from; exporting the same cursor twice sends
+the same officers again (current state), never fewer.
+
+Two things could still lose changes, and neither does silently:
+
+  * prune() deletes old changes and records the highest id it deleted
+    (ChangeLogHorizon). A delta from a cursor below it raises
+    CursorExpired: the consumer must start again with a full export.
+  * A transaction that commits more than CHANGELOG_SETTLE_SECONDS after
+    it logged its changes may commit ids below a cursor already handed
+    out. Its changes are logged again, under new ids, when it commits.
+"""
+import csv
+import io
+import json
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChangeLogHorizon, RecordChange
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+
+class CursorExpired(Exception):
+    """Changes after the cursor were pruned: a full export is needed"""
+
+    def __init__(self, since, pruned_through):
+        super().__init__(f"Changes after cursor {since} were pruned (through {pruned_through}); "
+                         f"start again with a full export")
+        self.since = since
+        self.pruned_through = pruned_through
+
+
+def _settle_seconds():
+    return getattr(settings, 'CHANGELOG_SETTLE_SECONDS', 60)
+
+
+def log_changes(model, army_numbers):
+    """Record that `model` rows of these officers changed (call inside the writing transaction)"""
+    army_numbers = list(army_numbers)
+    logged_at = timezone.now()
+    RecordChange.objects.bulk_create(
+        [RecordChange(model=model, army_number=army_number) for army_number in army_numbers],
+        batch_size=CHUNK_SIZE,
+    )
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _relog_if_late(model, army_numbers, logged_at))
+
+
+def _relog_if_late(model, army_numbers, logged_at):
+    # Past the settle window a cursor may already be beyond these ids
+    if (timezone.now() - logged_at).total_seconds() > _settle_seconds():
+        logger.warning(f"{len(army_numbers)} {model} changes committed after the settle window; logging them again")
+        RecordChange.objects.bulk_create(
+            [RecordChange(model=model, army_number=army_number) for army_number in army_numbers],
+            batch_size=CHUNK_SIZE,
+        )
+
+
+def pruned_through():
+    """Highest change id prune() deleted (0 if it never did)"""
+    return ChangeLogHorizon.objects.filter(pk=1).values_list('pruned_through', flat=True).first() or 0
+
+
+def check_cursor(since):
+    """Raise CursorExpired if changes after `since` are no longer all in the log"""
+    horizon = pruned_through()
+    if since < horizon:
+        raise CursorExpired(since, horizon)
+
+
+def current_cursor():
+    """Highest change id a delta export may include right now"""
+    cutoff = timezone.now() - timedelta(seconds=_settle_seconds())
+    # Walks the primary key down from the newest change; only the last few seconds' rows are skipped
+    settled = RecordChange.objects.filter(changed_at__lte=cutoff).order_by('-id').values_list('id', flat=True).first()
+    return settled or 0
+
+
+def changed_officers(model, since, until):
+    """Distinct army numbers with `model` changes in (since, until]"""
+    return (RecordChange.objects.filter(model=model, id__gt=since, id__lte=until)
+            .order_by('army_number').values_list('army_number', flat=True).distinct()
+            .iterator(chunk_size=CHUNK_SIZE))
+
+
+def delta_rows(name, since, until):
+    """Yield (op, row dict) for the officers changed in (since, until], in the import layout"""
+    from .bulk_records import EXPORT_FIELDS, MODELS, export_rows
+
+    model = MODELS[name][0]
+    numbers = iter(changed_officers(name, since, until))
+    blank = dict.fromkeys(EXPORT_FIELDS[name])
+    while True:
+        chunk = list(islice(numbers, CHUNK_SIZE))
+        if not chunk:
+            return
+        if name == 'officer':
+            current = {row['army_number']: row for row in export_rows(name, model.objects.filter(pk__in=chunk))}
+            for army_number in chunk:
+                row = current.get(army_number)
+                yield ('upsert', row) if row is not None else ('delete', dict(blank, army_number=army_number))
+            continue
+
+        by_officer = {}
+        for row in export_rows(name, model.objects.filter(officer_id__in=chunk)):
+            by_officer.setdefault(row['army_number'], []).append(row)
+        for army_number in chunk:
+            yield 'clear', dict(blank, army_number=army_number)
+            for row in by_officer.get(army_number, []):
+                yield 'insert', row
+
+
+def delta_lines(name, since, until, fmt='csv'):
+    """export_lines() for a delta: the same columns with an "op" column first"""
+    from .bulk_records import EXPORT_FIELDS, _cell
+
+    fields = EXPORT_FIELDS[name]
+    if fmt == 'jsonl':
+        for op, row in delta_rows(name, since, until):
+            yield json.dumps({'op': op, **{k: _cell(v) for k, v in row.items()}}) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['op'] + fields)
+    # Header first: an empty delta is still a valid file
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for op, row in delta_rows(name, since, until):
+        writer.writerow([op] + [_cell(row[f]) for f in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def prune(days):
+    """Delete changes older than `days`; delta exports from an older cursor then raise CursorExpired"""
+    cutoff = timezone.now() - timedelta(days=days)
+    old = RecordChange.objects.filter(changed_at__lt=cutoff)
+    with transaction.atomic():
+        last = old.order_by('-id').values_list('id', flat=True).first()
+        if last is None:
+            return 0
+        ChangeLogHorizon.objects.get_or_create(pk=1)
+        ChangeLogHorizon.objects.filter(pk=1, pruned_through__lt=last).update(pruned_through=last,
+                                                                              updated_at=timezone.now())
+        deleted, _ = old.filter(id__lte=last).delete()
+    return deleted
@@ -0,0 +1,106 @@
+# main/chat_async.py
+"""Async entry point to process_query_v2 for the ASGI chatbot endpoint.
+
+Routing lives in one place (process_query_v2); the async view hands the
+whole message to a small bounded thread pool, so the ORM, fuzzy matching,
+Whoosh search and exports never block the event loop and the sync and async
+endpoints cannot drift apart. stream_in_pool does the same for streamed
+answers, one event at a time.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .chat_utils import process_query_v2
+from .utils.tracing import db_tracing
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'CHAT_ASYNC_WORKERS', 8),
+            thread_name_prefix='chat-worker',
+        )
+    return _executor
+
+
+def _run_and_release(func, *args):
+    try:
+        with db_tracing():
+            return func(*args)
+    finally:
+        # Worker threads own their DB connections; hand them back (to the pool) after each task
+        close_old_connections()
+
+
+async def run_in_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    # Carry the request's trace (and replica routing) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(context.run, _run_and_release, func, *args)
+    )
+
+
+async def process_query_async(query, context=None):
+    return await run_in_pool(process_query_v2, query, context)
+
+
+_DONE = object()
+
+
+async def stream_in_pool(iterable, buffer=8):
+    """Run a sync (DB reading) iterator on the pool and yield its items as they come.
+
+    Under ASGI, Django reads a sync streaming body to the end before sending
+    any of it; this keeps a streamed answer streaming. At most `buffer`
+    items wait for a slow client before the worker pauses.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=buffer)
+    stopped = threading.Event()
+
+    def put(item, error=None):
+        asyncio.run_coroutine_threadsafe(queue.put((item, error)), loop).result()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stopped.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            if not stopped.is_set():
+                put(_DONE, e)
+            return
+        finally:
+            # Run the generator's cleanup (trace, session save) in the thread that ran it
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+        if not stopped.is_set():
+            put(_DONE)
+
+    task = asyncio.ensure_future(run_in_pool(produce))
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        # The client went away (or we are done): stop the worker, unblocking a pending put
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+        await task
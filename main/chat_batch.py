@@ -0,0 +1,115 @@
+# main/chat_batch.py
+"""Answer many chatbot queries in one go.
+
+Queries are routed exactly like process_query_v2, then grouped so that
+queries with the same intent share database work:
+  * count questions become one aggregate query per model,
+  * officer lookups by army number become one IN query (with family,
+    education and awards prefetched),
+  * name lookups share a single officer list for fuzzy matching.
+Bulk/complex listings are answered one by one since they return many rows.
+"""
+import logging
+
+from django.db.models import Count
+
+from main.models import Officer, Award
+from .chat_utils import (
+    count_query_conditions,
+    detect_export_type,
+    extract_army_number,
+    find_similar_officers,
+    handle_single_officer,
+    match_award_name,
+    process_query,
+    process_query_v2,
+    route_query,
+)
+
+logger = logging.getLogger(__name__)
+
+ERROR_RESPONSE = "Error processing your request. Please try again."
+
+
+def process_batch(queries):
+    """Return one response string per query, in the same order"""
+    queries = [q.lower() for q in queries]
+    responses = [None] * len(queries)
+    count_items, single_items = [], []
+
+    for i, query in enumerate(queries):
+        intent = route_query(query)
+        if intent == "count":
+            count_items.append(i)
+        elif intent is None:
+            single_items.append(i)
+        else:
+            responses[i] = _answer_one(process_query_v2, query)
+
+    if count_items:
+        _answer_counts(queries, count_items, responses)
+    if single_items:
+        _answer_single_officers(queries, single_items, responses)
+    return responses
+
+
+def _answer_one(func, *args):
+    try:
+        return func(*args)
+    except Exception as e:
+        logger.error(f"Query processing error: {str(e)}")
+        return ERROR_RESPONSE
+
+
+def _answer_counts(queries, items, responses):
+    award_names = None
+    if any('award' in queries[i] for i in items):
+        award_names = list(Award.objects.values_list('award_name', flat=True).distinct())
+
+    # model -> {alias: Q}, so each model is counted with a single aggregate query
+    grouped = {}
+    labels = {}
+    for i in items:
+        conditions = count_query_conditions(queries[i], lambda q: match_award_name(q, award_names or []))
+        if conditions is None:
+            responses[i] = "Could not determine count query. Please be more specific."
+            continue
+        model, condition, label = conditions
+        grouped.setdefault(model, {})[f"q{i}"] = Count('pk', filter=condition)
+        labels[f"q{i}"] = (i, label)
+
+    for model, aggregates in grouped.items():
+        try:
+            totals = model.objects.aggregate(**aggregates)
+        except Exception as e:
+            logger.error(f"Batch count error: {str(e)}")
+            totals = {}
+        for alias in aggregates:
+            i, label = labels[alias]
+            responses[i] = f"{label}: {totals[alias]}" if alias in totals else ERROR_RESPONSE
+
+
+def _answer_single_officers(queries, items, responses):
+    army_numbers = {i: extract_army_number(queries[i]) for i in items}
+    wanted = {n for n in army_numbers.values() if n}
+    officers = {}
+    if wanted:
+        officers = (
+            Officer.objects
+            .prefetch_related('family_members', 'educations', 'awards')
+            .in_bulk(wanted)
+        )
+
+    all_officers = None
+    for i in items:
+        query = queries[i]
+        officer = officers.get(army_numbers[i])
+        if officer is None:
+            if all_officers is None:
+                all_officers = list(Officer.objects.all())
+            officer = find_similar_officers(query, all_officers)
+
+        if officer:
+            responses[i] = _answer_one(handle_single_officer, query, officer, detect_export_type(query))
+        else:
+            responses[i] = _answer_one(process_query, query)
@@ -0,0 +1,95 @@
+# main/chat_context.py
+"""Per-session memory of what the chatbot last talked about.
+
+After "details of IC-12345" the session keeps the army number, so "what is
+his blood group" is answered about that officer without running the
+army-number / fuzzy-name resolution again: the profile comes straight from
+the per-process officer cache. After a list of officers ("colonels in
+delhi") the army numbers of the list are kept, so "export them as pdf" or
+"their phone numbers" work on the same result set.
+
+Only army numbers are stored (in request.session), never model instances,
+and the memory expires after CHAT_CONTEXT_TTL seconds.
+"""
+import re
+import time
+
+from django.conf import settings
+
+from .utils.officer_cache import officer_cache
+
+SESSION_KEY = 'chat_context'
+
+# "his", "uska", "this officer" ... point back at the last officer
+SINGULAR_RE = re.compile(
+    r'\b(his|her|him|he|she|this officer|that officer|same officer|uska|uski|uske|iska|iski|iske|unka|unki|unke)\b'
+)
+# "them", "their", "inke" ... point back at the last list
+PLURAL_RE = re.compile(r'\b(they|them|their|these|those|these officers|inka|inki|inke|in sab|un sab|unhe|inhe)\b')
+
+
+def _ttl():
+    return getattr(settings, 'CHAT_CONTEXT_TTL', 900)
+
+
+def _max_results():
+    return getattr(settings, 'CHAT_CONTEXT_MAX_RESULTS', 50)
+
+
+class ConversationContext:
+    def __init__(self, session):
+        self.session = session
+        data = session.get(SESSION_KEY) or {}
+        if time.time() - data.get('at', 0) > _ttl():
+            data = {}
+        self.officer = data.get('officer')        # army number
+        self.results = data.get('results') or []  # army numbers of the last officer list
+        self.changed = False
+
+    def remember_officer(self, officer):
+        if self.officer != officer.army_number or self.results:
+            self.officer, self.results = officer.army_number, []
+            self.changed = True
+
+    def remember_results(self, officers):
+        army_numbers = [o.army_number for o in officers[:_max_results()]]
+        # A one-row list is as good as naming the officer
+        officer = army_numbers[0] if len(army_numbers) == 1 else None
+        if army_numbers != self.results or officer != self.officer:
+            self.officer, self.results = officer, army_numbers
+            self.changed = True
+
+    def follow_up_officer(self, query, explicit_army_number=None):
+        """The remembered officer if the query refers back to them (and names nobody else)"""
+        if not self.officer or not SINGULAR_RE.search(query):
+            return None
+        if explicit_army_number and explicit_army_number != self.officer and \
+                officer_cache.get_officer(explicit_army_number):
+            return None
+        officer = officer_cache.get_officer(self.officer)
+        # Keep the memory alive while the conversation is still about this officer
+        if officer is not None:
+            self.changed = True
+        return officer
+
+    def follow_up_results(self, query):
+        """Army numbers of the remembered list if the query refers back to it"""
+        if self.results and PLURAL_RE.search(query):
+            self.changed = True
+            return self.results
+        return None
+
+    def reserve(self):
+        """Give the session content now, so the middleware creates it and sends its cookie
+        before a streamed answer (which only updates the memory once it is sent)"""
+        if SESSION_KEY not in self.session:
+            self.session[SESSION_KEY] = {'officer': None, 'results': [], 'at': 0}
+
+    def save(self, persist=False):
+        """Store the memory in the session; `persist` also writes the session now
+        (for streamed answers, which finish after the session middleware ran)"""
+        if self.changed:
+            self.session[SESSION_KEY] = {'officer': self.officer, 'results': self.results, 'at': time.time()}
+            self.changed = False
+            if persist:
+                self.session.save()
@@ -0,0 +1,382 @@
+# main/chat_similarity.py
+"""Character n-gram TF-IDF retrieval: the chatbot's fallback when Whoosh finds nothing.
+
+Every officer, award, education and family record becomes a hashed
+character n-gram TF-IDF vector (3-4 grams, so "colonal", "para regt" and
+"gallantry medal for bravery" still land near the right records). The
+vectors are stored column-major (CSC) as .npy files under
+SIMILARITY_INDEX_DIR and memory-mapped; scoring a query only touches the
+posting lists of its own n-grams and sums them with np.bincount, so 100k
+records take a few milliseconds.
+
+    python manage.py build_similarity_index      # full rebuild (also refreshes IDF)
+
+Saves and deletes after a build are appended to changes.<generation>.jsonl;
+every process replays that log on its next query (changed records are
+scored from a small in-memory delta, their old rows masked out); saving an
+officer also re-logs their award, education and family records, which
+carry the officer's name. IDF weights are fixed at build time, so rebuild
+now and then, and after bulk imports (bulk_create sends no signals).
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+sparse = lazy_import('scipy.sparse')
+sklearn_text = lazy_import('sklearn.feature_extraction.text')
+sklearn_preprocessing = lazy_import('sklearn.preprocessing')
+
+logger = logging.getLogger(__name__)
+
+NGRAM_RANGE = (3, 4)
+DEFAULT_FEATURES = 2 ** 18
+BUILD_BATCH_SIZE = 5000
+MANIFEST = 'manifest.json'
+
+
+def index_dir():
+    return str(getattr(settings, 'SIMILARITY_INDEX_DIR', os.path.join(settings.BASE_DIR, 'similarity_index')))
+
+
+def _path(name, generation, ext='npy'):
+    return os.path.join(index_dir(), f"{name}.{generation}.{ext}")
+
+
+def _read_manifest():
+    try:
+        with open(os.path.join(index_dir(), MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# -------------------- record text -------------------- #
+def record_key(instance):
+    return f"{instance._meta.model_name}:{instance.pk}"
+
+
+def record_text(instance):
+    """The text a record is matched on"""
+    name = instance._meta.model_name
+    if name == 'officer':
+        parts = [instance.full_name, instance.rank, instance.position, instance.unit, instance.address]
+    elif name == 'award':
+        parts = [instance.award_name, instance.reason, instance.location, instance.officer.full_name]
+    elif name == 'education':
+        parts = [instance.degree, instance.institution, instance.grade, instance.officer.full_name]
+    else:
+        parts = [instance.name, instance.relation, instance.occupation, instance.officer.full_name]
+    return " ".join(str(part) for part in parts if part)
+
+
+def _all_records():
+    from .models import Award, Education, Family, Officer
+
+    yield from Officer.objects.all().iterator(chunk_size=2000)
+    for model in (Award, Education, Family):
+        yield from model.objects.select_related('officer').iterator(chunk_size=2000)
+
+
+# -------------------- vectors -------------------- #
+def _vectorizer(n_features):
+    # Stateless hashing: every process maps an n-gram to the same column without a vocabulary
+    return sklearn_text.HashingVectorizer(analyzer='char_wb', ngram_range=NGRAM_RANGE, n_features=n_features,
+                                          alternate_sign=False, norm=None, dtype=np.float32)
+
+
+def _term_frequencies(vectorizer, texts):
+    matrix = vectorizer.transform(texts)
+    # Sublinear tf: 1 + log(count)
+    np.log(matrix.data, out=matrix.data)
+    matrix.data += 1
+    return matrix
+
+
+def _weigh(matrix, idf):
+    """Apply IDF and L2-normalise the rows of a CSR matrix, in place"""
+    matrix.data *= idf[matrix.indices]
+    return sklearn_preprocessing.normalize(matrix, norm='l2', copy=False)
+
+
+# -------------------- building -------------------- #
+def build_index(n_features=None, batch_size=BUILD_BATCH_SIZE):
+    """Vectorise every record and publish a new index generation; returns the manifest"""
+    n_features = n_features or getattr(settings, 'SIMILARITY_N_FEATURES', DEFAULT_FEATURES)
+    os.makedirs(index_dir(), exist_ok=True)
+    previous = _read_manifest()
+    generation = previous['generation'] + 1 if previous else 1
+    # Changes logged after this moment are replayed on top of the new generation
+    snapshot_at = time.time()
+
+    vectorizer = _vectorizer(n_features)
+    keys, parts, texts = [], [], []
+    for record in _all_records():
+        keys.append(record_key(record))
+        texts.append(record_text(record))
+        if len(texts) >= batch_size:
+            parts.append(_term_frequencies(vectorizer, texts))
+            texts = []
+    if texts:
+        parts.append(_term_frequencies(vectorizer, texts))
+
+    if parts:
+        matrix = sparse.vstack(parts, format='csr')
+    else:
+        matrix = sparse.csr_matrix((0, n_features), dtype=np.float32)
+    document_frequency = np.bincount(matrix.indices, minlength=n_features)
+    idf = (np.log((1 + len(keys)) / (1 + document_frequency)) + 1).astype(np.float32)
+    matrix = _weigh(matrix, idf).tocsc()
+    matrix.sort_indices()
+
+    np.save(_path('data', generation), matrix.data.astype(np.float32))
+    np.save(_path('rows', generation), matrix.indices.astype(np.int32))
+    np.save(_path('indptr', generation), matrix.indptr.astype(np.int64))
+    np.save(_path('idf', generation), idf)
+    with open(_path('keys', generation, 'json'), 'w', encoding='utf-8') as f:
+        json.dump(keys, f)
+
+    manifest = {
+        'generation': generation,
+        'previous': previous['generation'] if previous else None,
+        'snapshot_at': snapshot_at,
+        'records': len(keys),
+        'nnz': int(matrix.nnz),
+        'n_features': n_features,
+    }
+    tmp = os.path.join(index_dir(), MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(index_dir(), MANIFEST))
+    _remove_old_generations(manifest['previous'] or generation)
+    return manifest
+
+
+def _remove_old_generations(keep_from):
+    # The previous generation stays: other processes may still be reading it
+    for name in os.listdir(index_dir()):
+        parts = name.split('.')
+        if len(parts) == 3 and parts[1].isdigit() and int(parts[1]) < keep_from:
+            os.remove(os.path.join(index_dir(), name))
+
+
+# -------------------- change log -------------------- #
+def log_change(key, text=None):
+    """Record a saved (text) or deleted (text=None) record for every process to pick up"""
+    manifest = _read_manifest()
+    if manifest is None:
+        return
+    line = json.dumps({'ts': time.time(), 'key': key, 'text': text}) + "\n"
+    try:
+        # One short O_APPEND write per change, so concurrent writers don't interleave
+        with open(_path('changes', manifest['generation'], 'jsonl'), 'a', encoding='utf-8') as f:
+            f.write(line)
+    except OSError as e:
+        logger.error(f"Similarity change log write failed for {key}: {str(e)}")
+
+
+def log_dependents(officer):
+    """Re-log an officer's award, education and family records, whose text includes the officer's name"""
+    if _read_manifest() is None:
+        return
+    for related in (officer.awards, officer.educations, officer.family_members):
+        for record in related.all():
+            log_change(record_key(record), record_text(record))
+
+
+# -------------------- searching -------------------- #
+class StaleChangeLog(Exception):
+    """A change log shrank under a reader: its replay has to start over"""
+
+
+class _Generation:
+    """One loaded index generation plus the changes replayed on top of it"""
+
+    def __init__(self, manifest):
+        generation = manifest['generation']
+        self.manifest = manifest
+        self.data = np.load(_path('data', generation), mmap_mode='r')
+        self.rows = np.load(_path('rows', generation), mmap_mode='r')
+        self.indptr = np.load(_path('indptr', generation))
+        self.idf = np.load(_path('idf', generation))
+        with open(_path('keys', generation, 'json'), encoding='utf-8') as f:
+            self.keys = json.load(f)
+        self.positions = {key: row for row, key in enumerate(self.keys)}
+        self.alive = np.ones(len(self.keys), dtype=bool)
+        self.vectorizer = _vectorizer(manifest['n_features'])
+        self.delta = {}            # key -> 1 x n_features CSR row
+        self._delta_keys = []
+        self._delta_matrix = None
+        self.log_offsets = {}      # change log path -> bytes consumed
+
+    def vector(self, text):
+        return _weigh(_term_frequencies(self.vectorizer, [text]), self.idf)
+
+    def apply(self, key, text):
+        row = self.positions.get(key)
+        if row is not None:
+            self.alive[row] = False
+        if text:
+            self.delta[key] = self.vector(text)
+        else:
+            self.delta.pop(key, None)
+        self._delta_matrix = None
+
+    def delta_matrix(self):
+        if self._delta_matrix is None and self.delta:
+            self._delta_keys = list(self.delta)
+            self._delta_matrix = sparse.vstack([self.delta[k] for k in self._delta_keys], format='csr')
+        return self._delta_keys, self._delta_matrix
+
+    def replay(self, path, since=None):
+        """Apply log lines written since the last call"""
+        offset = self.log_offsets.get(path, 0)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        if size < offset:
+            # Truncated, replaced or removed: our offset no longer points into the same log
+            raise StaleChangeLog(path)
+        if size == offset:
+            return
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read(size - offset)
+        # Only whole lines; a write in progress is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        self.log_offsets[path] = offset + end
+        for line in chunk[:end].splitlines():
+            try:
+                change = json.loads(line)
+            except ValueError:
+                continue
+            if since is None or change['ts'] >= since:
+                self.apply(change['key'], change['text'])
+
+
+class SimilarityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+        self._manifest_mtime = None
+
+    def _refresh(self):
+        """Load a newer generation if one was published, then replay new change log lines"""
+        try:
+            mtime = os.stat(os.path.join(index_dir(), MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                self._current, self._manifest_mtime = _Generation(_read_manifest()), mtime
+            try:
+                self._replay(self._current)
+            except StaleChangeLog as e:
+                # Changes we applied may be gone from the log: reload the generation and replay from the start
+                logger.warning(f"Similarity change log {e} shrank; replaying it from the start")
+                self._current = _Generation(self._current.manifest)
+                self._replay(self._current)
+            return self._current
+
+    @staticmethod
+    def _replay(current):
+        # Changes logged against the previous generation after the build's snapshot, then our own
+        if current.manifest['previous']:
+            current.replay(_path('changes', current.manifest['previous'], 'jsonl'),
+                           since=current.manifest['snapshot_at'])
+        current.replay(_path('changes', current.manifest['generation'], 'jsonl'))
+
+    def search(self, text, top_k=None, min_score=None):
+        """[(key, score), ...] best first, at most top_k, scores >= min_score"""
+        top_k = top_k or getattr(settings, 'SIMILARITY_TOP_K', 5)
+        min_score = getattr(settings, 'SIMILARITY_MIN_SCORE', 0.3) if min_score is None else min_score
+        try:
+            current = self._refresh()
+        except (OSError, ValueError) as e:
+            logger.error(f"Similarity index unavailable: {str(e)}")
+            return []
+        if current is None or not text.strip():
+            return []
+
+        query = current.vector(text)
+        if not query.nnz:
+            return []
+
+        # Gather the posting lists of the query's n-grams and add them up per record
+        starts, ends = current.indptr[query.indices], current.indptr[query.indices + 1]
+        lengths = ends - starts
+        if lengths.sum():
+            rows = np.concatenate([current.rows[s:e] for s, e in zip(starts, ends)])
+            weights = np.concatenate([current.data[s:e] for s, e in zip(starts, ends)])
+            weights *= np.repeat(query.data, lengths)
+            scores = np.bincount(rows, weights=weights, minlength=len(current.keys))
+            scores[~current.alive] = 0
+        else:
+            scores = np.zeros(len(current.keys))
+
+        matches = []
+        if len(scores):
+            best = np.argpartition(-scores, min(top_k, len(scores)) - 1)[:top_k]
+            # Masked (changed or deleted) rows score 0, which min_score=0 would still let through
+            matches = [(current.keys[i], float(scores[i])) for i in best if current.alive[i]]
+
+        with self._lock:
+            delta_keys, delta = current.delta_matrix()
+        if delta is not None:
+            delta_scores = (delta @ query.T).toarray().ravel()
+            matches.extend(zip(delta_keys, delta_scores.tolist()))
+
+        matches = [(key, score) for key, score in matches if score >= min_score]
+        matches.sort(key=lambda item: -item[1])
+        return matches[:top_k]
+
+
+similarity_index = SimilarityIndex()
+
+
+def similar_records(text, top_k=None):
+    return similarity_index.search(text, top_k=top_k)
+
+
+def describe_matches(matches):
+    """Chat lines for [(key, score)] matches, in the same order"""
+    from .models import Award, Education, Family, Officer
+
+    models = {'officer': Officer, 'award': Award, 'education': Education, 'family': Family}
+    wanted = {}
+    for key, _ in matches:
+        name, pk = key.split(':', 1)
+        wanted.setdefault(name, []).append(pk)
+
+    records = {}
+    for name, pks in wanted.items():
+        queryset = models[name].objects.all()
+        if name != 'officer':
+            queryset = queryset.select_related('officer')
+        for pk, record in queryset.in_bulk(pks).items():
+            records[f"{name}:{pk}"] = record
+
+    lines = []
+    for key, _ in matches:
+        record = records.get(key)
+        if record is None:
+            continue
+        name = key.split(':', 1)[0]
+        if name == 'officer':
+            lines.append(f"Officer: {record.full_name} {record.rank}, ID: {record.army_number}, Unit: {record.unit}")
+        elif name == 'award':
+            lines.append(f"Award: {record.award_name} - Officer: {record.officer.full_name}")
+        elif name == 'education':
+            lines.append(f"Education: {record.degree}, Institution: {record.institution}, "
+                         f"Officer: {record.officer.full_name}")
+        else:
+            lines.append(f"Family Member: {record.name}, Relation: {record.relation} - "
+                         f"Officer: {record.officer.full_name}")
+    return lines
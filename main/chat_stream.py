@@ -0,0 +1,159 @@
+# main/chat_stream.py
+"""Streaming (JSON lines) variant of the chat pipeline.
+
+Each event is one JSON object per line:
+    {"event": "status", "message": "..."}   progress note, replaced by the next one
+    {"event": "text", "text": "..."}        append to the answer
+    {"event": "error", "message": "..."}
+    {"event": "done"}
+    {"event": "trace", "trace": {...}}     after done/error, with CHAT_TRACE_RESPONSES
+Bulk and complex queries emit rows as soon as the first batch is fetched;
+exports report each stage before the download link arrives.
+
+With a ConversationContext, follow-ups ("their phone numbers") are answered
+about the remembered officers, and the officers a streamed list showed are
+remembered for the next message, as in process_query_v2.
+"""
+import json
+import logging
+
+from .chat_context import _max_results
+from .chat_utils import (
+    _export_response,
+    bulk_query_plan,
+    complex_query_plan,
+    detect_export_type,
+    extract_army_number,
+    format_complex_officer,
+    process_query_v2,
+    route_query,
+)
+from .models import Officer
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = 50
+
+
+def status(message):
+    return {"event": "status", "message": message}
+
+
+def text(value):
+    return {"event": "text", "text": value}
+
+
+def stream_query(query, context=None):
+    """Yield chat events for a query"""
+    query = query.lower()
+    export_type = detect_export_type(query)
+    intent = route_query(query)
+
+    if intent in ("bulk", "complex") and not _follows_up(query, context):
+        if intent == "bulk":
+            yield from stream_bulk_query(query, export_type, context)
+        else:
+            yield from stream_complex_query(query, context)
+    else:
+        if export_type:
+            yield status(f"Preparing {export_type.upper()} report…")
+        yield text(process_query_v2(query, context=context))
+
+
+def _follows_up(query, context):
+    # process_query_v2 answers follow-ups from the context before routing
+    if context is None:
+        return False
+    return bool(context.follow_up_officer(query, extract_army_number(query)) or context.follow_up_results(query))
+
+
+def _remember(context, seen, batch):
+    """Keep the first officers a streamed list showed, for the context"""
+    if context is not None and len(seen) < _max_results():
+        seen.extend(batch)
+
+
+def stream_bulk_query(query, export_type=None, context=None):
+    plan = bulk_query_plan(query)
+    if plan is None:
+        yield text("Could not determine bulk query. Please be more specific.")
+        return
+
+    if plan['queryset'].model is not Officer:
+        context = None
+    if export_type:
+        yield from stream_export(plan, export_type, context)
+        return
+
+    yield status("Fetching records…")
+    found, seen = False, []
+    for batch in _batched(plan['queryset'].iterator(chunk_size=STREAM_BATCH_SIZE)):
+        _remember(context, seen, batch)
+        lines = "\n".join(plan['format'](r) for r in batch)
+        if not found:
+            found = True
+            yield text(f"{plan['heading']}:\n{lines}")
+        else:
+            yield text(f"\n{lines}")
+
+    if not found:
+        yield text(plan['empty'])
+    elif context is not None:
+        context.remember_results(seen)
+
+
+def stream_export(plan, export_type, context=None):
+    yield status("Fetching records…")
+    records = list(plan['queryset'])
+    if not records:
+        yield text(plan['empty'])
+        return
+    if context is not None:
+        context.remember_results(records)
+
+    yield status(f"Fetched {len(records)} records, generating {export_type.upper()} report…")
+    file_url = plan['export'](records, plan['title'], export_type)
+    yield text(_export_response(plan['title'], file_url, export_type))
+
+
+def stream_complex_query(query, context=None):
+    officers, requested_fields = complex_query_plan(query)
+
+    yield status("Fetching records…")
+    found, seen = False, []
+    for batch in _batched(officers.iterator(chunk_size=STREAM_BATCH_SIZE)):
+        _remember(context, seen, batch)
+        blocks = "\n\n".join(format_complex_officer(o, requested_fields) for o in batch)
+        yield text(blocks if not found else f"\n\n{blocks}")
+        found = True
+
+    if not found:
+        yield text("No officers found matching the criteria.")
+    elif context is not None:
+        context.remember_results(seen)
+
+
+def stream_events(query, context=None):
+    """Serialise stream_query as JSON lines, always ending with a done/error event"""
+    try:
+        for event in stream_query(query, context):
+            yield json.dumps(event) + "\n"
+        if context is not None:
+            # The session middleware has long run by now: write the session here
+            context.save(persist=True)
+    except Exception as e:
+        logger.error(f"Query processing error: {str(e)}")
+        yield json.dumps({"event": "error", "message": "Error processing your request. Please try again."}) + "\n"
+        return
+    yield json.dumps({"event": "done"}) + "\n"
+
+
+def _batched(iterable, size=STREAM_BATCH_SIZE):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
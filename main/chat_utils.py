@@ -1,9 +1,11 @@
 import difflib
+import logging
 import re
 from thefuzz import fuzz
 from main.models import Officer, Family, Education, Award
 from django.db.models import Count, Q, Avg
 from datetime import datetime, date
+from django.conf import settings
 from haystack.query import SearchQuerySet
 
 # ✅ Import export helpers
@@ -13,6 +15,13 @@ from .utils.exports import (
     export_education,
     export_awards,
 )
+from .chat_similarity import describe_matches, similar_records
+from .utils import shared_cache
+from .utils.officer_cache import officer_cache
+from .utils.thumbnails import photo_url
+from .utils.tracing import span, traced
+
+logger = logging.getLogger(__name__)
 
 # Define keyword mappings (Hinglish/English)
 KEYWORDS = {
@@ -95,26 +104,36 @@ def match_field(input_text):
 #     return find_similar_officers(text)
 
 
-def extract_target_officer(text):
-    # 1. Try army number (numeric or alphanumeric with at least one digit)
-    army_number_match = re.search(r'\b[A-Za-z]*\d+[A-Za-z0-9]*\b', text, re.IGNORECASE)
+# Army number: numeric or alphanumeric with at least one digit
+ARMY_NUMBER_RE = re.compile(r'\b[A-Za-z]*\d+[A-Za-z0-9]*\b', re.IGNORECASE)
+
+def extract_army_number(text):
+    army_number_match = ARMY_NUMBER_RE.search(text)
     if army_number_match:
-        army_number = army_number_match.group().upper().strip()
-        print("DEBUG >>> Extracted:", army_number)
+        return army_number_match.group().upper().strip()
+    return None
 
-        try:
-            officer = Officer.objects.get(army_number=army_number)
-            print("DEBUG >>> Found officer:", officer.full_name)
+def extract_target_officer(text):
+    # 1. Try army number (numeric or alphanumeric with at least one digit)
+    army_number = extract_army_number(text)
+    if army_number:
+        # Cached, and tokens that can't be army numbers (years etc.) never reach the DB
+        with span("lookup.army_number"):
+            officer = officer_cache.get_officer(army_number)
+        if officer:
+            logger.debug("Found officer %s for army number %s", officer.full_name, army_number)
             return officer
-        except Officer.DoesNotExist:
-            print("DEBUG >>> No officer with army_number:", army_number)
+        logger.debug("No officer with army_number: %s", army_number)
 
     # 2. Fallback: fuzzy by name
-    return find_similar_officers(text)
+    with span("lookup.fuzzy"):
+        return find_similar_officers(text)
 
 
-def find_similar_officers(query):
-    officers = Officer.objects.all()
+def find_similar_officers(query, officers=None):
+    # Callers answering several queries can pass one preloaded officer list
+    if officers is None:
+        officers = Officer.objects.all()
     best_match = None
     highest_score = 0
     for officer in officers:
@@ -124,6 +143,7 @@ def find_similar_officers(query):
             best_match = officer
     return best_match if highest_score >= 70 else None
 
+@traced("slots.location")
 def extract_location(text):
     known_locations = [
         "kashmir", "ladakh", "delhi", "punjab", "assam", "rajasthan",
@@ -142,8 +162,12 @@ def extract_location(text):
 
     return None
 
+@traced("slots.award_name")
 def extract_award_name(query):
     awards = Award.objects.values_list('award_name', flat=True).distinct()
+    return match_award_name(query, awards)
+
+def match_award_name(query, awards):
     for award in awards:
         if award.lower() in query.lower():
             return award
@@ -152,9 +176,16 @@ def extract_award_name(query):
 def process_query(query):
     # Original Haystack implementation
     query = query.lower()
-    results = SearchQuerySet().filter(content=query)
-    
-    if not results:
+    with span("search.whoosh"):
+        results = SearchQuerySet().filter(content=query)
+        found = bool(results)
+    
+    if not found:
+        # Paraphrases and misspellings: nearest records by character n-grams
+        with span("search.similarity"):
+            lines = describe_matches(similar_records(query))
+        if lines:
+            return "<br>".join(lines)
         return "No matching data found. Try changing your question."
     
     response_lines = []
@@ -175,8 +206,22 @@ def process_query(query):
     return "<br>".join(response_lines)
 
 # ------------------ COMPLEX QUERY HANDLER ------------------ #
-def handle_complex_query(query):
+def handle_complex_query(query, context=None):
     """Handle queries requesting multiple fields with conditions"""
+    officers, requested_fields = complex_query_plan(query)
+    
+    if not officers:
+        return "No officers found matching the criteria."
+    if context is not None:
+        context.remember_results(officers)
+    
+    with span("format"):
+        response = [format_complex_officer(officer, requested_fields) for officer in officers]
+    
+    return "\n\n".join(response) if response else "No data found for the requested fields."
+
+def complex_query_plan(query):
+    """Return (officers queryset, requested fields) for a multi-field question"""
     query = query.lower()
     
     valid_fields = ['name', 'full_name', 'rank', 'unit', 'dob', 'date_of_birth', 
@@ -207,145 +252,218 @@ def handle_complex_query(query):
     if conditions:
         officers = officers.filter(**conditions)
     
-    if not officers:
-        return "No officers found matching the criteria."
-    
-    response = []
-    for officer in officers:
-        officer_data = []
-        for field in requested_fields:
-            value = getattr(officer, field, 'N/A')
-            if value:
-                officer_data.append(f"{field.replace('_', ' ').title()}: {value}")
-        response.append(f"Officer: {officer.full_name}\n" + "\n".join(officer_data))
-    
-    return "\n\n".join(response) if response else "No data found for the requested fields."
+    return officers, requested_fields
+
+def format_complex_officer(officer, requested_fields):
+    officer_data = []
+    for field in requested_fields:
+        value = getattr(officer, field, 'N/A')
+        if value:
+            officer_data.append(f"{field.replace('_', ' ').title()}: {value}")
+    return f"Officer: {officer.full_name}\n" + "\n".join(officer_data)
 
 # ------------------ V2 PROCESSOR ------------------ #
-def process_query_v2(query):
-    query = query.lower()
-    
-    # detect export type
-    export_type = None
+def detect_export_type(query):
     if "excel" in query:
-        export_type = "excel"
+        return "excel"
     elif "word" in query:
-        export_type = "word"
+        return "word"
     elif "pdf" in query:
-        export_type = "pdf"
-    
+        return "pdf"
+    return None
+
+def route_query(query):
+    """Pick the handler for a lowercased query: complex, count, bulk or None (single officer)"""
     if re.search(r'(give me|show|list)\s+.*(blood group|rank|unit|position|address|enlistment_date|email|phone|award|degree|institution in\s+\w+)', query):
-        return handle_complex_query(query)
+        return "complex"
     
     count_match = re.search(r'(how many|kitne|total|count|number)', query)
     if count_match:
-        return handle_count_query(query)
+        return "count"
     
     if re.search(r'(list|sabhi|all|give me|name)', query):
-        return handle_bulk_query(query, export_type=export_type)
+        return "bulk"
+    
+    return None
+
+def process_query_v2(query, context=None):
+    """Answer one chat message; `context` (main/chat_context.py) carries the officer or
+    list the conversation is about, so follow-ups skip officer resolution"""
+    query = query.lower()
+    
+    with span("route"):
+        # detect export type
+        export_type = detect_export_type(query)
+        intent = route_query(query)
+    
+    if context is not None:
+        with span("context"):
+            officer = context.follow_up_officer(query, extract_army_number(query))
+            army_numbers = None if officer else context.follow_up_results(query)
+        # "how many of them are brigadiers" counts within the remembered officers
+        # ("number" alone routes to count too, but "his phone number" is a field question)
+        if intent == "count" and (officer or army_numbers) and re.search(r'(how many|kitne|total|count)', query):
+            with span("handler.count"):
+                return handle_count_query(query, [officer.army_number] if officer else army_numbers)
+        if officer:
+            with span("handler.single"):
+                return handle_single_officer(query, officer, export_type=export_type)
+        if army_numbers:
+            with span("handler.results"):
+                return handle_results_follow_up(query, army_numbers, export_type=export_type)
+    
+    if intent == "complex":
+        with span("handler.complex"):
+            return handle_complex_query(query, context=context)
+    
+    if intent == "count":
+        with span("handler.count"):
+            return cached_answer("count", query, handle_count_query)
+    
+    if intent == "bulk":
+        with span("handler.bulk"):
+            return handle_bulk_query(query, export_type=export_type, context=context)
     
     officer = extract_target_officer(query)
     if officer:
-        return handle_single_officer(query, officer, export_type=export_type)
-    
-    return process_query(query)
-
-
-
-def handle_count_query(query):
+        if context is not None:
+            context.remember_officer(officer)
+        with span("handler.single"):
+            return handle_single_officer(query, officer, export_type=export_type)
+    
+    with span("handler.search"):
+        return cached_answer("search", query, process_query)
+
+
+def cached_answer(kind, query, compute):
+    """Answers that depend only on the question and the roster, shared by all workers
+    until any officer/education/family/award row changes"""
+    return shared_cache.get_or_set('data', f"{kind}:{shared_cache.digest(query)}", lambda: compute(query),
+                                   timeout=getattr(settings, 'SHARED_ANSWER_TTL', 300))
+
+
+def handle_count_query(query, army_numbers=None):
+    """`army_numbers` limits the count to the officers a follow-up refers to"""
+    plan = count_query_plan(query, extract_award_name)
+    if plan is None:
+        if army_numbers:
+            return f"Total officers: {Officer.objects.filter(army_number__in=army_numbers).count()}"
+        return "Could not determine count query. Please be more specific."
+    queryset, label = plan
+    if army_numbers:
+        field = 'army_number__in' if queryset.model is Officer else 'officer_id__in'
+        queryset, label = queryset.filter(**{field: army_numbers}), f"{label} among them"
+    return f"{label}: {queryset.count()}"
+
+def count_query_plan(query, resolve_award_name):
+    """Return (queryset, label) for a count question, or None.
+
+    The queryset is left unevaluated; resolve_award_name is only called for
+    award questions.
+    """
+    conditions = count_query_conditions(query, resolve_award_name)
+    if conditions is None:
+        return None
+    model, condition, label = conditions
+    return model.objects.filter(condition), label
+
+def count_query_conditions(query, resolve_award_name):
+    """Return (model, Q filter, label) for a count question, or None"""
     location = extract_location(query)
     if location:
-        count = Officer.objects.filter(unit__icontains=location).count()
-        return f"Total officers in {location}: {count}"
+        return Officer, Q(unit__icontains=location), f"Total officers in {location}"
     
     rank_match = re.search(r'(col|colonel|brigadier|major|av|lieutenant|general)', query, re.IGNORECASE)
     if rank_match:
         rank = rank_match.group(1).title()
-        count = Officer.objects.filter(rank__iexact=rank).count()
-        return f"Total {rank}s: {count}"
+        return Officer, Q(rank__iexact=rank), f"Total {rank}s"
     
     year_match = re.search(r'(after|before|since|in)\s*(\d{4})', query)
     if year_match:
         direction, year_str = year_match.groups()
         year = int(year_str)
         if direction == 'after':
-            count = Officer.objects.filter(enlistment_date__year__gt=year).count()
-            return f"Officers enlisted after {year}: {count}"
+            return Officer, Q(enlistment_date__year__gt=year), f"Officers enlisted after {year}"
         elif direction == 'before':
-            count = Officer.objects.filter(enlistment_date__year__lt=year).count()
-            return f"Officers enlisted before {year}: {count}"
+            return Officer, Q(enlistment_date__year__lt=year), f"Officers enlisted before {year}"
         else:
-            count = Officer.objects.filter(enlistment_date__year__gte=year).count()
-            return f"Officers enlisted in {year}: {count}"
+            return Officer, Q(enlistment_date__year__gte=year), f"Officers enlisted in {year}"
     
     if 'award' in query:
-        award_name = extract_award_name(query)
+        award_name = resolve_award_name(query)
         if award_name:
-            count = Award.objects.filter(award_name__icontains=award_name).count()
-            return f"Officers with {award_name} award: {count}"
+            return Award, Q(award_name__icontains=award_name), f"Officers with {award_name} award"
         else:
-            count = Award.objects.count()
-            return f"Total awards given: {count}"
+            return Award, Q(), "Total awards given"
     
     blood_match = re.search(r'\b(blood group|blood)\s*(A|B|AB|O)[+-]?\b', query, re.IGNORECASE)
     if blood_match:
         blood_group = blood_match.group(1).upper()
-        count = Officer.objects.filter(blood_group=blood_group).count()
-        return f"Officers with blood group {blood_group}: {count}"
+        return Officer, Q(blood_group=blood_group), f"Officers with blood group {blood_group}"
     
-    return "Could not determine count query. Please be more specific."
+    return None
 
 
 
 
 
-def handle_bulk_query(query, export_type=None):
+def handle_bulk_query(query, export_type=None, context=None):
+    plan = bulk_query_plan(query)
+    if plan is None:
+        return "Could not determine bulk query. Please be more specific."
+    
+    records = plan['queryset']
+    if not records:
+        return plan['empty']
+    if context is not None and records.model is Officer:
+        context.remember_results(records)
+    
+    if export_type:
+        file_url = plan['export'](records, plan['title'], export_type)
+        return _export_response(plan['title'], file_url, export_type)
+
+    with span("format"):
+        results = [plan['format'](r) for r in records]
+    return f"{plan['heading']}:\n" + "\n".join(results)
+
+def bulk_query_plan(query):
+    """Describe a list question: queryset, titles, row formatter and exporter (or None)"""
     location = extract_location(query)
     if location:
-        officers = Officer.objects.filter(unit__icontains=location)
-        if not officers:
-            return f"No officers found in {location}"
-        
-        if export_type:
-            file_url = export_officers(officers, f"Officers in {location}", export_type)
-            return _export_response(f"Officers in {location}", file_url, export_type)
-
-        results = [f"{o.full_name} ({o.rank}) - {o.unit}" for o in officers]
-        return f"Officers in {location}:\n" + "\n".join(results)
+        return {
+            'queryset': Officer.objects.filter(unit__icontains=location),
+            'heading': f"Officers in {location}",
+            'title': f"Officers in {location}",
+            'empty': f"No officers found in {location}",
+            'format': lambda o: f"{o.full_name} ({o.rank}) - {o.unit}",
+            'export': export_officers,
+        }
     
     rank_match = re.search(r'(colonel|brigadier|col|major|av|lieutenant|general)', query, re.IGNORECASE)
     if rank_match:
         rank = rank_match.group(1).title()
-        officers = Officer.objects.filter(rank__iexact=rank)
-        if not officers:
-            return f"No {rank}s found"
-        
-        if export_type:
-            file_url = export_officers(officers, f"{rank}s", export_type)
-            return _export_response(f"{rank}s", file_url, export_type)
-
-        results = [f"{o.full_name} - {o.unit}" for o in officers]
-        return f"{rank}s:\n" + "\n".join(results)
+        return {
+            'queryset': Officer.objects.filter(rank__iexact=rank),
+            'heading': f"{rank}s",
+            'title': f"{rank}s",
+            'empty': f"No {rank}s found",
+            'format': lambda o: f"{o.full_name} - {o.unit}",
+            'export': export_officers,
+        }
     
     if 'award' in query:
         award_name = extract_award_name(query)
         if award_name:
-            awards = Award.objects.filter(award_name__icontains=award_name).select_related('officer')
-            if not awards:
-                return f"No officers with {award_name} award found"
-            
-            if export_type:
-                file_url = export_awards(awards, f"Awards: {award_name}", export_type)
-                return _export_response(f"Awards: {award_name}", file_url, export_type)
-
-            results = [f"{a.officer.full_name} - {a.award_name} ({a.date_awarded.year})" for a in awards]
-            return f"Officers with {award_name} award:\n" + "\n".join(results)
-        
-        
+            return {
+                'queryset': Award.objects.filter(award_name__icontains=award_name).select_related('officer'),
+                'heading': f"Officers with {award_name} award",
+                'title': f"Awards: {award_name}",
+                'empty': f"No officers with {award_name} award found",
+                'format': lambda a: f"{a.officer.full_name} - {a.award_name} ({a.date_awarded.year})",
+                'export': export_awards,
+            }
     
-
-
-    return "Could not determine bulk query. Please be more specific."
+    return None
 
 
 
@@ -364,7 +482,7 @@ def handle_single_officer(query, officer, export_type=None):
         response.append(f"Enlistment Date: {officer.enlistment_date}")
 
         if officer.photo:
-            response.append(f"Photo: {officer.photo.url}")
+            response.append(f"Photo: {photo_url(officer, 'chat')}")
     
     if re.search(r'(contact|phone|mobile|email)', query):
         response.append(f"Phone: {officer.phone}")
@@ -372,7 +490,7 @@ def handle_single_officer(query, officer, export_type=None):
         response.append(f"Address: {officer.address}")
     
     if re.search(r'(family|parivaar|father|mother|pita|mata)', query):
-        family = Family.objects.filter(officer=officer)
+        family = officer.family_members.all()
         if family.exists():
             for member in family:
                 response.append(f"{member.relation}: {member.name} (DOB: {member.dob}) ")
@@ -380,7 +498,7 @@ def handle_single_officer(query, officer, export_type=None):
             response.append("No family records found")
     
     if re.search(r'(education|padhai|degree|shiksha)', query):
-        educations = Education.objects.filter(officer=officer)
+        educations = officer.educations.all()
         if educations.exists():
             for edu in educations:
                 response.append(f"Education: {edu.degree} from {edu.institution} ({edu.year_of_passing}) - Grade: {edu.grade}")
@@ -388,7 +506,7 @@ def handle_single_officer(query, officer, export_type=None):
             response.append("No education records found")
     
     if re.search(r'(award|puraskar|medal)', query):
-        awards = Award.objects.filter(officer=officer)
+        awards = officer.awards.all()
         if awards.exists():
             for award in awards:
                 response.append(f"Award: {award.award_name} ({award.date_awarded}) for {award.reason}")
@@ -397,21 +515,25 @@ def handle_single_officer(query, officer, export_type=None):
     
     if export_type:
         if "family" in query:
-            families = Family.objects.filter(officer=officer)
+            families = officer.family_members.all()
             file_url = export_family(families, f"Family of {officer.full_name}", export_type)
             return _export_response(f"Family of {officer.full_name}", file_url, export_type)
         elif "education" in query:
-            educations = Education.objects.filter(officer=officer)
+            educations = officer.educations.all()
             file_url = export_education(educations, f"Education of {officer.full_name}", export_type)
             return _export_response(f"Education of {officer.full_name}", file_url, export_type)
         elif "award" in query:
-            awards = Award.objects.filter(officer=officer)
+            awards = officer.awards.all()
             file_url = export_awards(awards, f"Awards of {officer.full_name}", export_type)
             return _export_response(f"Awards of {officer.full_name}", file_url, export_type)
         else:
             file_url = export_officers([officer], f"Officer {officer.full_name}", export_type)
             return _export_response(f"Officer {officer.full_name}", file_url, export_type)
     
+    for line in officer_field_lines(query, officer):
+        if line not in response:
+            response.append(line)
+    
     if not response:
         response.append(f"Name: {officer.full_name}")
         response.append(f"Rank: {officer.rank}")
@@ -420,6 +542,41 @@ def handle_single_officer(query, officer, export_type=None):
     
     return "\n".join(response)
 
+# Single fields asked for by name ("his blood group", "uski janm tithi")
+FIELD_QUESTIONS = [
+    (re.compile(r'blood|khoon'), 'Blood Group', 'blood_group'),
+    (re.compile(r'\bdob\b|birth|janm'), 'DOB', 'dob'),
+    (re.compile(r'\brank\b'), 'Rank', 'rank'),
+    (re.compile(r'\bunit\b|battalion'), 'Unit', 'unit'),
+    (re.compile(r'position|posted|posting|tainat'), 'Position', 'position'),
+    (re.compile(r'enlist|joining'), 'Enlistment Date', 'enlistment_date'),
+    (re.compile(r'phone|mobile|contact'), 'Phone', 'phone'),
+    (re.compile(r'email'), 'Email', 'email'),
+]
+
+def officer_field_lines(query, officer):
+    return [f"{label}: {getattr(officer, field)}" for pattern, label, field in FIELD_QUESTIONS if pattern.search(query)]
+
+def handle_results_follow_up(query, army_numbers, export_type=None):
+    """Answer "their phone numbers" / "export them" about the officers listed last"""
+    officers = list(Officer.objects.filter(army_number__in=army_numbers))
+    if not officers:
+        return "No officers found matching the criteria."
+    # Keep the order they were listed in
+    position = {number: i for i, number in enumerate(army_numbers)}
+    officers.sort(key=lambda o: position.get(o.army_number, len(position)))
+    
+    if export_type:
+        file_url = export_officers(officers, "Officers", export_type)
+        return _export_response("Officers", file_url, export_type)
+    
+    with span("format"):
+        response = []
+        for officer in officers:
+            lines = officer_field_lines(query, officer) or [f"Rank: {officer.rank}", f"Unit: {officer.unit}"]
+            response.append(f"Officer: {officer.full_name}\n" + "\n".join(lines))
+    return "\n\n".join(response)
+
 # ------------- Helper for formatted export response ------------- #
 def _export_response(title, file_url, export_type):
     return f"""
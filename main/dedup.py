@@ -0,0 +1,183 @@
+# main/dedup.py
+"""Near-duplicate officer detection.
+
+OCR misreads ("IC-12845" for "IC-12345", "Rajesh Kumr") get past the
+army_number uniqueness check and leave two records for one person.
+Comparing every officer with every other is quadratic, so records are
+first grouped by blocking keys and only officers sharing a key are scored:
+
+    dob:<date>              same date of birth
+    phone:<10 digits>       same phone number
+    name:<prefix>:<year>    a name token's first four letters + birth year
+
+Within a block the name, army number, date of birth and phone columns are
+scored all-against-all in one rapidfuzz.process.cdist call each and
+combined with NumPy into a weighted similarity in [0, 1]. Blocks bigger
+than DEDUP_MAX_BLOCK are skipped (a very common surname + year says little
+on its own; such pairs still meet through their dob or phone block).
+"""
+import logging
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Officer
+from .ocr_parser import normalize_phone
+from .utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+try:
+    from rapidfuzz import fuzz as rapid_fuzz
+    from rapidfuzz import process as rapid_process
+except ImportError:
+    rapid_process = None
+
+logger = logging.getLogger(__name__)
+
+# field: (weight, scorer)
+FIELD_WEIGHTS = {
+    'full_name': (0.45, 'token_sort_ratio'),
+    'army_number': (0.2, 'ratio'),
+    'dob': (0.2, 'ratio'),
+    'phone': (0.15, 'ratio'),
+}
+FIELDS = list(FIELD_WEIGHTS)
+NAME_PREFIX = 4
+MIN_TOKEN = 3
+
+_NON_ALNUM = re.compile(r'[^a-z0-9 ]+')
+
+
+def _threshold():
+    return getattr(settings, 'DEDUP_THRESHOLD', 0.85)
+
+
+def _max_block():
+    return getattr(settings, 'DEDUP_MAX_BLOCK', 500)
+
+
+def normalize_record(data):
+    """{field: comparable string} from an Officer, form cleaned_data or OCR fields"""
+    get = data.get if isinstance(data, dict) else lambda field, default='': getattr(data, field, default)
+    dob = get('dob', '') or ''
+    return {
+        'army_number': str(get('army_number', '') or '').strip().upper(),
+        'full_name': " ".join(_NON_ALNUM.sub(' ', str(get('full_name', '') or '').lower()).split()),
+        'dob': dob.isoformat() if isinstance(dob, date) else str(dob),
+        'phone': normalize_phone(str(get('phone', '') or '')),
+    }
+
+
+def blocking_keys(record):
+    keys = set()
+    if record['dob']:
+        keys.add(f"dob:{record['dob']}")
+    if record['phone']:
+        keys.add(f"phone:{record['phone']}")
+    year = record['dob'][:4]
+    for token in record['full_name'].split():
+        if len(token) >= MIN_TOKEN:
+            keys.add(f"name:{token[:NAME_PREFIX]}:{year}")
+    return keys
+
+
+def _score_matrix(left, right, scorer):
+    """len(left) x len(right) similarities in [0, 1]; 0 where either side is empty"""
+    if rapid_process is not None:
+        scores = rapid_process.cdist(left, right, scorer=getattr(rapid_fuzz, scorer), dtype=np.uint8, workers=-1)
+    else:
+        from thefuzz import fuzz
+        scores = np.array([[getattr(fuzz, scorer)(a, b) for b in right] for a in left], dtype=np.uint8)
+    scores = scores.astype(np.float32) / 100
+    present = np.array([bool(v) for v in left])[:, None] & np.array([bool(v) for v in right])[None, :]
+    return scores, present
+
+
+def similarity(left, right):
+    """Weighted similarity of every left record to every right record (fields missing on
+    either side are left out of that pair's average)"""
+    total = np.zeros((len(left), len(right)), dtype=np.float32)
+    weights = np.zeros_like(total)
+    for field, (weight, scorer) in FIELD_WEIGHTS.items():
+        scores, present = _score_matrix([r[field] for r in left], [r[field] for r in right], scorer)
+        total += np.where(present, scores * weight, 0)
+        weights += np.where(present, weight, 0)
+    return np.divide(total, weights, out=np.zeros_like(total), where=weights > 0)
+
+
+# -------------------- on create -------------------- #
+def _candidate_query(record):
+    query = Q()
+    if record['dob']:
+        query |= Q(dob=record['dob'])
+    if record['phone']:
+        query |= Q(phone=record['phone'])
+    if record['dob']:
+        for token in record['full_name'].split():
+            if len(token) >= MIN_TOKEN:
+                query |= Q(full_name__icontains=token[:NAME_PREFIX], dob__year=int(record['dob'][:4]))
+    return query
+
+
+def likely_duplicates(data, threshold=None, limit=5):
+    """[(officer, score)] existing officers that look like the same person as `data`"""
+    threshold = _threshold() if threshold is None else threshold
+    record = normalize_record(data)
+    query = _candidate_query(record)
+    if not query:
+        return []
+
+    candidates = list(Officer.objects.filter(query).exclude(army_number=record['army_number'])
+                      .only('army_number', 'full_name', 'rank', 'unit', 'dob', 'phone')[:_max_block()])
+    if not candidates:
+        return []
+    scores = similarity([record], [normalize_record(o) for o in candidates])[0]
+    order = np.argsort(-scores)
+    return [(candidates[i], float(scores[i])) for i in order[:limit] if scores[i] >= threshold]
+
+
+# -------------------- whole table -------------------- #
+def scan_duplicates(threshold=None, max_block=None, records=None):
+    """Likely duplicate pairs across the roster, best first, plus blocking stats.
+
+    Returns (pairs, stats); each pair is {"score", "a", "b"} with the two
+    army numbers. `records` (army_number/full_name/dob/phone dicts) defaults
+    to every officer.
+    """
+    threshold = _threshold() if threshold is None else threshold
+    max_block = max_block or _max_block()
+    if records is None:
+        records = Officer.objects.values('army_number', 'full_name', 'dob', 'phone').iterator(chunk_size=5000)
+    records = [normalize_record(r) for r in records]
+
+    blocks = {}
+    for index, record in enumerate(records):
+        for key in blocking_keys(record):
+            blocks.setdefault(key, []).append(index)
+
+    best = {}
+    stats = {'records': len(records), 'blocks': 0, 'skipped_blocks': 0, 'comparisons': 0}
+    for key, members in blocks.items():
+        if len(members) < 2:
+            continue
+        if len(members) > max_block:
+            stats['skipped_blocks'] += 1
+            logger.debug(f"Skipping block {key} ({len(members)} officers)")
+            continue
+        stats['blocks'] += 1
+        stats['comparisons'] += len(members) * (len(members) - 1) // 2
+        block = [records[i] for i in members]
+        scores = similarity(block, block)
+        rows, cols = np.nonzero(np.triu(scores >= threshold, k=1))
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            pair = (members[i], members[j]) if members[i] < members[j] else (members[j], members[i])
+            best[pair] = max(best.get(pair, 0.0), float(scores[i, j]))
+
+    stats['all_pairs'] = len(records) * (len(records) - 1) // 2
+    pairs = [{'score': round(score, 3), 'a': records[i]['army_number'], 'b': records[j]['army_number']}
+             for (i, j), score in best.items()]
+    pairs.sort(key=lambda p: -p['score'])
+    return pairs, stats
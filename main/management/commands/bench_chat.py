@@ -0,0 +1,101 @@
+# main/management/commands/bench_chat.py
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from main.chat_utils import process_query_v2, route_query
+from main.utils.bench import format_summary, latency_summary
+from main.utils.corpus import build_query_mix
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Command(BaseCommand):
+    help = ("Run a representative Hinglish/English query mix through process_query_v2 and report "
+            "per-intent latency percentiles, DB query counts and memory. "
+            "Load data first with generate_corpus (SQLite: --settings=chatbot.settings_sqlite).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=500, help='Number of queries to run')
+        parser.add_argument('--warmup', type=int, default=25)
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--skip-exports', action='store_true', help='Leave out PDF/Word/CSV exports')
+        parser.add_argument('--memory', action='store_true',
+                            help='Track peak Python allocations per query (slower)')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        mix = build_query_mix(options['queries'] + options['warmup'], seed=options['seed'],
+                              include_exports=not options['skip_exports'])
+        warmup, mix = mix[:options['warmup']], mix[options['warmup']:]
+        for _, query in warmup:
+            self._run_one(query)
+
+        stats = defaultdict(lambda: {'latencies': [], 'queries': [], 'peak_kb': [], 'errors': 0, 'routes': set()})
+        if options['memory']:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+        for label, query in mix:
+            entry = stats[label]
+            entry['routes'].add(route_query(query.lower()) or 'single')
+            if options['memory']:
+                tracemalloc.reset_peak()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                ok = self._run_one(query)
+                entry['latencies'].append(time.perf_counter() - start)
+            entry['queries'].append(len(captured.captured_queries))
+            if options['memory']:
+                entry['peak_kb'].append(tracemalloc.get_traced_memory()[1] / 1024)
+            if not ok:
+                entry['errors'] += 1
+        elapsed = time.perf_counter() - started
+
+        if options['memory']:
+            tracemalloc.stop()
+
+        results = self._report(stats, elapsed, len(mix))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
+
+    def _run_one(self, query):
+        try:
+            process_query_v2(query)
+            return True
+        except Exception:
+            return False
+
+    def _report(self, stats, elapsed, total):
+        results = {'total_queries': total, 'elapsed_s': elapsed, 'intents': {}}
+        self.stdout.write(f"{'intent':<18} {'route':<10} {'errors':>6} {'db q/req':>8}  latency")
+        for label in sorted(stats):
+            entry = stats[label]
+            summary = latency_summary(entry['latencies'])
+            db_queries = sum(entry['queries']) / len(entry['queries'])
+            routes = ",".join(sorted(entry['routes']))
+            line = f"{label:<18} {routes:<10} {entry['errors']:>6} {db_queries:>8.1f}  {format_summary(summary)}"
+            if entry['peak_kb']:
+                line += f"  peak={max(entry['peak_kb']):,.0f}KB"
+            self.stdout.write(line)
+            results['intents'][label] = dict(summary, routes=routes, errors=entry['errors'],
+                                              db_queries_per_request=db_queries,
+                                              peak_kb=max(entry['peak_kb']) if entry['peak_kb'] else None)
+
+        summary_line = f"\n{total} queries in {elapsed:.2f}s ({total / elapsed:.1f} q/s)"
+        if resource is not None:
+            # ru_maxrss is KB on Linux
+            results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            summary_line += f", max RSS {results['max_rss_kb'] / 1024:.1f} MB"
+        self.stdout.write(summary_line)
+        return results
@@ -0,0 +1,81 @@
+# main/management/commands/bench_db_pool.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.test import RequestFactory
+
+from main.backends.pool import pool_stats, reset_pools
+from main.views import chatbot_view
+
+DEFAULT_MESSAGES = [
+    "how many officers in delhi",
+    "total colonels",
+    "total awards",
+    "kitne officers after 2015",
+]
+
+MODES = {
+    # name: (pool enabled, CONN_MAX_AGE)
+    'no-pool': (False, 0),
+    'persistent': (False, 600),
+    'pooled': (True, 0),
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark chatbot_view requests/sec with and without DB connection pooling"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per mode')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads')
+        parser.add_argument('--message', action='append', dest='messages',
+                            help='Chat message to send (repeatable)')
+        parser.add_argument('--mode', action='append', dest='modes', choices=list(MODES),
+                            help='Only run the given mode(s)')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        messages = options['messages'] or DEFAULT_MESSAGES
+        settings_dict = connections[options['database']].settings_dict
+        original = (dict(settings_dict.get('POOL') or {}), settings_dict.get('CONN_MAX_AGE', 0))
+
+        self.stdout.write(f"Engine: {settings_dict['ENGINE']}  requests/mode: {options['requests']}  "
+                          f"threads: {options['threads']}")
+        try:
+            for mode in options['modes'] or list(MODES):
+                pool_enabled, max_age = MODES[mode]
+                settings_dict['POOL'] = dict(original[0], ENABLED=pool_enabled)
+                settings_dict['CONN_MAX_AGE'] = max_age
+                connections.close_all()
+                reset_pools()
+
+                elapsed = self._run(messages, options['requests'], options['threads'])
+                rps = options['requests'] / elapsed if elapsed else 0
+                self.stdout.write(f"{mode:<12} {rps:10.1f} req/s  ({elapsed:.2f}s)")
+                if pool_enabled:
+                    for alias, data in pool_stats().items():
+                        self.stdout.write(f"  pool[{alias}]: {data}")
+        finally:
+            settings_dict['POOL'], settings_dict['CONN_MAX_AGE'] = original
+            connections.close_all()
+            reset_pools()
+
+    def _run(self, messages, total, threads):
+        factory = RequestFactory()
+
+        def one_request(i):
+            # Mirror the WSGI handler: the finished signal closes (or pools) the connection
+            request_started.send(sender=self.__class__)
+            try:
+                request = factory.post('/chatbot/', {'message': messages[i % len(messages)]})
+                chatbot_view(request)
+            finally:
+                request_finished.send(sender=self.__class__)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(one_request, range(total)))
+        return time.perf_counter() - start
@@ -0,0 +1,70 @@
+# main/management/commands/bench_ocr.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.utils.bench import format_summary, latency_summary
+from main.utils.ocr_bench import STAGES, list_samples, run_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the OCR pipeline over a directory of labelled forms: per-stage time, "
+            "images/sec across a worker pool and per-field extraction accuracy")
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Images with <name>.json label files (see generate_ocr_samples)')
+        parser.add_argument('--workers', type=int, action='append',
+                            help='Worker processes (repeat to compare, e.g. --workers 1 --workers 4)')
+        parser.add_argument('--limit', type=int, help='Only use the first N images')
+        parser.add_argument('--tesseract-cmd', help='Path to the tesseract binary')
+        parser.add_argument('--engine', action='append', dest='engines',
+                            choices=['pytesseract', 'tesserocr', 'pool'],
+                            help='OCR engine(s) to compare (default: OCR_ENGINE setting)')
+        parser.add_argument('--mode', action='append', dest='modes', choices=['adaptive', 'full'],
+                            help='adaptive: fast pass, heavy pass only for low-confidence fields; '
+                                 'full: always the heavy pass (default: OCR_ADAPTIVE setting)')
+        parser.add_argument('--memory', action='store_true',
+                            help='Trace peak memory of decode + preprocess per image (slower)')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        samples = list_samples(options['directory'])[:options['limit']]
+        if not samples:
+            raise CommandError(f"No images found in {options['directory']}")
+
+        modes = [{'adaptive': True, 'full': False}[m] for m in options['modes'] or []] or [None]
+        all_results = []
+        for engine in options['engines'] or [None]:
+            for adaptive in modes:
+                runs = [self._run(samples, workers, engine, adaptive, options)
+                        for workers in options['workers'] or [1]]
+                all_results += runs
+                # Accuracy doesn't depend on the worker count
+                self._report_accuracy(runs[0])
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(all_results, f, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
+
+    def _run(self, samples, workers, engine, adaptive, options):
+        results = run_benchmark(samples, workers=workers, tesseract_cmd=options['tesseract_cmd'],
+                                engine=engine, memory=options['memory'], adaptive=adaptive)
+        self.stdout.write(f"\n{results['images']} images, engine {results['engine']}, mode {results['mode']}, "
+                          f"{workers} worker(s): {results['images_per_sec']:.2f} images/sec "
+                          f"({results['elapsed_s']:.1f}s), {results['escalation_rate'] * 100:.0f}% escalated")
+        for stage in STAGES:
+            self.stdout.write(f"  {stage:<11} {format_summary(latency_summary(results['stage_times'][stage]))}")
+        if results['peak_kb']:
+            self.stdout.write(f"  peak memory per image: avg {results['peak_kb']['avg']:,.0f}KB, "
+                              f"max {results['peak_kb']['max']:,.0f}KB")
+        return results
+
+    def _report_accuracy(self, results):
+        accuracy = results['field_accuracy']
+        if not accuracy:
+            return
+        self.stdout.write(f"\nField accuracy (engine {results['engine']}, mode {results['mode']}):")
+        for field, score in accuracy.items():
+            self.stdout.write(f"  {field:<16} {score * 100:6.1f}%")
+        self.stdout.write(f"  {'overall':<16} {sum(accuracy.values()) / len(accuracy) * 100:6.1f}%")
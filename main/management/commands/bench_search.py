@@ -0,0 +1,79 @@
+# main/management/commands/bench_search.py
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from haystack.backends.whoosh_backend import WhooshSearchBackend
+from haystack.query import SearchQuerySet
+
+from main.backends.whoosh import CachedWhooshSearchBackend
+from main.models import Award, Officer
+from main.utils.bench import format_summary, latency_summary
+
+MODES = {
+    # name: (backend class, extra connection options)
+    'stock': (WhooshSearchBackend, {}),
+    'searcher': (CachedWhooshSearchBackend, {'RESULT_CACHE_SIZE': 0}),
+    'cached': (CachedWhooshSearchBackend, {}),
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare Whoosh query latency: haystack's backend (new searcher per query), the cached "
+            "searcher, and cached searcher + result cache. Build the index first "
+            "(generate_corpus, then update_index).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000, help='Searches per mode')
+        parser.add_argument('--distinct', type=int, default=200,
+                            help='Distinct search terms the queries are drawn from')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--mode', action='append', dest='modes', choices=list(MODES),
+                            help='Only run the given mode(s)')
+        parser.add_argument('--using', default='default', help='Haystack connection')
+
+    def handle(self, *args, **options):
+        terms = self._terms(options['distinct'], options['seed'])
+        if not terms:
+            raise CommandError("No officers in the database; run generate_corpus and update_index first")
+        rng = random.Random(options['seed'])
+        mix = [rng.choice(terms) for _ in range(options['queries'])]
+        query_strings = {term: SearchQuerySet(using=options['using']).filter(content=term).query.build_query()
+                         for term in terms}
+
+        connection_options = settings.HAYSTACK_CONNECTIONS[options['using']]
+        self.stdout.write(f"Index: {connection_options.get('PATH')}  searches/mode: {len(mix)}  "
+                          f"distinct terms: {len(terms)}")
+
+        for mode in options['modes'] or list(MODES):
+            backend_class, extra = MODES[mode]
+            backend = backend_class(options['using'], **dict(connection_options, **extra))
+            if getattr(backend, 'result_cache', None) is not None:
+                backend.result_cache.clear()
+            # One warm-up search so every mode starts with the index opened
+            backend.search(query_strings[terms[0]], end_offset=5)
+
+            latencies, hits = [], 0
+            for term in mix:
+                start = time.perf_counter()
+                results = backend.search(query_strings[term], end_offset=5)
+                latencies.append(time.perf_counter() - start)
+                hits += bool(results.get('hits'))
+            self.stdout.write(f"{mode:<9} {format_summary(latency_summary(latencies))}  "
+                              f"with results: {hits / len(mix):.0%}")
+            if getattr(backend, 'result_cache', None) is not None:
+                self.stdout.write(f"          result cache: {backend.result_cache.snapshot()}")
+
+    def _terms(self, count, seed):
+        """Names, units, ranks and award names from the database, as users would type them"""
+        rng = random.Random(seed)
+        officers = list(Officer.objects.values_list('full_name', 'unit', 'rank')[:count * 5])
+        awards = list(Award.objects.values_list('award_name', flat=True).distinct()[:count])
+        pool = set()
+        for full_name, unit, rank in officers:
+            pool.update(filter(None, (full_name, unit, rank)))
+        pool.update(filter(None, awards))
+        pool = sorted(pool)
+        rng.shuffle(pool)
+        return pool[:count]
@@ -0,0 +1,88 @@
+# main/management/commands/bench_shared_cache.py
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.utils.bench import format_summary, latency_summary
+from main.utils.corpus import build_query_mix
+
+
+def _init_worker(shared_enabled):
+    # Spawned workers start from a bare interpreter, like separate gunicorn workers
+    import django
+    django.setup()
+    from django.conf import settings as worker_settings
+    worker_settings.SHARED_CACHE_ENABLED = shared_enabled
+
+
+def _run_worker(args):
+    index, mix, seed = args
+    from main.chat_utils import process_query_v2
+    from main.utils import shared_cache
+    from main.utils.officer_cache import officer_cache
+
+    order = list(mix)
+    random.Random(seed + index).shuffle(order)
+    latencies, errors = [], 0
+    for _, query in order:
+        start = time.perf_counter()
+        try:
+            process_query_v2(query)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    return {
+        'worker': index,
+        'latencies': latencies,
+        'errors': errors,
+        'officer_cache': officer_cache.snapshot(),
+        'shared_cache': shared_cache.stats(),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Run the same chatbot query mix in several worker processes with per-process caches only "
+            "('local') and with the shared SQLite cache ('shared'), and report hit rates and latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--queries', type=int, default=300, help='Queries per worker')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--mode', action='append', dest='modes', choices=['local', 'shared'],
+                            help='Only run the given mode(s)')
+
+    def handle(self, *args, **options):
+        from main.utils import shared_cache
+
+        mix = build_query_mix(options['queries'], seed=options['seed'], include_exports=False)
+        self.stdout.write(f"workers: {options['workers']}  queries/worker: {len(mix)}")
+
+        for mode in options['modes'] or ['local', 'shared']:
+            if mode == 'shared':
+                cache = shared_cache.get_cache()
+                if cache is None:
+                    raise CommandError(f"No '{getattr(settings, 'SHARED_CACHE_ALIAS', 'shared')}' cache "
+                                       f"configured in CACHES (or SHARED_CACHE_ENABLED is False)")
+                cache.clear()
+
+            context = multiprocessing.get_context('spawn')
+            jobs = [(i, mix, options['seed']) for i in range(options['workers'])]
+            start = time.perf_counter()
+            with context.Pool(options['workers'], initializer=_init_worker, initargs=(mode == 'shared',)) as pool:
+                results = pool.map(_run_worker, jobs)
+            elapsed = time.perf_counter() - start
+
+            latencies = [latency for result in results for latency in result['latencies']]
+            self.stdout.write(f"{mode:<7} {len(latencies) / elapsed:8.1f} q/s  "
+                              f"{format_summary(latency_summary(latencies))}")
+            for result in results:
+                self.stdout.write(f"  worker {result['worker']}: {format_summary(latency_summary(result['latencies']))}"
+                                  f"  errors={result['errors']}")
+                self.stdout.write(f"    officer cache: {result['officer_cache']}")
+                for namespace, counts in sorted(result['shared_cache'].items()):
+                    lookups = counts['hits'] + counts['misses']
+                    rate = counts['hits'] / lookups if lookups else 0
+                    self.stdout.write(f"    shared {namespace:<8} hit rate {rate:.0%}  {counts}")
@@ -0,0 +1,34 @@
+# main/management/commands/build_similarity_index.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.chat_similarity import build_index, describe_matches, index_dir, similar_records
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the character n-gram TF-IDF index the chatbot falls back on when Whoosh finds "
+            "nothing (main/chat_similarity.py)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--features', type=int, help='Hashed n-gram columns (default SIMILARITY_N_FEATURES)')
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Search the new index and show the matches and latency (repeatable)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        manifest = build_index(n_features=options['features'])
+        self.stdout.write(f"Generation {manifest['generation']}: {manifest['records']} records, "
+                          f"{manifest['nnz']} non-zeros, {manifest['n_features']} columns "
+                          f"in {time.perf_counter() - start:.1f}s -> {index_dir()}")
+
+        for query in options['queries'] or []:
+            similar_records(query)  # first search loads the generation
+            start = time.perf_counter()
+            matches = similar_records(query)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(f"\n{query!r}: {len(matches)} match(es) in {elapsed:.2f}ms")
+            for key, score in matches:
+                self.stdout.write(f"  {score:.3f}  {key}")
+            for line in describe_matches(matches):
+                self.stdout.write(f"  {line}")
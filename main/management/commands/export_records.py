@@ -0,0 +1,60 @@
+# main/management/commands/export_records.py
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import change_log
+from main.bulk_records import FORMATS, MODEL_ORDER, export_lines
+
+
+class Command(BaseCommand):
+    help = ("Export officers, education, family or award rows as CSV or JSON Lines (the import_records layout). "
+            "With --since or --cursor-file, only the officers changed since the cursor (delta export)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODEL_ORDER)
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--since', type=int, help='Cursor printed by the previous export')
+        parser.add_argument('--cursor-file',
+                            help='Read --since from this file (full export if it does not exist) '
+                                 'and store the next cursor in it once the export is written')
+
+    def handle(self, *args, **options):
+        since = options['since']
+        cursor_file = options['cursor_file']
+        if since is None and cursor_file and os.path.exists(cursor_file):
+            with open(cursor_file, encoding='utf-8') as f:
+                try:
+                    since = int(f.read().strip())
+                except ValueError:
+                    raise CommandError(f"{cursor_file} does not hold a cursor")
+
+        if since is not None:
+            try:
+                change_log.check_cursor(since)
+            except change_log.CursorExpired as e:
+                hint = f" (delete {cursor_file} to do so)" if cursor_file else ""
+                raise CommandError(f"{e}{hint}")
+
+        # Taken before reading any rows: changes made during the export are sent again next time
+        cursor = change_log.current_cursor()
+        if since is None:
+            lines = export_lines(options['model'], options['format'])
+        else:
+            lines = change_log.delta_lines(options['model'], since, cursor, options['format'])
+
+        out = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for line in lines:
+                out.write(line)
+        finally:
+            if options['output']:
+                out.close()
+                self.stderr.write(f"Wrote {options['output']}")
+
+        if cursor_file:
+            with open(cursor_file, 'w', encoding='utf-8') as f:
+                f.write(f"{cursor}\n")
+        self.stderr.write(f"Next cursor: {cursor}" + (f" (changes after {since})" if since is not None else ""))
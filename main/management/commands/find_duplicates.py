@@ -0,0 +1,41 @@
+# main/management/commands/find_duplicates.py
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.dedup import scan_duplicates
+from main.models import Officer
+
+
+class Command(BaseCommand):
+    help = ("Scan the roster for likely duplicate officers (blocked on name tokens, date of birth and "
+            "phone; see main/dedup.py)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, help='Minimum similarity, 0-1 (default DEDUP_THRESHOLD)')
+        parser.add_argument('--max-block', type=int, help='Skip blocks with more officers (default DEDUP_MAX_BLOCK)')
+        parser.add_argument('--limit', type=int, default=50, help='Pairs to print')
+        parser.add_argument('--json', dest='json_path', help='Write every pair to this file')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        pairs, stats = scan_duplicates(threshold=options['threshold'], max_block=options['max_block'])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"{stats['records']} officers, {stats['blocks']} blocks "
+                          f"({stats['skipped_blocks']} oversized skipped), {stats['comparisons']} comparisons "
+                          f"instead of {stats['all_pairs']}, {elapsed:.2f}s")
+        self.stdout.write(f"{len(pairs)} likely duplicate pair(s)")
+
+        shown = pairs[:options['limit']]
+        names = dict(Officer.objects.filter(army_number__in={p['a'] for p in shown} | {p['b'] for p in shown})
+                     .values_list('army_number', 'full_name'))
+        for pair in shown:
+            self.stdout.write(f"  {pair['score']:.3f}  {pair['a']} ({names.get(pair['a'], '?')})  ~  "
+                              f"{pair['b']} ({names.get(pair['b'], '?')})")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'stats': stats, 'pairs': pairs}, f, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
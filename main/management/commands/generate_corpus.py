@@ -0,0 +1,40 @@
+# main/management/commands/generate_corpus.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.models import Officer
+from main.utils.corpus import ARMY_NUMBER_PREFIX, clear_corpus, generate_corpus
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic officers with family, education and award records for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--officers', type=int, default=1000, help='Number of officers (1k to 1M)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--clear', action='store_true',
+                            help=f'Delete existing {ARMY_NUMBER_PREFIX}* officers first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted, _ = clear_corpus()
+            self.stdout.write(f"Deleted {deleted} synthetic rows")
+
+        # Continue numbering after any corpus that is already loaded
+        start = Officer.objects.filter(army_number__startswith=ARMY_NUMBER_PREFIX).count() + 1
+
+        started = time.perf_counter()
+
+        def progress(totals):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {totals['officers']:>8} officers  ({totals['officers'] / elapsed:,.0f}/s)")
+
+        totals = generate_corpus(options['officers'], seed=options['seed'] + start,
+                                 chunk_size=options['chunk_size'], start=start, progress=progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {totals['officers']} officers, {totals['family']} family, "
+            f"{totals['education']} education and {totals['awards']} award rows in {elapsed:.1f}s"
+        ))
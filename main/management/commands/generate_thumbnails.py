@@ -0,0 +1,32 @@
+# main/management/commands/generate_thumbnails.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.models import Officer
+from main.utils.thumbnails import generate_derivatives
+
+
+class Command(BaseCommand):
+    help = "Generate resized photo variants (PHOTO_VARIANTS) for officers that have a photo"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-render variants that already exist')
+        parser.add_argument('--missing', action='store_true', help='Only officers without a photo hash yet')
+
+    def handle(self, *args, **options):
+        officers = Officer.objects.exclude(photo='').exclude(photo__isnull=True)
+        if options['missing']:
+            officers = officers.filter(photo_hash='')
+
+        started = time.perf_counter()
+        done = failed = 0
+        for officer in officers.iterator(chunk_size=200):
+            try:
+                generate_derivatives(officer, force=options['force'])
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"  {officer.army_number}: {e}")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} photos in {elapsed:.1f}s ({failed} failed)"))
@@ -0,0 +1,59 @@
+# main/management/commands/import_records.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.bulk_records import CONFLICT_MODES, FORMATS, MODEL_ORDER, detect_format, import_records, read_rows
+
+
+class Command(BaseCommand):
+    help = ("Bulk-import officers, education, family and award rows from CSV or JSON Lines. "
+            "Rows are validated with the data-entry forms and written in chunked transactions; "
+            "the search index is updated once at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON Lines file')
+        parser.add_argument('--model', choices=MODEL_ORDER,
+                            help='Model for rows without a "model" column')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction (default IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--on-conflict', choices=CONFLICT_MODES, default='skip',
+                            help='What to do with officers that already exist')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; roll every chunk back')
+        parser.add_argument('--no-index', action='store_true', help='Skip the search index update')
+        parser.add_argument('--json', dest='json_path', help='Also write the report to this file')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        try:
+            stream = open(options['path'], 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        with stream:
+            report = import_records(
+                read_rows(stream, fmt),
+                model=options['model'],
+                chunk_size=options['chunk_size'],
+                on_conflict=options['on_conflict'],
+                dry_run=options['dry_run'],
+                index=not options['no_index'],
+            )
+
+        for name, counts in report['models'].items():
+            self.stdout.write(f"  {name:<10} " + "  ".join(f"{k} {v}" for k, v in counts.items()))
+        for error in report['errors']:
+            self.stderr.write(f"  row {error['row']} ({error['model']}): {error['error']}")
+        if report['invalid'] > len(report['errors']):
+            self.stderr.write(f"  ... {report['invalid'] - len(report['errors'])} more invalid rows")
+
+        summary = (f"{report['rows']} rows in {report['elapsed_s']:.1f}s ({report['rows_per_sec']:,.0f} rows/sec), "
+                   f"{report['invalid']} invalid")
+        if options['dry_run']:
+            summary += " (dry run, nothing saved)"
+        self.stdout.write(self.style.SUCCESS(summary) if not report['invalid'] else self.style.WARNING(summary))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
@@ -0,0 +1,32 @@
+# main/management/commands/import_report.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.utils.lazy import HEAVY_MODULES, probe_imports
+
+
+class Command(BaseCommand):
+    help = ("Measure worker start-up: import a module (default main.urls) in a fresh interpreter and "
+            "report total time, peak RSS, the slowest imports and which heavy libraries got loaded")
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', nargs='?', default='main.urls')
+        parser.add_argument('--top', type=int, default=20, help='Slowest imports to list')
+
+    def handle(self, *args, **options):
+        report = probe_imports(options['target'], importtime=True, cwd=str(settings.BASE_DIR))
+
+        self.stdout.write(f"Importing {options['target']} (with django.setup()): {report['elapsed_ms']:.0f}ms"
+                          + (f", max RSS {report['rss_kb'] / 1024:.1f} MB" if report['rss_kb'] else ""))
+
+        self.stdout.write(f"\n{'cumulative':>12} {'self':>10}  module")
+        # Top-level entries only (nested ones are already in their parent's cumulative time)
+        top_level = [row for row in report['importtime'] if not row[2].startswith('  ')]
+        for cumulative_us, self_us, name in sorted(top_level, reverse=True)[:options['top']]:
+            self.stdout.write(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name.strip()}")
+
+        loaded = report['loaded']
+        self.stdout.write("")
+        for module in HEAVY_MODULES:
+            state = self.style.WARNING("loaded") if module in loaded else "deferred"
+            self.stdout.write(f"  {module:<12} {state}")
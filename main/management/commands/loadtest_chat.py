@@ -0,0 +1,159 @@
+# main/management/commands/loadtest_chat.py
+import asyncio
+import contextlib
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from main.utils.bench import format_summary, latency_summary
+
+DEFAULT_MESSAGES = [
+    "how many officers in delhi",
+    "total colonels",
+    "list all officers in punjab",
+    "basic details of 12345",
+    "family details of rajesh kumar",
+]
+
+# Background load for --heavy: exports and long lists (admission classes 'export' / 'heavy_chat')
+HEAVY_MESSAGES = [
+    "export all officers in delhi as pdf",
+    "list all officers in punjab in excel",
+    "list all colonels",
+]
+
+
+class Command(BaseCommand):
+    help = ("Load test the chatbot endpoint and report throughput and p99 latency. "
+            "By default compares the sync view on the WSGI handler with the async view "
+            "on the ASGI handler in-process; use --url to hit running servers instead "
+            "(e.g. gunicorn vs uvicorn).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--message', action='append', dest='messages')
+        parser.add_argument('--url', action='append', dest='urls',
+                            help='Full chatbot URL of a running server (repeatable)')
+        parser.add_argument('--heavy', type=int, default=0,
+                            help='Threads posting export/list queries in the background, to see '
+                                 'whether cheap lookups keep their latency (admission control)')
+
+    def handle(self, *args, **options):
+        messages = options['messages'] or DEFAULT_MESSAGES
+        total, concurrency = options['requests'], options['concurrency']
+        self.stdout.write(f"requests: {total}  concurrency: {concurrency}")
+
+        if options['urls']:
+            for url in options['urls']:
+                with self._heavy_load(options['heavy'], url):
+                    self._report(url, *self._run_http(url, messages, total, concurrency))
+            return
+
+        with self._heavy_load(options['heavy']):
+            self._report('wsgi  /chatbot/', *self._run_wsgi(messages, total, concurrency))
+        with self._heavy_load(options['heavy']):
+            self._report('asgi  /chatbot/async/', *asyncio.run(self._run_asgi(messages, total, concurrency)))
+
+    @contextlib.contextmanager
+    def _heavy_load(self, threads, url=None):
+        """Keep `threads` heavy requests in flight while the block runs; report how they fared"""
+        if not threads:
+            yield
+            return
+        stop = threading.Event()
+        counts = {'ok': 0, 'shed': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def post(message):
+            if url is None:
+                return Client().post('/chatbot/', {'message': message}).status_code
+            data = urllib.parse.urlencode({'message': message}).encode()
+            try:
+                with urllib.request.urlopen(url, data=data, timeout=120) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+            except OSError:
+                return 0
+
+        def loop(i):
+            while not stop.is_set():
+                status = post(HEAVY_MESSAGES[i % len(HEAVY_MESSAGES)])
+                outcome = 'ok' if status == 200 else 'shed' if status in (429, 503) else 'errors'
+                with lock:
+                    counts[outcome] += 1
+                i += 1
+
+        workers = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+            self.stdout.write(f"  background heavy requests: {counts}")
+
+    def _report(self, label, latencies, elapsed, errors):
+        rps = len(latencies) / elapsed if elapsed else 0
+        self.stdout.write(f"{label:<24} {rps:8.1f} req/s  errors={errors}  {format_summary(latency_summary(latencies))}")
+
+    def _run_threads(self, one_request, total, concurrency):
+        latencies, errors = [], 0
+
+        def timed(i):
+            start = time.perf_counter()
+            ok = one_request(i)
+            return time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for latency, ok in executor.map(timed, range(total)):
+                latencies.append(latency)
+                errors += 0 if ok else 1
+        return latencies, time.perf_counter() - start, errors
+
+    def _run_wsgi(self, messages, total, concurrency):
+        def one_request(i):
+            response = Client().post('/chatbot/', {'message': messages[i % len(messages)]})
+            return response.status_code == 200
+
+        return self._run_threads(one_request, total, concurrency)
+
+    def _run_http(self, url, messages, total, concurrency):
+        def one_request(i):
+            data = urllib.parse.urlencode({'message': messages[i % len(messages)]}).encode()
+            try:
+                with urllib.request.urlopen(url, data=data, timeout=60) as response:
+                    response.read()
+                    return response.status == 200
+            except OSError:
+                return False
+
+        return self._run_threads(one_request, total, concurrency)
+
+    async def _run_asgi(self, messages, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def one_request(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await AsyncClient().post('/chatbot/async/', {'message': messages[i % len(messages)]})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request(i) for i in range(total)))
+        return latencies, time.perf_counter() - start, errors
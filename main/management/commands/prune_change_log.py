@@ -0,0 +1,17 @@
+# main/management/commands/prune_change_log.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main import change_log
+
+
+class Command(BaseCommand):
+    help = ("Delete change log entries older than --days. Delta exports from an older cursor "
+            "are refused from then on (HTTP 410), so such syncs must start again with a full export.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'CHANGELOG_RETENTION_DAYS', 30))
+
+    def handle(self, *args, **options):
+        deleted = change_log.prune(options['days'])
+        self.stdout.write(f"Deleted {deleted} changes older than {options['days']} days")
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='officer',
+            name='photo_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+    ]
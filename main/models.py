@@ -13,6 +13,8 @@ class Officer(models.Model):
     address = models.TextField()
     blood_group = models.CharField(max_length=5)
     photo = models.ImageField(upload_to='photos/', blank=True, null=True)
+    # SHA-1 of the photo; names its resized copies (main/utils/thumbnails.py)
+    photo_hash = models.CharField(max_length=40, blank=True, default='', editable=False)
 
     def __str__(self):
         return f"{self.rank} {self.full_name} ({self.army_number})"
@@ -49,4 +51,32 @@ class Award(models.Model):
     location = models.CharField(max_length=100)
 
     def __str__(self):
-        return f"{self.award_name} - {self.officer.full_name}"
\ No newline at end of file
+        return f"{self.award_name} - {self.officer.full_name}"
+
+class RecordChange(models.Model):
+    """One saved/deleted Officer, Education, Family or Award row (main/change_log.py).
+
+    The id is the sync cursor: a delta export sends every officer named by
+    changes after the caller's last id.
+    """
+    model = models.CharField(max_length=20)
+    army_number = models.CharField(max_length=20)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'id'], name='main_recordchange_model_id')]
+
+    def __str__(self):
+        return f"{self.model} {self.army_number} ({self.id})"
+
+
+class ChangeLogHorizon(models.Model):
+    """Highest change id the change log no longer holds (main/change_log.py prune).
+
+    A delta export from an older cursor would miss changes; one row, pk=1.
+    """
+    pruned_through = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"changes through {self.pruned_through} pruned"
@@ -0,0 +1,175 @@
+# main/ocr_document.py
+"""Multi-page document ingestion for OCR.
+
+Scanned service records often arrive as one multi-page PDF or TIFF.
+iter_pages() rasterises them one page at a time, iter_page_results() runs
+the extract_fields stages on a few pages in parallel (never more than
+OCR_PAGE_WORKERS + 1 page bitmaps alive at once) and merge_pages() keeps,
+for every field, the value from the page where it was read most
+confidently.
+
+stream_document() serialises the same flow as JSON lines:
+    {"event": "page", "page": 1, "fields": {...}, "confidence": {...}, "escalated": false, "text": "..."}
+    {"event": "result", "data": {...}}
+    {"event": "error", "message": "..."}
+    {"event": "done"}
+"""
+import io
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from PIL import Image, ImageSequence
+
+from .ocr_utils import load_image, ocr_fields
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def document_kind(content):
+    """'pdf', 'tiff' or 'image' from the file's magic bytes"""
+    if content[:5] == b'%PDF-':
+        return 'pdf'
+    if content[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    return 'image'
+
+
+def _pdf_pages(content, dpi):
+    if pypdfium2 is not None:
+        pdf = pypdfium2.PdfDocument(content)
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                try:
+                    yield page.render(scale=dpi / 72, grayscale=True).to_pil()
+                finally:
+                    page.close()
+        finally:
+            pdf.close()
+        return
+
+    try:
+        from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+    except ImportError:
+        raise RuntimeError("PDF support needs pypdfium2 or pdf2image (with poppler) installed")
+
+    page_count = pdfinfo_from_bytes(content)['Pages']
+    for number in range(1, page_count + 1):
+        # One page per call so poppler never hands back the whole document
+        yield convert_from_bytes(content, dpi=dpi, first_page=number, last_page=number, grayscale=True)[0]
+
+
+def _tiff_pages(content):
+    with Image.open(io.BytesIO(content)) as tiff:
+        for frame in ImageSequence.Iterator(tiff):
+            # copy() detaches the frame; the next seek replaces the decoded data
+            yield frame.copy()
+
+
+def _single_page(content):
+    yield load_image(content)
+
+
+def iter_pages(content, dpi=None, max_pages=None):
+    """Yield (page_number, image) lazily, one rasterised page at a time"""
+    dpi = dpi or _setting('OCR_PDF_DPI', 300)
+    max_pages = max_pages or _setting('OCR_MAX_PAGES', 50)
+    kind = document_kind(content)
+
+    if kind == 'pdf':
+        pages = _pdf_pages(content, dpi)
+    elif kind == 'tiff':
+        pages = _tiff_pages(content)
+    else:
+        pages = _single_page(content)
+
+    for number, image in enumerate(pages, start=1):
+        if number > max_pages:
+            logger.warning(f"Document has more than {max_pages} pages; ignoring the rest")
+            pages.close()
+            break
+        yield number, image
+
+
+def process_page(number, image):
+    """Run one page through the extract_fields stages"""
+    result = ocr_fields(image)
+    return {
+        'page': number,
+        'fields': result['fields'],
+        'confidence': result['confidence'],
+        'escalated': result['escalated'],
+        'text': result['text'],
+    }
+
+
+def iter_page_results(content, dpi=None, workers=None, max_pages=None):
+    """Yield process_page() results in page order, `workers` pages in flight at most"""
+    workers = workers or _setting('OCR_PAGE_WORKERS', 2)
+    pages = iter_pages(content, dpi=dpi, max_pages=max_pages)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for number, image in pages:
+            pending.append(executor.submit(process_page, number, image))
+            # Drop our reference so the bitmap is freed once its page is done
+            del image
+            if len(pending) >= workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def merge_pages(results):
+    """Combine page results; each field takes its most confident value (earliest page on ties)"""
+    merged, confidence, sources, texts = {}, {}, {}, []
+    for result in results:
+        texts.append(f"--- Page {result['page']} ---\n{result['text']}")
+        for field, value in result['fields'].items():
+            score = result['confidence'][field]
+            if field not in merged or score > confidence[field]:
+                merged[field] = value
+                confidence[field] = score
+                sources[field] = result['page'] if value else None
+
+    merged['full_text'] = "\n\n".join(texts)
+    merged['pages'] = len(texts)
+    merged['confidence'] = confidence
+    merged['field_pages'] = sources
+    return merged
+
+
+def extract_document(content, dpi=None, workers=None):
+    """extract_fields for multi-page PDF/TIFF documents (single images work too)"""
+    try:
+        return merge_pages(iter_page_results(content, dpi=dpi, workers=workers))
+    except Exception as e:
+        logger.error(f"Document extraction error: {str(e)}")
+        return {"error": str(e)}
+
+
+def stream_document(content, dpi=None, workers=None):
+    """JSON lines: one "page" event per page, then the merged "result" and "done" """
+    results = []
+    try:
+        for result in iter_page_results(content, dpi=dpi, workers=workers):
+            results.append(result)
+            yield json.dumps({'event': 'page', **result}) + "\n"
+        yield json.dumps({'event': 'result', 'data': merge_pages(results)}) + "\n"
+    except Exception as e:
+        logger.error(f"Document extraction error: {str(e)}")
+        yield json.dumps({'event': 'error', 'message': str(e)}) + "\n"
+        return
+    yield json.dumps({'event': 'done'}) + "\n"
@@ -0,0 +1,246 @@
+# main/ocr_parser.py
+"""Single-pass extraction of officer form fields from OCR text.
+
+One precompiled regex walks the text once and yields every label
+("Date of Birth", "Mobile", ...), every typed value (dates, phones, emails,
+blood groups) and every line break, with its position. Typed values are
+then given to the field whose label is nearest before them, and free-text
+fields (name, rank, unit, ...) take the rest of their label's line.
+
+Values come out in the formats Officer / OfficerForm accept: ISO dates,
+10-digit phone numbers, "AB+" blood groups.
+"""
+import re
+from datetime import date
+
+FIELDS = ['army_number', 'full_name', 'rank', 'position', 'unit', 'dob', 'enlistment_date',
+          'phone', 'email', 'blood_group', 'address']
+
+# Label alternatives per field; longer labels first where they share words
+LABELS = {
+    'email': r'e-?mail(?:\s*(?:id|address))?',
+    'army_number': r'army\s*(?:id\s*)?(?:number|no\b\.?)|service\s*(?:number|no\b\.?)|\bid\s*(?:number|no\b\.?)|\bid\b',
+    'full_name': r'full\s*name|\bname\b',
+    'rank': r'\brank\b',
+    'position': r'\bposition\b|\bpost\b|\bappointment\b',
+    'unit': r'\bunit\b',
+    'dob': r'date\s*of\s*birth|\bd\.?o\.?b\b\.?|\bborn\b',
+    'enlistment_date': r'date\s*of\s*enlist\w*|enlist\w*(?:\s*date)?|date\s*of\s*commission|commission\w*(?:\s*date)?',
+    'phone': r'\bphone\b(?:\s*(?:number|no\b\.?))?|\bmobile\b(?:\s*(?:number|no\b\.?))?|\bcontact\b(?:\s*(?:number|no\b\.?))?|\btel\b\.?',
+    'blood_group': r'blood\s*group|\bb\.?\s?g\b\.?',
+    'address': r'\baddress\b',
+}
+
+MONTHS = {m: i for i, m in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)}
+
+VALUES = {
+    'date': r'\b\d{1,2}[/.-]\d{1,2}[/.-]\d{4}\b|\b\d{4}-\d{2}-\d{2}\b'
+            r'|\b\d{1,2}(?:st|nd|rd|th)?[\s-]+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?[\s,-]+\d{4}\b',
+    'email': r'[\w.%+-]+@[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}',
+    'phone': r'(?<![\w/])\+?\(?\d[\d \t().-]{8,16}\d(?![\w/])',
+    'blood': r'(?<!\w)(?:ab|a|b|o)\s?(?:[+-]\s?ve\b|\(?[+-]\)?(?!\d)|pos(?:itive)?\b|neg(?:ative)?\b)',
+}
+
+# Values first: at any position a value wins over a label inside it (e.g. "id" in an email)
+TOKEN_RE = re.compile(
+    "|".join(f"(?P<v_{kind}>{pattern})" for kind, pattern in VALUES.items())
+    + "|" + "|".join(f"(?P<l_{field}>{pattern})" for field, pattern in LABELS.items())
+    + r"|(?P<nl>\n)",
+    re.IGNORECASE,
+)
+
+TYPED_FIELDS = {'dob': 'date', 'enlistment_date': 'date', 'phone': 'phone', 'email': 'email', 'blood_group': 'blood'}
+TEXT_FIELDS = ['army_number', 'full_name', 'rank', 'position', 'unit']
+# How many lines below its label a typed value may sit
+MAX_LINE_GAP = 2
+ADDRESS_LINES = 4
+
+_NUMERIC_DATE = re.compile(r'(\d{1,4})[/.-](\d{1,2})[/.-](\d{1,4})')
+_NAMED_DATE = re.compile(r'(\d{1,2})(?:st|nd|rd|th)?[\s-]+([a-z]{3})[a-z]*\.?[\s,-]+(\d{4})', re.IGNORECASE)
+_NON_DIGIT = re.compile(r'\D')
+_VALUE_STRIP = ' \t:;.-=|_'
+
+
+class Token:
+    __slots__ = ('kind', 'name', 'start', 'end', 'line', 'text')
+
+    def __init__(self, kind, name, start, end, line, text):
+        self.kind = kind      # 'label' or 'value'
+        self.name = name      # field for labels, value type for values
+        self.start = start
+        self.end = end
+        self.line = line
+        self.text = text
+
+
+# -------------------- normalisation -------------------- #
+def normalize_date(raw):
+    """ISO date (YYYY-MM-DD) from day-first, ISO or '12 Mar 1985' text; '' if it isn't a real date"""
+    match = _NAMED_DATE.match(raw)
+    if match:
+        day, month, year = int(match.group(1)), MONTHS.get(match.group(2).lower()), int(match.group(3))
+    else:
+        match = _NUMERIC_DATE.match(raw)
+        if not match:
+            return ""
+        a, b, c = match.groups()
+        if len(a) == 4:
+            year, month, day = int(a), int(b), int(c)
+        else:
+            day, month, year = int(a), int(b), int(c)
+            if month > 12 >= day:  # month-first
+                day, month = month, day
+    try:
+        return date(year, month, day).isoformat()
+    except (TypeError, ValueError):
+        return ""
+
+
+def normalize_phone(raw):
+    """Ten-digit number without country code or trunk prefix; '' if it can't be one"""
+    digits = _NON_DIGIT.sub('', raw)
+    if len(digits) > 10 and (digits.startswith('91') or digits.startswith('0')):
+        digits = digits[-10:]
+    return digits if len(digits) == 10 else ""
+
+
+def normalize_blood_group(raw):
+    compact = raw.upper().replace(' ', '').replace('(', '').replace(')', '')
+    group = re.match(r'AB|A|B|O', compact).group()
+    negative = '-' in compact or 'NEG' in compact
+    return group + ('-' if negative else '+')
+
+
+def normalize_value(field, raw):
+    """Bring a raw field value into the format OfficerForm expects"""
+    raw = (raw or "").strip()
+    if not raw:
+        return ""
+    kind = TYPED_FIELDS.get(field)
+    if kind == 'date':
+        return normalize_date(raw)
+    if kind == 'phone':
+        return normalize_phone(raw)
+    if kind == 'email':
+        return raw.lower().rstrip('.')
+    if kind == 'blood':
+        return normalize_blood_group(raw)
+    if field == 'army_number':
+        return re.sub(r'[^A-Z0-9/-]', '', raw.upper())[:20]
+    if field == 'address':
+        return raw
+    return raw.title()
+
+
+# -------------------- scanning -------------------- #
+def tokenize(text):
+    """(tokens, line_starts) from a single pass over the text"""
+    tokens, line_starts = [], [0]
+    for match in TOKEN_RE.finditer(text):
+        group = match.lastgroup
+        if group == 'nl':
+            line_starts.append(match.end())
+            continue
+        kind = 'value' if group.startswith('v_') else 'label'
+        tokens.append(Token(kind, group[2:], match.start(), match.end(), len(line_starts) - 1, match.group()))
+    return tokens, line_starts
+
+
+def _line_bounds(line_starts, line, text):
+    start = line_starts[line]
+    end = line_starts[line + 1] - 1 if line + 1 < len(line_starts) else len(text)
+    return start, end
+
+
+def _text_after(label, labels, text, line_starts):
+    """Rest of the label's line (up to the next label), or the next non-empty line"""
+    _, line_end = _line_bounds(line_starts, label.line, text)
+    cut = min((l.start for l in labels if l.line == label.line and l.start > label.start), default=line_end)
+    value = text[label.end:cut].strip(_VALUE_STRIP)
+    if value:
+        return value
+
+    for line in range(label.line + 1, min(label.line + 1 + MAX_LINE_GAP, len(line_starts))):
+        start, end = _line_bounds(line_starts, line, text)
+        first_label = min((l.start for l in labels if l.line == line), default=end)
+        value = text[start:first_label].strip(_VALUE_STRIP)
+        if value:
+            return value
+        if first_label < end:
+            break
+    return ""
+
+
+def _address_after(label, labels, text, line_starts):
+    parts = []
+    _, line_end = _line_bounds(line_starts, label.line, text)
+    same_line = text[label.end:line_end].strip(_VALUE_STRIP)
+    if same_line:
+        parts.append(same_line)
+    labelled_lines = {l.line for l in labels}
+    for line in range(label.line + 1, len(line_starts)):
+        if len(parts) >= ADDRESS_LINES + bool(same_line) or line in labelled_lines:
+            break
+        start, end = _line_bounds(line_starts, line, text)
+        value = text[start:end].strip(_VALUE_STRIP)
+        if value:
+            parts.append(value)
+    return ", ".join(parts)
+
+
+def scan_fields(text):
+    """{field: (value, raw)} for every form field; raw is the text the value was read from"""
+    tokens, line_starts = tokenize(text)
+    labels = [t for t in tokens if t.kind == 'label']
+    first_label = {}
+    for label in labels:
+        first_label.setdefault(label.name, label)
+
+    candidates = {kind: [] for kind in VALUES}
+    for token in tokens:
+        if token.kind == 'value':
+            if token.name == 'phone' and not normalize_phone(token.text):
+                continue
+            if token.name == 'date' and not normalize_date(token.text):
+                continue
+            candidates[token.name].append(token)
+
+    raw = {}
+    used = set()
+    # Typed fields: nearest unused value of the right type after the label
+    for field, label in sorted(((f, first_label[f]) for f in TYPED_FIELDS if f in first_label),
+                               key=lambda item: item[1].start):
+        options = [c for c in candidates[TYPED_FIELDS[field]]
+                   if id(c) not in used and c.start >= label.end and c.line - label.line <= MAX_LINE_GAP]
+        if options:
+            best = min(options, key=lambda c: c.start - label.end)
+            used.add(id(best))
+            raw[field] = best.text
+
+    # Unlabelled typed fields fall back to document order
+    spare_dates = [c for c in candidates['date'] if id(c) not in used]
+    if 'dob' not in raw and 'enlistment_date' not in raw and len(spare_dates) >= 2:
+        # Birth comes before enlistment
+        first, second = sorted(spare_dates[:2], key=lambda c: normalize_date(c.text))
+        raw['dob'], raw['enlistment_date'] = first.text, second.text
+        used.update((id(first), id(second)))
+    for field, kind in TYPED_FIELDS.items():
+        if field not in raw:
+            spare = next((c for c in candidates[kind] if id(c) not in used), None)
+            if spare is not None:
+                used.add(id(spare))
+                raw[field] = spare.text
+
+    for field in TEXT_FIELDS:
+        if field in first_label:
+            raw[field] = _text_after(first_label[field], labels, text, line_starts)
+    if 'address' in first_label:
+        raw['address'] = _address_after(first_label['address'], labels, text, line_starts)
+
+    return {field: (normalize_value(field, raw.get(field)), raw.get(field, "")) for field in FIELDS}
+
+
+def parse_text(text):
+    """{field: normalised value} ('' when not found)"""
+    return {field: value for field, (value, _) in scan_fields(text).items()}
@@ -0,0 +1,58 @@
+# main/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import change_log
+from .chat_similarity import log_change, log_dependents, record_key, record_text
+from .models import Award, Education, Family, Officer
+from .utils import shared_cache
+from .utils.officer_cache import officer_cache
+from .utils.thumbnails import schedule_derivatives
+
+
+@receiver(post_save, sender=Officer)
+def officer_saved(sender, instance, **kwargs):
+    officer_cache.changed(instance.army_number)
+    if instance.photo:
+        # After commit, so the worker sees the row and the stored file
+        army_number = instance.army_number
+        transaction.on_commit(lambda: schedule_derivatives(army_number))
+
+
+@receiver(post_delete, sender=Officer)
+def officer_deleted(sender, instance, **kwargs):
+    officer_cache.changed(instance.army_number, exists=False)
+
+
+def _similarity_saved(sender, instance, created=False, **kwargs):
+    key = record_key(instance)
+    transaction.on_commit(lambda: log_change(key, record_text(instance)))
+    if sender is Officer and not created:
+        # A renamed officer changes the text of their awards, education and family too
+        transaction.on_commit(lambda: log_dependents(instance))
+
+
+def _similarity_deleted(sender, instance, **kwargs):
+    key = record_key(instance)
+    transaction.on_commit(lambda: log_change(key))
+
+
+def _roster_changed(sender, instance, **kwargs):
+    # Cached chatbot answers depend on all four tables
+    transaction.on_commit(lambda: shared_cache.bump('data'))
+
+
+def _log_record_change(sender, instance, **kwargs):
+    # In the writing transaction (not on_commit): a rolled-back save leaves no change behind
+    army_number = instance.army_number if sender is Officer else instance.officer_id
+    change_log.log_changes(sender._meta.model_name, [army_number])
+
+
+for model in (Officer, Education, Family, Award):
+    post_save.connect(_similarity_saved, sender=model, dispatch_uid=f"similarity_saved_{model.__name__}")
+    post_delete.connect(_similarity_deleted, sender=model, dispatch_uid=f"similarity_deleted_{model.__name__}")
+    post_save.connect(_roster_changed, sender=model, dispatch_uid=f"roster_saved_{model.__name__}")
+    post_delete.connect(_roster_changed, sender=model, dispatch_uid=f"roster_deleted_{model.__name__}")
+    post_save.connect(_log_record_change, sender=model, dispatch_uid=f"change_log_saved_{model.__name__}")
+    post_delete.connect(_log_record_change, sender=model, dispatch_uid=f"change_log_deleted_{model.__name__}")
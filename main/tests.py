@@ -1,3 +1,1293 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+import numpy as np
+from PIL import Image
+
+from main import change_log, ocr_document, ocr_utils
+from main.admission import AdmissionGate, Rejected, admit, classify_chat, get_gate, reset_gates
+from main.backends.pool import ConnectionPool, PooledDatabaseWrapperMixin
+from main.backends.router import (ReplicaRouter, ReplicaStickinessMiddleware, SESSION_KEY, reads_from_replicas,
+                                  use_replicas)
+from main.backends.sqlite_cache import CULL_EVERY, SQLiteCache
+from main.backends.whoosh import ResultCache
+from main.bulk_records import import_records, read_rows
+from main.chat_batch import process_batch
+from main.chat_similarity import SimilarityIndex, build_index, index_dir, log_change
+from main.chat_stream import stream_events
+from main.chat_utils import handle_count_query
+from main.dedup import blocking_keys, normalize_record, scan_duplicates, similarity
+from main.models import Award, Education, Officer, RecordChange
+from main.ocr_parser import normalize_blood_group, normalize_date, normalize_phone, parse_text
+from main.utils import corpus, ocr_bench, ocr_engine, shared_cache, thumbnails
+from main.utils.bench import latency_summary, percentile
+from main.utils.downloads import parse_range
+from main.utils.lazy import lazy_import, lazy_import_stats, probe_imports
+from main.utils.officer_cache import OfficerCache, officer_cache
+from main.utils.thumbnails import derivative_name, generate_derivatives, photo_url, render_variant
+from main.utils.tracing import span, trace_request
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_lazy_module_imports_on_first_use(self):
+        sys.modules.pop('colorsys', None)
+        colorsys = lazy_import('colorsys')
+        self.assertNotIn('colorsys', sys.modules)
+
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn('colorsys', sys.modules)
+        self.assertIn('colorsys', lazy_import_stats())
+
+    def test_urls_do_not_load_ocr_or_export_libraries(self):
+        # A fresh interpreter: this test process may already have imported them
+        report = probe_imports('main.urls', cwd=str(settings.BASE_DIR))
+        for module in ('cv2', 'reportlab', 'docx'):
+            self.assertNotIn(module, report['loaded'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def setUp(self):
+        patcher = mock.patch('main.backends.router.replica_healthy', return_value=True)
+        self.healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_use_replica_only_inside_scope(self):
+        self.assertEqual(self.router.db_for_read(Officer), 'default')
+        with use_replicas():
+            self.assertEqual(self.router.db_for_read(Officer), 'replica')
+
+    def test_write_pins_rest_of_scope_to_primary(self):
+        with use_replicas() as state:
+            self.router.db_for_write(Officer)
+            self.assertEqual(self.router.db_for_read(Officer), 'default')
+            self.assertTrue(state['wrote'])
+
+    def test_replica_scope_is_visible_to_caches(self):
+        self.assertFalse(reads_from_replicas())
+        with use_replicas() as state:
+            self.assertTrue(reads_from_replicas())
+            self.router.db_for_write(Officer)
+            self.assertFalse(reads_from_replicas())
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        self.healthy.return_value = False
+        with use_replicas():
+            self.assertEqual(self.router.db_for_read(Officer), 'default')
+
+    def test_session_that_just_wrote_reads_from_primary(self):
+        seen = []
+
+        def view(request):
+            with use_replicas():
+                seen.append(self.router.db_for_read(Officer))
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.session = {SESSION_KEY: time.time()}
+        ReplicaStickinessMiddleware(view)(request)
+        request.session = {SESSION_KEY: time.time() - 60}
+        ReplicaStickinessMiddleware(view)(request)
+        self.assertEqual(seen, ['default', 'replica'])
+
+
+class ReplicaCacheTests(TestCase):
+    def setUp(self):
+        reset_caches()
+
+    def replica_reads(self):
+        # Test replicas mirror 'default', and a read on the mirror would lock this test's rows
+        return mock.patch('main.utils.shared_cache.reads_from_replicas', return_value=True)
+
+    def test_replica_read_right_after_a_write_is_not_cached(self):
+        make_officer('IC-10001')
+        shared_cache.bump('data')
+        with self.replica_reads():
+            # What a lagging replica still answers
+            self.assertEqual(shared_cache.get_or_set('data', 'count', lambda: 'stale'), 'stale')
+        self.assertEqual(shared_cache.get_or_set('data', 'count', lambda: 'fresh'), 'fresh')
+        self.assertEqual(shared_cache.get('data', 'count'), 'fresh')
+
+    def test_replica_officer_lookup_right_after_a_write_is_not_cached(self):
+        make_officer('IC-10001')
+        shared_cache.bump('officer')
+        with self.replica_reads():
+            self.assertIsNotNone(officer_cache.get_officer('IC-10001'))
+        self.assertIsNone(shared_cache.get('officer', 'IC-10001'))
+        self.assertEqual(officer_cache.lookup('IC-10001'), (False, None))
+
+    @override_settings(REPLICA_STICKY_SECONDS=0)
+    def test_replica_reads_are_cached_once_replicas_caught_up(self):
+        shared_cache.bump('data')
+        with self.replica_reads():
+            shared_cache.get_or_set('data', 'count', lambda: 'settled')
+        self.assertEqual(shared_cache.get('data', 'count'), 'settled')
+
+
+class AdmissionGateTests(SimpleTestCase):
+    def test_full_class_queues_then_sheds(self):
+        gate = AdmissionGate('export', limit=1, max_queue=0, per_user=None, timeout=0.1)
+        gate.acquire('a')
+        with self.assertRaises(Rejected) as raised:
+            gate.acquire('b')
+        self.assertEqual(raised.exception.reason, 'busy')
+        gate.release('a')
+        gate.acquire('b')
+        self.assertEqual(gate.snapshot()['active'], 1)
+
+    def test_per_user_quota(self):
+        gate = AdmissionGate('ocr', limit=5, max_queue=5, per_user=1, timeout=0.1)
+        gate.acquire('a')
+        with self.assertRaises(Rejected) as raised:
+            gate.acquire('a')
+        self.assertEqual(raised.exception.reason, 'quota')
+        gate.acquire('b')
+
+    @override_settings(ADMISSION_CLASSES={'ocr': (2, 8, 1)}, ADMISSION_CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_anonymous_clients_behind_a_proxy_have_their_own_quota(self):
+        reset_gates()
+        self.addCleanup(reset_gates)
+        started, finish = threading.Event(), threading.Event()
+
+        @admit('ocr')
+        def upload(request):
+            if not started.is_set():
+                # The first upload is still running while the others arrive
+                started.set()
+                finish.wait(5)
+            return HttpResponse()
+
+        def post(client):
+            # Both come from the proxy's address; the client spoofs an X-Forwarded-For entry of its own
+            return upload(RequestFactory().post('/', REMOTE_ADDR='10.0.0.1',
+                                                HTTP_X_FORWARDED_FOR=f'1.2.3.4, {client}'))
+
+        first = threading.Thread(target=post, args=('203.0.113.7',))
+        first.start()
+        self.assertTrue(started.wait(5))
+        try:
+            self.assertEqual(post('198.51.100.9').status_code, 200)
+            self.assertEqual(post('203.0.113.7').status_code, 429)
+        finally:
+            finish.set()
+            first.join()
+
+    @override_settings(ADMISSION_CLASSES={'export': (1, 0, None)})
+    def test_async_stream_holds_the_slot_until_sent(self):
+        reset_gates()
+        self.addCleanup(reset_gates)
+
+        async def chunks():
+            yield b'row\n'
+
+        @admit('export')
+        async def sync_body(request):
+            return StreamingHttpResponse(iter([b'row\n']))
+
+        @admit('export')
+        async def async_body(request):
+            return StreamingHttpResponse(chunks())
+
+        async def consume(response):
+            return [part async for part in response]
+
+        gate = get_gate('export')
+        for view in (sync_body, async_body):
+            with self.subTest(view=view.__name__):
+                response = async_to_sync(view)(RequestFactory().get('/'))
+                self.assertEqual(gate.snapshot()['active'], 1)
+                self.assertEqual(async_to_sync(consume)(response), [b'row\n'])
+                response.close()
+                self.assertEqual(gate.snapshot()['active'], 0)
+
+    def test_classify_chat(self):
+        self.assertEqual(classify_chat("details of IC-12345"), 'chat')
+        self.assertEqual(classify_chat("list all colonels"), 'heavy_chat')
+        self.assertEqual(classify_chat("list all officers in delhi as pdf"), 'export')
+
+
+class FakeConnection:
+    closed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeWrapperBase:
+    """Just enough of BaseDatabaseWrapper for PooledDatabaseWrapperMixin"""
+    connection = None
+    in_atomic_block = False
+    errors_occurred = False
+    autocommit = True
+    fail_setup = False
+
+    def get_new_connection(self, conn_params):
+        return FakeConnection()
+
+    def connect(self):
+        self.connection = self.get_new_connection({})
+        if self.fail_setup:
+            raise OperationalError("init_connection_state failed")
+
+    def _close(self):
+        self.connection.close()
+
+
+class FakeWrapper(PooledDatabaseWrapperMixin, FakeWrapperBase):
+    def __init__(self, pool):
+        self.pool = pool
+
+    def _get_pool(self):
+        return self.pool
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, max_size=2):
+        return ConnectionPool('test', max_size=max_size, timeout=0.05, recycle=None, pre_ping=True)
+
+    def test_release_then_reuse(self):
+        pool = self.make_pool()
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        self.assertIs(pool.acquire(FakeConnection), conn)
+        self.assertEqual(pool.snapshot()['created'], 1)
+        self.assertEqual(pool.snapshot()['reused'], 1)
+
+    def test_discard_closes_and_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.snapshot()['size'], 0)
+        self.assertIsNot(pool.acquire(FakeConnection), conn)
+
+    def test_exhausted_pool_raises(self):
+        pool = self.make_pool(max_size=1)
+        pool.acquire(FakeConnection)
+        with self.assertRaises(OperationalError):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.snapshot()['timeouts'], 1)
+
+    def test_close_inside_atomic_block_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+        wrapper = FakeWrapper(pool)
+        wrapper.connect()
+        wrapper.in_atomic_block = True
+        wrapper._close()
+        self.assertTrue(wrapper.connection.closed)
+        self.assertEqual(pool.snapshot()['size'], 0)
+        pool.acquire(FakeConnection)
+
+    def test_failed_setup_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+        wrapper = FakeWrapper(pool)
+        wrapper.fail_setup = True
+        with self.assertRaises(OperationalError):
+            wrapper.connect()
+        self.assertIsNone(wrapper.connection)
+        self.assertEqual(pool.snapshot()['size'], 0)
+
+
+class AsyncChatbotViewTests(TransactionTestCase):
+    databases = '__all__'
+
+    async def test_async_endpoint_answers_json(self):
+        response = await AsyncClient().post('/chatbot/async/', {'message': 'how many officers in delhi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('response', response.json())
+
+    async def test_async_endpoint_keeps_the_conversation(self):
+        await sync_to_async(reset_caches)()
+        await sync_to_async(make_officer)('IC-10001', rank='Brigadier')
+        await sync_to_async(make_officer)('IC-10002', full_name='Suresh Nair')
+        await sync_to_async(make_officer)('IC-10003', full_name='Anil Singh', rank='Brigadier', unit='Punjab Regiment')
+        client = AsyncClient()
+        response = await client.post('/chatbot/async/', {'message': 'list all officers in delhi'})
+        self.assertIn('Suresh Nair', response.json()['response'])
+
+        response = await client.post('/chatbot/async/', {'message': 'how many of them are brigadier'})
+        self.assertEqual(response.json()['response'], 'Total Brigadiers among them: 1')
+
+    async def test_async_stream_sends_the_first_event_before_the_rest_is_read(self):
+        await sync_to_async(reset_caches)()
+        await sync_to_async(make_officer)('IC-10001')
+        first_sent = threading.Event()
+        waited = []
+
+        def gated_events(query, context=None):
+            events = stream_events(query, context)
+            yield next(events)
+            # Buffered (sync_to_async(list)) bodies would only be sent after this times out
+            waited.append(first_sent.wait(2))
+            yield from events
+
+        with mock.patch('main.views.stream_events', gated_events):
+            response = await AsyncClient().post('/chatbot/async/', {'message': 'list all officers in delhi', 'stream': '1'})
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            first = json.loads(await anext(chunks))
+            first_sent.set()
+            rest = [json.loads(line) async for chunk in chunks for line in chunk.decode().splitlines()]
+
+        self.assertEqual(first, {'event': 'status', 'message': 'Fetching records…'})
+        self.assertEqual(waited, [True])
+        self.assertIn('Rajesh Kumar', rest[0]['text'])
+        self.assertEqual(rest[-1], {'event': 'done'})
+
+    async def test_async_endpoint_enforces_post(self):
+        response = await AsyncClient().get('/chatbot/async/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response'], "Please enter a valid query.")
+
+
+def officer_fields(**fields):
+    values = dict(full_name='Rajesh Kumar', rank='Colonel', position='CO', unit='Delhi Regiment',
+                  dob=date(1980, 5, 17), enlistment_date=date(2002, 6, 1), phone='9876543210',
+                  email='rajesh@example.com', address='Delhi Cantt', blood_group='B+')
+    values.update(fields)
+    return values
+
+
+def reset_caches():
+    # Cached officers outlive each test's rolled-back rows
+    shared_cache.get_cache().clear()
+    shared_cache.reset_stats()
+    officer_cache.clear()
+
+
+def make_officer(army_number, **fields):
+    return Officer.objects.create(army_number=army_number, **officer_fields(**fields))
+
+
+def stream_events_of(response):
+    return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+
+class ChatStreamTests(TestCase):
+    def test_bulk_query_streams_json_lines(self):
+        make_officer('IC-10001')
+        response = self.client.post('/chatbot/', {'message': 'list all officers in delhi', 'stream': '1'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        events = stream_events_of(response)
+
+        self.assertEqual(events[0], {'event': 'status', 'message': 'Fetching records…'})
+        self.assertIn('Rajesh Kumar (Colonel) - Delhi Regiment', events[1]['text'])
+        self.assertEqual(events[-1], {'event': 'done'})
+
+    @override_settings(CHAT_TRACE_RESPONSES=True)
+    def test_streamed_answer_is_traced(self):
+        make_officer('IC-10001')
+        response = self.client.post('/chatbot/', {'message': 'list all officers in delhi', 'stream': '1'})
+        events = stream_events_of(response)
+        self.assertEqual(events[-2], {'event': 'done'})
+        self.assertEqual(events[-1]['event'], 'trace')
+        self.assertEqual(events[-1]['trace']['label'], 'chat_stream')
+        self.assertGreaterEqual(events[-1]['trace']['db_queries'], 1)
+
+
+class StreamedConversationTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        make_officer('IC-10001')
+        make_officer('IC-10002', full_name='Suresh Nair', phone='9876500002')
+        make_officer('IC-10003', full_name='Anil Singh', unit='Punjab Regiment', phone='9876500003')
+
+    def stream(self, message):
+        return stream_events_of(self.client.post('/chatbot/', {'message': message, 'stream': '1'}))
+
+    def answer(self, events):
+        self.assertEqual(events[-1], {'event': 'done'})
+        return "".join(e['text'] for e in events if e['event'] == 'text')
+
+    def test_follow_up_uses_the_streamed_list(self):
+        self.assertIn('Suresh Nair', self.answer(self.stream('list all officers in delhi')))
+
+        answer = self.answer(self.stream('show their phone numbers'))
+        self.assertIn('9876543210', answer)
+        self.assertIn('9876500002', answer)
+        self.assertNotIn('Anil Singh', answer)
+
+    def test_count_follow_up_is_a_count(self):
+        Officer.objects.filter(army_number='IC-10002').update(rank='Brigadier')
+        self.stream('list all officers in delhi')
+        response = self.client.post('/chatbot/', {'message': 'how many of them are brigadier'})
+        self.assertEqual(response.json()['response'], 'Total Brigadiers among them: 1')
+
+    def test_follow_up_about_one_streamed_officer(self):
+        self.stream('list all officers in punjab')
+        self.assertIn('9876500003', self.answer(self.stream('what is his phone number')))
+
+
+class TracingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def test_queries_on_every_alias_are_counted(self):
+        with trace_request('test') as trace:
+            with span('lookup'):
+                Officer.objects.count()
+                Officer.objects.using('replica').count()
+        self.assertEqual(trace.db_queries, 2)
+        self.assertEqual(trace.spans[-1]['db_queries'], 2)
+
+
+class BatchChatTests(TestCase):
+    def setUp(self):
+        make_officer('IC-10001')
+        make_officer('IC-10002', full_name='Anil Singh', rank='Major', unit='Punjab Regiment')
+
+    def test_counts_share_one_aggregate_query(self):
+        queries = ["how many officers in delhi", "total colonels", "how many officers in punjab"]
+        expected = [handle_count_query(q) for q in queries]
+        with self.assertNumQueries(1):
+            answers = process_batch(queries)
+        self.assertEqual(answers, expected)
+        self.assertTrue(answers[0].endswith(": 1"))
+
+    def test_batch_endpoint_keeps_order(self):
+        response = self.client.post('/chatbot/batch/', json.dumps({"queries": ["total colonels", "", "total majors"]}),
+                                    content_type='application/json')
+        responses = response.json()["responses"]
+        self.assertEqual([r["query"] for r in responses], ["total colonels", "", "total majors"])
+        self.assertEqual(responses[1]["response"], "Please enter a valid query.")
+        self.assertTrue(responses[2]["response"].endswith(": 1"))
+
+
+class OfficerCacheTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        make_officer('IC-10001')
+        self.cache = OfficerCache(bloom_refresh=300, bloom_min_interval=3600)
+        self.cache.rebuild_bloom()
+
+    def test_repeat_lookup_is_an_lru_hit(self):
+        self.assertEqual(self.cache.get_officer('IC-10001').full_name, 'Rajesh Kumar')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get_officer(' ic-10001 ').pk, 'IC-10001')
+        self.assertEqual(self.cache.snapshot()['hits'], 1)
+
+    def test_missing_officer_is_cached(self):
+        cache = OfficerCache(bloom_refresh=None)
+        with self.assertNumQueries(1):
+            self.assertIsNone(cache.get_officer('IC-99999'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(cache.get_officer('IC-99999'))
+        self.assertEqual(cache.snapshot()['negative_hits'], 1)
+
+    def test_bloom_rejects_unknown_number_without_query(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.cache.get_officer('2015'))
+        self.assertEqual(self.cache.snapshot()['bloom_rejects'], 1)
+
+    def test_officer_added_elsewhere_is_found_once_version_moves(self):
+        # bulk_create sends no signals: as if another worker had added the officer
+        Officer.objects.bulk_create([Officer(army_number='IC-10002', **officer_fields(full_name='Anil Singh'))])
+        self.assertIsNone(self.cache.get_officer('IC-10002'))
+
+        shared_cache.bump('officer')
+        with mock.patch('main.utils.officer_cache.threading.Thread'):
+            self.assertEqual(self.cache.get_officer('IC-10002').full_name, 'Anil Singh')
+
+        self.cache.rebuild_bloom()
+        self.assertTrue(self.cache.might_exist('IC-10002'))
+        self.assertFalse(self.cache.might_exist('IC-10003'))
+
+    def test_local_save_is_added_to_the_filter(self):
+        make_officer('IC-10002')
+        self.cache.invalidate('IC-10002')
+        self.assertEqual(self.cache.get_officer('IC-10002').pk, 'IC-10002')
+
+    def test_stale_filter_starts_one_rebuild(self):
+        self.cache.bloom_min_interval = 0
+        shared_cache.bump('officer')
+        with mock.patch('main.utils.officer_cache.threading.Thread') as thread:
+            self.assertTrue(self.cache.might_exist('IC-99999'))
+            self.assertTrue(self.cache.might_exist('IC-99998'))
+        thread.assert_called_once()
+
+
+@mock.patch.dict(os.environ, {}, clear=False)
+class OcrEngineSelectionTests(SimpleTestCase):
+    def setUp(self):
+        os.environ.pop('OCR_ENGINE', None)
+
+    @mock.patch.object(ocr_engine, 'tesserocr', None)
+    def test_auto_without_tesserocr_uses_pytesseract(self):
+        self.assertIsInstance(ocr_engine.create_engine(), ocr_engine.PytesseractEngine)
+
+    @mock.patch.object(ocr_engine, 'tesserocr', None)
+    def test_tesserocr_engines_fall_back_when_not_installed(self):
+        for name in ('pool', 'tesserocr'):
+            with self.subTest(name=name), self.assertLogs('main.utils.ocr_engine', 'WARNING'):
+                self.assertIsInstance(ocr_engine.create_engine(name), ocr_engine.PytesseractEngine)
+
+    @mock.patch.object(ocr_engine, 'tesserocr', mock.Mock())
+    @override_settings(OCR_POOL_SIZE=3)
+    def test_auto_with_tesserocr_uses_the_pool(self):
+        with mock.patch.object(ocr_engine, 'PooledEngine') as pooled:
+            self.assertIs(ocr_engine.create_engine(), pooled.return_value)
+        pooled.assert_called_once_with(3)
+        self.assertIsInstance(ocr_engine.create_engine('tesserocr'), ocr_engine.TesserocrEngine)
+
+    @override_settings(OCR_ENGINE='pool')
+    def test_environment_overrides_setting(self):
+        os.environ['OCR_ENGINE'] = 'pytesseract'
+        self.assertIsInstance(ocr_engine.create_engine(), ocr_engine.PytesseractEngine)
+
+    def test_forked_child_gets_its_own_engine(self):
+        parent = mock.Mock(pid=os.getpid() + 1)
+        with mock.patch.object(ocr_engine, '_engine', parent), \
+                mock.patch.object(ocr_engine, 'create_engine') as create:
+            self.assertIs(ocr_engine.get_engine(), create.return_value)
+
+
+def _exit_worker_once(array, marker):
+    # Pool worker that dies the first time it is called (the marker file outlives it)
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return 'recovered'
+
+
+def _exit_worker(array, lang):
+    os._exit(1)
+
+
+class PooledEngineRecoveryTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = ocr_engine.PooledEngine(1)
+        self.addCleanup(self.engine.close)
+
+    def test_dead_worker_is_replaced_and_the_image_retried(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(ocr_engine._WORKER_CALLS, image_to_string=_exit_worker_once), \
+                self.assertLogs('main.utils.ocr_engine', 'ERROR'):
+            self.assertEqual(self.engine.image_to_string(np.zeros((4, 4), dtype=np.uint8),
+                                                         os.path.join(tmp, 'died')), 'recovered')
+
+    def test_image_that_keeps_killing_workers_falls_back_to_pytesseract(self):
+        with mock.patch.dict(ocr_engine._WORKER_CALLS, image_to_string=_exit_worker), \
+                mock.patch.object(ocr_engine.PytesseractEngine, 'image_to_string', return_value='fallback'), \
+                self.assertLogs('main.utils.ocr_engine', 'ERROR') as logs:
+            self.assertEqual(self.engine.image_to_string(np.zeros((4, 4), dtype=np.uint8)), 'fallback')
+        self.assertEqual(len(logs.records), 2)
+
+
+def tiff_bytes(pages):
+    frames = [Image.new('L', (40, 20), color=255 - i) for i in range(pages)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format='TIFF', save_all=True, append_images=frames[1:])
+    return buffer.getvalue()
+
+
+class OcrDocumentTests(SimpleTestCase):
+    def test_tiff_pages_are_capped(self):
+        content = tiff_bytes(5)
+        self.assertEqual(ocr_document.document_kind(content), 'tiff')
+        with self.assertLogs('main.ocr_document', 'WARNING'):
+            pages = [number for number, _ in ocr_document.iter_pages(content, max_pages=3)]
+        self.assertEqual(pages, [1, 2, 3])
+
+    @override_settings(OCR_MAX_PAGES=2)
+    def test_page_cap_setting(self):
+        with self.assertLogs('main.ocr_document', 'WARNING'):
+            self.assertEqual(len(list(ocr_document.iter_pages(tiff_bytes(4)))), 2)
+
+    def test_pages_are_read_a_window_ahead(self):
+        workers, done, ahead = 2, [], []
+
+        def pages(content, dpi=None, max_pages=None):
+            for number in range(1, 9):
+                # Pages handed out but not yet returned to the caller
+                ahead.append(number - len(done))
+                yield number, object()
+
+        def process_page(number, image):
+            return {'page': number}
+
+        with mock.patch.object(ocr_document, 'iter_pages', pages), \
+                mock.patch.object(ocr_document, 'process_page', process_page):
+            for result in ocr_document.iter_page_results(b'', workers=workers):
+                done.append(result['page'])
+        self.assertEqual(done, list(range(1, 9)))
+        self.assertLessEqual(max(ahead), workers)
+
+
+class ExtractOfficerDataTests(TestCase):
+    def test_image_upload_bytes_go_straight_to_ocr(self):
+        buffer = io.BytesIO()
+        Image.new('L', (40, 20), color=255).save(buffer, format='PNG')
+        upload = SimpleUploadedFile('scan.png', buffer.getvalue(), content_type='image/png')
+        result = {'fields': {'army_number': 'IC-10001'}, 'confidence': {'army_number': 0.9},
+                  'text': 'IC-10001', 'escalated': False}
+        with mock.patch.object(ocr_utils, 'ocr_fields', return_value=result), \
+                mock.patch.object(ocr_utils, 'load_image', wraps=ocr_utils.load_image) as load:
+            response = self.client.post('/extract-officer-data/', {'photo': upload})
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['data']['army_number'], 'IC-10001')
+        self.assertEqual(data['data']['possible_duplicates'], [])
+        load.assert_called_once_with(buffer.getvalue())
+
+
+SERVICE_RECORD = """Army No: IC-12345K
+Name: rajesh kumar   Rank: colonel
+Date of Birth: 17th May 1980
+Mobile: +91 98765 43210
+Email: Rajesh.K@Army.IN
+Blood Group: AB -ve
+Address: House 12, Sector 4
+Delhi Cantt
+New Delhi 110010
+Unit: 5 Delhi Regiment
+"""
+
+
+class OcrParserTests(SimpleTestCase):
+    def assertTable(self, func, table):
+        for raw, expected in table:
+            with self.subTest(raw=raw):
+                self.assertEqual(func(raw), expected)
+
+    def test_dates_to_iso(self):
+        self.assertTable(normalize_date, [
+            ('17/05/1980', '1980-05-17'),
+            ('17.05.1980', '1980-05-17'),
+            ('1980-05-17', '1980-05-17'),
+            ('05/17/1980', '1980-05-17'),     # month-first when the day can't be a month
+            ('17th May 1980', '1980-05-17'),
+            ('17 Sept, 1980', '1980-09-17'),
+            ('31/02/1980', ''),
+            ('abc', ''),
+        ])
+
+    def test_phone_numbers(self):
+        self.assertTable(normalize_phone, [
+            ('+91 98765 43210', '9876543210'),
+            ('919876543210', '9876543210'),
+            ('098765-43210', '9876543210'),
+            ('(987) 654-3210', '9876543210'),
+            ('98765', ''),
+        ])
+
+    def test_blood_groups(self):
+        self.assertTable(normalize_blood_group, [
+            ('B+', 'B+'),
+            ('o +ve', 'O+'),
+            ('O positive', 'O+'),
+            ('ab -ve', 'AB-'),
+            ('AB Neg', 'AB-'),
+            ('A(-)', 'A-'),
+        ])
+
+    def test_service_record(self):
+        fields = parse_text(SERVICE_RECORD)
+        self.assertEqual(fields, {
+            'army_number': 'IC-12345K',
+            'full_name': 'Rajesh Kumar',
+            'rank': 'Colonel',
+            'position': '',
+            'unit': '5 Delhi Regiment',
+            'dob': '1980-05-17',
+            'enlistment_date': '',
+            'phone': '9876543210',
+            'email': 'rajesh.k@army.in',
+            'blood_group': 'AB-',
+            'address': 'House 12, Sector 4, Delhi Cantt, New Delhi 110010',
+        })
+
+    def test_misses_are_empty(self):
+        for text in ("", "Nothing useful here\nPhone: 12345\nDOB: 45/45/2020"):
+            with self.subTest(text=text):
+                self.assertEqual(set(parse_text(text).values()), {''})
+
+
+OFFICER_CSV = """army_number,full_name,rank,position,unit,dob,enlistment_date,phone,email,address,blood_group
+IC-20001,Anil Singh,Major,2IC,Punjab Regiment,1985-01-12,2007-06-01,9876500001,anil@example.com,Jalandhar,O+
+IC-20002,Vikram Rao,Captain,Adjt,Madras Regiment,1990-03-04,2012-06-01,9876500002,vikram@example.com,Wellington,A-
+"""
+
+
+class BulkImportTests(TestCase):
+    def import_csv(self, text, **options):
+        return import_records(read_rows(io.BytesIO(text.encode()), 'csv'), model='officer', index=False, **options)
+
+    def test_officers_and_related_rows(self):
+        report = self.import_csv(OFFICER_CSV)
+        self.assertEqual(report['models']['officer']['created'], 2)
+        self.assertEqual(report['invalid'], 0)
+
+        education = ('{"army_number": "IC-20001", "degree": "BSc", "institution": "NDA", '
+                     '"year_of_passing": 2006, "grade": "A"}\n')
+        report = import_records(read_rows(io.BytesIO(education.encode()), 'jsonl'), model='education', index=False)
+        self.assertEqual(report['models'], {'education': {'created': 1, 'updated': 0, 'skipped': 0, 'invalid': 0}})
+
+        self.assertEqual(Officer.objects.get(pk='IC-20002').unit, 'Madras Regiment')
+        self.assertEqual(Education.objects.get().officer_id, 'IC-20001')
+        self.assertEqual(RecordChange.objects.filter(model='officer').count(), 2)
+
+    def test_invalid_rows_are_reported_and_the_rest_saved(self):
+        text = OFFICER_CSV + (
+            "IC-20003,Bad Date,Major,CO,Sikh Regiment,not-a-date,2007-06-01,9876500003,bad@example.com,Delhi,B+\n"
+            "IC-20001,Anil Again,Major,2IC,Punjab Regiment,1985-01-12,2007-06-01,9876500001,anil@example.com,Jalandhar,O+\n"
+        )
+        report = self.import_csv(text)
+        self.assertEqual(report['rows'], 4)
+        self.assertEqual(report['models']['officer']['created'], 2)
+        self.assertEqual(report['invalid'], 2)
+        self.assertEqual([(e['row'], e['model']) for e in report['errors']], [(3, 'officer'), (4, 'officer')])
+        self.assertIn('dob', report['errors'][0]['error'])
+        self.assertIn('more than once', report['errors'][1]['error'])
+        self.assertEqual(sorted(Officer.objects.values_list('pk', flat=True)), ['IC-20001', 'IC-20002'])
+
+        rows = ('{"army_number": "IC-99999", "degree": "BSc", "institution": "NDA", "year_of_passing": 2006, '
+                '"grade": "A"}\nnot json\n')
+        report = import_records(read_rows(io.BytesIO(rows.encode()), 'jsonl'), model='education', index=False)
+        self.assertEqual(report['invalid'], 2)
+        errors = {e['row']: e['error'] for e in report['errors']}
+        self.assertIn('not found', errors[1])
+        self.assertIn('invalid JSON', errors[2])
+        self.assertFalse(Education.objects.exists())
+
+    def test_conflicts_and_dry_run(self):
+        self.import_csv(OFFICER_CSV)
+        changed = OFFICER_CSV.replace('Punjab Regiment', 'Sikh Regiment')
+
+        self.assertEqual(self.import_csv(changed)['models']['officer']['skipped'], 2)
+        report = self.import_csv(changed, on_conflict='error')
+        self.assertEqual(report['invalid'], 2)
+        self.assertIn('already exists', report['errors'][0]['error'])
+
+        report = self.import_csv(changed, on_conflict='update', dry_run=True)
+        self.assertEqual(report['models']['officer']['updated'], 2)
+        self.assertEqual(Officer.objects.get(pk='IC-20001').unit, 'Punjab Regiment')
+        self.import_csv(changed, on_conflict='update')
+        self.assertEqual(Officer.objects.get(pk='IC-20001').unit, 'Sikh Regiment')
+
+
+class ResultCacheTests(SimpleTestCase):
+    def test_entries_belong_to_one_generation(self):
+        cache = ResultCache(max_size=2)
+        cache.store(1, 'q', {'hits': 1})
+        self.assertEqual(cache.get(1, 'q'), {'hits': 1})
+        self.assertIsNone(cache.get(2, 'q'))
+
+        cache.store(2, 'other', {'hits': 0})
+        self.assertIsNone(cache.get(2, 'q'))
+        # A slow search that started before the new generation is not filed under it
+        cache.store(1, 'q', {'hits': 1})
+        self.assertIsNone(cache.get(1, 'q'))
+        self.assertEqual(cache.snapshot()['size'], 1)
+
+
+class CachedWhooshSearchTests(TestCase):
+    def setUp(self):
+        from haystack import connections
+        self.backend = connections['default'].get_backend()
+        self.backend.clear()
+        self.addCleanup(self.backend.clear)
+
+    def test_new_generation_drops_cached_results(self):
+        make_officer('IC-30001', full_name='Kavita Menon')
+        self.assertEqual(self.backend.search('Menon')['hits'], 1)
+        hits = self.backend.result_cache.hits
+        self.assertEqual(self.backend.search('Menon')['hits'], 1)
+        self.assertEqual(self.backend.result_cache.hits, hits + 1)
+
+        # Indexed by the realtime signal processor: a new generation
+        make_officer('IC-30002', full_name='Arun Menon')
+        self.assertEqual(self.backend.search('Menon')['hits'], 2)
+
+
+class OfficerRegistrationTests(TestCase):
+    def test_duplicate_warning_says_the_photo_was_dropped(self):
+        make_officer('IC-10001')
+        buffer = io.BytesIO()
+        Image.new('RGB', (20, 20)).save(buffer, format='PNG')
+        data = dict(officer_fields(), army_number='IC-10007', dob='1980-05-17', enlistment_date='2002-06-01',
+                    photo=SimpleUploadedFile('me.png', buffer.getvalue(), content_type='image/png'))
+        response = self.client.post('/register/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['duplicates'])
+        self.assertContains(response, 'Your photo was not kept.')
+        self.assertFalse(Officer.objects.filter(pk='IC-10007').exists())
+
+        del data['photo']
+        response = self.client.post('/register/', dict(data, confirm_duplicate='1'))
+        self.assertRedirects(response, '/success/', fetch_redirect_response=False)
+        self.assertTrue(Officer.objects.filter(pk='IC-10007').exists())
+
+
+def dedup_record(army_number, full_name, dob='1980-05-17', phone=''):
+    return {'army_number': army_number, 'full_name': full_name, 'dob': dob, 'phone': phone}
+
+
+class DedupTests(TestCase):
+    def test_transposed_or_misspelled_name_shares_a_block(self):
+        original = blocking_keys(normalize_record(dedup_record('IC-12345', 'Rajesh Kumar', dob='')))
+        for variant in ('Kumar Rajesh', 'Rajesh Kumr', 'RAJESH  kumar.'):
+            with self.subTest(variant=variant):
+                keys = blocking_keys(normalize_record(dedup_record('IC-12845', variant, dob='')))
+                self.assertTrue(original & keys)
+        # Different people in the same birth year don't meet on their names
+        self.assertFalse(original & blocking_keys(normalize_record(dedup_record('IC-2', 'Suresh Nair', dob=''))))
+
+    def test_threshold_is_inclusive(self):
+        records = [dedup_record('IC-12345', 'Rajesh Kumar'), dedup_record('IC-12845', 'Rajesh Kumr')]
+        normalized = [normalize_record(r) for r in records]
+        score = float(similarity(normalized[:1], normalized[1:])[0, 0])
+
+        pairs, _ = scan_duplicates(threshold=score, records=records)
+        self.assertEqual([(p['a'], p['b']) for p in pairs], [('IC-12345', 'IC-12845')])
+        pairs, _ = scan_duplicates(threshold=score + 0.001, records=records)
+        self.assertEqual(pairs, [])
+
+    def test_blocks_over_max_block_are_skipped(self):
+        # Only the two name blocks hold more than one officer
+        records = [dedup_record(f'IC-1000{i}', 'Rajesh Kumar', dob=f'1980-0{i}-17') for i in range(1, 4)]
+        pairs, stats = scan_duplicates(threshold=0, max_block=3, records=records)
+        self.assertEqual((stats['blocks'], stats['skipped_blocks'], stats['comparisons']), (2, 0, 6))
+        self.assertEqual(len(pairs), 3)
+
+        pairs, stats = scan_duplicates(threshold=0, max_block=2, records=records)
+        self.assertEqual((stats['blocks'], stats['skipped_blocks'], pairs), (0, 2, []))
+
+    def test_find_duplicates_command(self):
+        make_officer('IC-12345')
+        make_officer('IC-12845', full_name='Rajesh Kumr')
+        make_officer('IC-20001', full_name='Suresh Nair', dob=date(1975, 1, 2), phone='9876500002')
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pairs.json')
+            call_command('find_duplicates', threshold=0.85, json_path=path, stdout=out)
+            with open(path) as f:
+                written = json.load(f)
+
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('3 officers, '))
+        self.assertEqual(lines[1], '1 likely duplicate pair(s)')
+        self.assertRegex(lines[2], r'^  \d\.\d{3}  IC-12345 \(Rajesh Kumar\)  ~  IC-12845 \(Rajesh Kumr\)$')
+        self.assertEqual([(p['a'], p['b']) for p in written['pairs']], [('IC-12345', 'IC-12845')])
+        self.assertEqual(written['stats']['records'], 3)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def test_concurrent_writes_cull_on_schedule(self):
+        directory = tempfile.mkdtemp(prefix='sqlite_cache_')
+        self.addCleanup(shutil.rmtree, directory)
+        cache = SQLiteCache(os.path.join(directory, 'cache.sqlite3'),
+                            {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}})
+        writes = CULL_EVERY * 2
+
+        def write(start):
+            for i in range(start, writes, 4):
+                cache.set(f'key{i}', i)
+
+        threads = [threading.Thread(target=write, args=(start,)) for start in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache._writes, writes)
+        # The last write was a cull: back under MAX_ENTRIES with headroom
+        self.assertLessEqual(len([i for i in range(writes) if cache.get(f'key{i}') is not None]), 10)
+
+
+class DownloadTests(SimpleTestCase):
+    body = b"army_number,full_name\n" + b"IC-10001,Rajesh Kumar\n" * 50
+
+    def setUp(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'exports')
+        os.makedirs(directory, exist_ok=True)
+        for name, content in (('report.pdf', b'%PDF-1.4 0123456789'), ('roster.csv', self.body)):
+            path = os.path.join(directory, name)
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.addCleanup(os.remove, path)
+        self.directory = directory
+
+    def get(self, name, **headers):
+        return self.client.get(f'/export/download/{name}', **headers)
+
+    def test_parse_range(self):
+        for header, expected in [
+            ('bytes=0-9', (0, 9)),
+            ('bytes=5-', (5, 99)),
+            ('bytes=-10', (90, 99)),
+            ('bytes=90-500', (90, 99)),
+            ('bytes=100-', 'unsatisfiable'),
+            ('bytes=9-5', None),
+            ('bytes=0-1,5-6', None),
+            ('items=0-9', None),
+            ('bytes=-', None),
+        ]:
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 100), expected)
+
+    def test_etag_and_304(self):
+        response = self.get('report.pdf')
+        self.assertEqual(b"".join(response.streaming_content), b'%PDF-1.4 0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment; filename="report.pdf"', response['Content-Disposition'])
+
+        again = self.get('report.pdf', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+
+    def test_ranges(self):
+        response = self.get('report.pdf', HTTP_RANGE='bytes=9-12')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 9-12/19')
+        self.assertEqual(b"".join(response.streaming_content), b'0123')
+
+        response = self.get('report.pdf', HTTP_RANGE='bytes=50-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */19')
+
+        # If-Range for an older version of the file: the whole new file
+        response = self.get('report.pdf', HTTP_RANGE='bytes=9-12', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_csv_gzip_negotiation(self):
+        plain = self.get('roster.csv')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        compressed = self.get('roster.csv', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.addCleanup(os.remove, os.path.join(self.directory, 'roster.csv.gz'))
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+        self.assertEqual(gzip.decompress(b"".join(compressed.streaming_content)), self.body)
+
+    @override_settings(EXPORT_SENDFILE='x-accel-redirect', EXPORT_ACCEL_PREFIX='/protected-exports/')
+    def test_x_accel_redirect(self):
+        response = self.get('report.pdf')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-exports/report.pdf')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    def test_missing_file(self):
+        self.assertEqual(self.get('nothing.pdf').status_code, 404)
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0)
+class ChangeLogTests(TestCase):
+    def delta(self, name, since, until):
+        return [(op, row['army_number']) for op, row in change_log.delta_rows(name, since, until)]
+
+    def test_creates_updates_and_deletes(self):
+        self.assertEqual(change_log.current_cursor(), 0)
+        rajesh = make_officer('IC-10001')
+        make_officer('IC-10002', full_name='Anil Singh')
+        first = change_log.current_cursor()
+        self.assertEqual(self.delta('officer', 0, first), [('upsert', 'IC-10001'), ('upsert', 'IC-10002')])
+
+        rajesh.unit = 'Sikh Regiment'
+        rajesh.save()
+        Officer.objects.filter(pk='IC-10002').delete()
+        Education.objects.create(officer=rajesh, degree='BSc', institution='NDA', year_of_passing=2001, grade='A')
+        second = change_log.current_cursor()
+
+        self.assertEqual(self.delta('officer', first, second), [('upsert', 'IC-10001'), ('delete', 'IC-10002')])
+        upsert = next(row for op, row in change_log.delta_rows('officer', first, second) if op == 'upsert')
+        self.assertEqual(upsert['unit'], 'Sikh Regiment')
+        self.assertEqual(self.delta('education', first, second), [('clear', 'IC-10001'), ('insert', 'IC-10001')])
+        self.assertEqual(self.delta('officer', second, second), [])
+
+    def test_resume_from_cursor(self):
+        make_officer('IC-10001')
+        full = self.client.get('/records/export/officer/', {'format': 'jsonl'})
+        self.assertEqual(len(b"".join(full.streaming_content).splitlines()), 1)
+        cursor = full['X-Next-Cursor']
+
+        make_officer('IC-10002', full_name='Anil Singh')
+        for _ in range(2):
+            # The same cursor twice sends the same officers again
+            delta = self.client.get('/records/export/officer/', {'format': 'jsonl', 'since': cursor})
+            rows = [json.loads(line) for line in b"".join(delta.streaming_content).splitlines()]
+            self.assertEqual([(r['op'], r['army_number']) for r in rows], [('upsert', 'IC-10002')])
+        self.assertGreater(int(delta['X-Next-Cursor']), int(cursor))
+
+        response = self.client.get('/records/export/officer/', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CHANGELOG_SETTLE_SECONDS=60)
+    def test_settle_window_leaves_out_recent_changes(self):
+        make_officer('IC-10001')
+        make_officer('IC-10002', full_name='Anil Singh')
+        self.assertEqual(change_log.current_cursor(), 0)
+
+        settled = RecordChange.objects.get(army_number='IC-10001')
+        RecordChange.objects.filter(pk=settled.pk).update(changed_at=timezone.now() - timedelta(seconds=120))
+        cursor = change_log.current_cursor()
+        self.assertEqual(cursor, settled.pk)
+        self.assertEqual(self.delta('officer', 0, cursor), [('upsert', 'IC-10001')])
+
+
+class ChangeLogHorizonTests(TransactionTestCase):
+    databases = '__all__'
+
+    def test_cursor_behind_pruned_changes_needs_a_full_export(self):
+        make_officer('IC-10001')
+        make_officer('IC-10002', full_name='Anil Singh')
+        old, kept = RecordChange.objects.order_by('id')
+        RecordChange.objects.filter(pk=old.pk).update(changed_at=timezone.now() - timedelta(days=40))
+        self.assertEqual(change_log.prune(30), 1)
+        self.assertEqual(change_log.pruned_through(), old.pk)
+
+        with self.assertRaises(change_log.CursorExpired):
+            change_log.check_cursor(old.pk - 1)
+        change_log.check_cursor(old.pk)
+        response = self.client.get('/records/export/officer/', {'since': str(old.pk - 1)})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['full_export_required'])
+        self.assertEqual(self.client.get('/records/export/officer/', {'since': str(old.pk)}).status_code, 200)
+
+    @override_settings(CHANGELOG_SETTLE_SECONDS=0)
+    def test_changes_committed_after_the_settle_window_are_logged_again(self):
+        with self.assertLogs('main.change_log', 'WARNING'), transaction.atomic():
+            make_officer('IC-10001')
+            # Meanwhile a consumer's cursor moves past the uncommitted id
+            time.sleep(0.01)
+        first, again = RecordChange.objects.filter(army_number='IC-10001', model='officer').order_by('id')
+        self.assertGreater(again.pk, first.pk)
+
+
+class SimilarityIndexTests(TestCase):
+    def setUp(self):
+        shutil.rmtree(index_dir(), ignore_errors=True)
+        # No index directory left behind for later tests' signals to log into
+        self.addCleanup(shutil.rmtree, index_dir(), True)
+        make_officer('IC-10001')
+        make_officer('IC-10002', full_name='Suresh Nair', rank='Major', unit='Madras Regiment', address='Chennai')
+        make_officer('IC-10003', full_name='Anil Singh', unit='Punjab Regiment', address='Amritsar')
+        self.award = Award.objects.create(officer_id='IC-10001', award_name='Sena Medal', reason='Gallantry',
+                                          date_awarded=date(2015, 1, 26), location='Kupwara')
+        build_index(n_features=2 ** 14)
+        self.index = SimilarityIndex()
+
+    def keys(self, text, **kwargs):
+        return [key for key, _ in self.index.search(text, **kwargs)]
+
+    def test_best_matches_first(self):
+        matches = self.index.search('suresh nair madras', top_k=2, min_score=0)
+        self.assertEqual(len(matches), 2)
+        self.assertEqual(matches[0][0], 'officer:IC-10002')
+        self.assertGreater(matches[0][1], matches[1][1])
+        self.assertEqual(self.keys('sena medal kupwara')[0], f'award:{self.award.pk}')
+
+    def test_saved_change_is_searchable_after_replay(self):
+        self.assertNotIn('officer:IC-10003', self.keys('vikram batra'))
+        officer = Officer.objects.get(pk='IC-10003')
+        officer.full_name = 'Vikram Batra'
+        with self.captureOnCommitCallbacks(execute=True):
+            officer.save()
+        self.assertEqual(self.keys('vikram batra')[0], 'officer:IC-10003')
+
+    def test_renamed_officer_renames_their_records(self):
+        officer = Officer.objects.get(pk='IC-10001')
+        officer.full_name = 'Vikram Batra'
+        with self.captureOnCommitCallbacks(execute=True):
+            officer.save()
+        self.assertIn(f'award:{self.award.pk}', self.keys('sena medal vikram batra', top_k=2))
+
+    def test_replay_starts_over_when_the_log_shrinks(self):
+        officer = Officer.objects.get(pk='IC-10001')
+        officer.full_name = 'Vikram Batra'
+        with self.captureOnCommitCallbacks(execute=True):
+            officer.save()
+        self.assertIn('officer:IC-10001', self.keys('vikram batra'))
+
+        # The log is replaced by a shorter one: an offset into the old file would skip this change
+        log = os.path.join(index_dir(), 'changes.1.jsonl')
+        os.remove(log)
+        log_change('officer:IC-10003', 'Manoj Pandey')
+        with self.assertLogs('main.chat_similarity', 'WARNING'):
+            self.assertEqual(self.keys('manoj pandey')[0], 'officer:IC-10003')
+        self.assertNotIn('officer:IC-10001', self.keys('vikram batra'))
+
+    def test_deleted_officer_drops_out(self):
+        self.assertIn('officer:IC-10003', self.keys('anil singh punjab'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Officer.objects.filter(pk='IC-10003').delete()
+        self.assertNotIn('officer:IC-10003', self.keys('anil singh punjab', min_score=0))
+
+
+class BenchmarkCorpusTests(TestCase):
+    def test_percentiles(self):
+        latencies = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(percentile(latencies, 50), 0.05)
+        self.assertEqual(percentile([], 99), 0.0)
+        summary = latency_summary(latencies)
+        self.assertAlmostEqual(summary['p95_ms'], 95)
+        self.assertAlmostEqual(summary['max_ms'], 100)
+
+    def test_corpus_is_reproducible_and_clearable(self):
+        totals = corpus.generate_corpus(5, seed=3, chunk_size=2)
+        self.assertEqual(totals['officers'], 5)
+        self.assertEqual(Officer.objects.count(), 5)
+        self.assertEqual(Officer.objects.get(pk=corpus.army_number(1)).army_number, 'SYN0000001')
+        first = list(Officer.objects.order_by('pk').values_list('full_name', 'dob'))
+
+        corpus.clear_corpus()
+        self.assertFalse(Officer.objects.exists())
+        corpus.generate_corpus(5, seed=3, chunk_size=2)
+        self.assertEqual(list(Officer.objects.order_by('pk').values_list('full_name', 'dob')), first)
+
+    def test_query_mix_covers_every_template(self):
+        corpus.generate_corpus(3)
+        templates = len(corpus.QUERY_TEMPLATES)
+        labels = [label for label, _ in corpus.build_query_mix(templates)]
+        self.assertEqual(labels, [label for label, _ in corpus.QUERY_TEMPLATES])
+        mix = corpus.build_query_mix(templates, include_exports=False)
+        self.assertFalse([label for label, _ in mix if label.startswith('export')])
+        self.assertEqual(corpus.build_query_mix(10, seed=1), corpus.build_query_mix(10, seed=1))
+
+
+class OcrBenchmarkTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='ocr_bench_')
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_samples_round_trip_with_labels(self):
+        paths = ocr_bench.generate_samples(self.directory, 2, seed=5)
+        samples = ocr_bench.list_samples(self.directory)
+        self.assertEqual([path for path, _ in samples], paths)
+        self.assertEqual(set(samples[0][1]), set(ocr_bench.FIELDS))
+        with Image.open(paths[0]) as image:
+            self.assertGreater(image.size[0], 0)
+
+    def test_fields_are_scored_after_normalising(self):
+        expected = {'dob': '05/03/1990', 'phone': '98765 43210', 'blood_group': 'AB-', 'full_name': 'Anil Singh'}
+        extracted = {'dob': '1990-03-05', 'phone': '9876543210', 'blood_group': 'AB+', 'full_name': 'anil singh'}
+        self.assertEqual(ocr_bench.score_fields(expected, extracted),
+                         {'dob': True, 'phone': True, 'blood_group': False, 'full_name': True})
+
+    def test_process_sample_times_every_stage(self):
+        path = ocr_bench.generate_samples(self.directory, 1)[0]
+
+        def fake_ocr(image, adaptive=None, timings=None):
+            timings.update(preprocess=0.01, ocr=0.02, parse=0.001)
+            return {'fields': {'army_number': 'IC12345'}, 'escalated': True}
+
+        with mock.patch.object(ocr_utils, 'ocr_fields', fake_ocr):
+            timings, fields, peak_kb, escalated = ocr_bench.process_sample(path)
+        self.assertEqual(set(timings), set(ocr_bench.STAGES))
+        self.assertEqual(fields, {'army_number': 'IC12345'})
+        self.assertIsNone(peak_kb)
+        self.assertTrue(escalated)
+
+
+class OcrConfidenceTests(SimpleTestCase):
+    def test_field_confidence(self):
+        words = [('IC-12345K', 91.0), ('9876543210', 40.0)]
+        for field, value, expected in [
+            ('phone', '', 0.0),
+            ('phone', '9876543210', 1.0),
+            ('phone', '98765', 0.25),
+            ('rank', 'Colonel', 0.5),
+        ]:
+            with self.subTest(field=field, value=value):
+                self.assertEqual(ocr_utils.field_confidence(field, value), expected)
+        self.assertEqual(ocr_utils.field_confidence('army_number', 'IC-12345K', words), 0.91)
+        self.assertEqual(ocr_utils.field_confidence('phone', '98765', words, raw='9876543210'), 0.2)
+
+    def test_only_weak_fields_take_the_heavy_pass(self):
+        fast = ("Army No: IC-12345K\nMobile: 9876543Z10", [('IC-12345K', 95.0), ('9876543Z10', 30.0)])
+        heavy = ("Army No: IC-12845K\nMobile: 9876543210", [('IC-12845K', 60.0), ('9876543210', 88.0)])
+
+        with mock.patch.object(ocr_utils, 'preprocess_fast', lambda image: 'fast'), \
+                mock.patch.object(ocr_utils, 'preprocess_image', lambda image: 'heavy'), \
+                mock.patch.object(ocr_utils, 'deskew', lambda image: image), \
+                mock.patch.object(ocr_utils, 'ocr_words', lambda image: fast if image == 'fast' else heavy):
+            result = ocr_utils.ocr_fields(object(), adaptive=True, threshold=0.6)
+            single = ocr_utils.ocr_fields(object(), adaptive=False)
+
+        self.assertTrue(result['escalated'])
+        self.assertEqual(result['fields']['army_number'], 'IC-12345K')   # confident on the fast pass
+        self.assertEqual(result['fields']['phone'], '9876543210')        # re-read by the heavy pass
+        self.assertIn('phone', result['improved_fields'])
+        self.assertNotIn('army_number', result['improved_fields'])
+        self.assertFalse(single['escalated'])
+        self.assertEqual(single['fields']['army_number'], 'IC-12845K')
+
+
+def jpeg_bytes(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=(120, 80, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class PhotoDerivativeTests(TestCase):
+    def setUp(self):
+        reset_caches()
+
+    def test_variants_fit_and_never_enlarge(self):
+        with Image.open(io.BytesIO(render_variant(jpeg_bytes((1200, 600)), (240, 240), 80))) as image:
+            self.assertEqual(image.size, (240, 120))
+        with Image.open(io.BytesIO(render_variant(jpeg_bytes((50, 40)), (240, 240), 80))) as image:
+            self.assertEqual(image.size, (50, 40))
+
+    def test_derivatives_are_written_once_and_served(self):
+        officer = make_officer('IC-10001', photo=SimpleUploadedFile('me.jpg', jpeg_bytes((1200, 900))))
+        self.addCleanup(officer.photo.delete, save=False)
+        self.assertEqual(photo_url(officer, 'thumb'), officer.photo.url)
+
+        photo_hash = generate_derivatives(officer)
+        for variant in ('thumb', 'chat', 'profile'):
+            self.addCleanup(default_storage.delete, derivative_name(photo_hash, variant))
+            self.assertTrue(default_storage.exists(derivative_name(photo_hash, variant)))
+        self.assertEqual(Officer.objects.get(pk='IC-10001').photo_hash, photo_hash)
+        self.assertTrue(photo_url(officer, 'thumb').endswith(f'{photo_hash}_thumb.jpg'))
+
+        with mock.patch.object(default_storage, 'save') as save:
+            self.assertEqual(generate_derivatives(officer), photo_hash)
+        save.assert_not_called()
+
+        response = self.client.get('/officer/IC-10001/photo/chat/')
+        self.assertRedirects(response, photo_url(officer, 'chat'), fetch_redirect_response=False)
+
+    def test_new_photo_hash_reaches_every_worker(self):
+        officer = make_officer('IC-10001', photo=SimpleUploadedFile('me.jpg', jpeg_bytes((300, 200))))
+        self.addCleanup(officer.photo.delete, save=False)
+        before = shared_cache.version('officer')
+        with self.captureOnCommitCallbacks(execute=True):
+            photo_hash = generate_derivatives(officer)
+        for variant in ('thumb', 'chat', 'profile'):
+            self.addCleanup(default_storage.delete, derivative_name(photo_hash, variant))
+        self.assertNotEqual(shared_cache.version('officer'), before)
+
+    def test_photo_request_queues_generation_once(self):
+        officer = make_officer('IC-10001', photo=SimpleUploadedFile('me.jpg', jpeg_bytes((300, 200))))
+        self.addCleanup(officer.photo.delete, save=False)
+        self.addCleanup(thumbnails._pending.discard, 'IC-10001')
+        with mock.patch.object(thumbnails, '_executor') as executor:
+            for _ in range(2):
+                response = self.client.get('/officer/IC-10001/photo/chat/')
+                self.assertRedirects(response, officer.photo.url, fetch_redirect_response=False)
+        executor.submit.assert_called_once_with(thumbnails._generate_for, 'IC-10001')
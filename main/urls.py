@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.urls import path
 from .views import chatbot_view
 from . import views
 
+# Under ASGI set CHATBOT_ASYNC = True so /chatbot/ skips the sync-to-async shim
+chatbot_entry = views.chatbot_async_view if getattr(settings, 'CHATBOT_ASYNC', False) else chatbot_view
+
 
 urlpatterns = [
     path('', views.home, name='home'),  # homepage
@@ -12,6 +16,14 @@ urlpatterns = [
     path('success/', views.success, name='success'),
     path('register/', views.create_officer, name='create_officer'),
     path('extract-officer-data/', views.extract_officer_data, name='extract_officer_data'),
-    path('chatbot/', chatbot_view, name='chatbot'),
+    path('chatbot/', chatbot_entry, name='chatbot'),
+    path('chatbot/async/', views.chatbot_async_view, name='chatbot_async'),
+    path('chatbot/batch/', views.chatbot_batch_view, name='chatbot_batch'),
     path("export/download/<str:filename>", views.download_export, name="download_export"),
+    path('officer/<str:army_number>/photo/', views.officer_photo, name='officer_photo'),
+    path('officer/<str:army_number>/photo/<str:variant>/', views.officer_photo, name='officer_photo_variant'),
+    path('records/import/', views.import_records_view, name='import_records'),
+    path('records/export/<str:model>/', views.export_records_view, name='export_records'),
+    path('metrics/db-pool/', views.db_pool_metrics, name='db_pool_metrics'),
+    path('metrics/chat/', views.chat_metrics, name='chat_metrics'),
 ]  
\ No newline at end of file
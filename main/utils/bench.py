@@ -0,0 +1,28 @@
+# main/utils/bench.py
+"""Small helpers shared by the benchmark / load test management commands"""
+import math
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (pct in 0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies):
+    """p50/p95/p99/max in milliseconds for a list of latencies in seconds"""
+    return {
+        'count': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def format_summary(summary):
+    return (f"n={summary['count']:<6} p50={summary['p50_ms']:8.2f}ms  p95={summary['p95_ms']:8.2f}ms  "
+            f"p99={summary['p99_ms']:8.2f}ms  max={summary['max_ms']:8.2f}ms")
@@ -0,0 +1,207 @@
+# main/utils/corpus.py
+"""Synthetic officer corpus and chatbot query mix for benchmarks.
+
+generate_corpus() writes officers with family, education and award records
+in chunks (1k to 1M officers), and build_query_mix() produces Hinglish/English
+questions that exercise every branch of process_query_v2.
+"""
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from main.models import Officer, Education, Family, Award
+
+ARMY_NUMBER_PREFIX = "SYN"
+
+FIRST_NAMES = [
+    "Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Ayaan", "Krishna", "Ishaan",
+    "Ananya", "Diya", "Aadhya", "Saanvi", "Myra", "Anika", "Navya", "Kiara", "Meera", "Riya",
+    "Rajesh", "Suresh", "Vikram", "Harpreet", "Gurpreet", "Manoj", "Deepak", "Sunita", "Kavita", "Neha",
+]
+SURNAMES = [
+    "Sharma", "Verma", "Singh", "Yadav", "Rana", "Chauhan", "Rathore", "Negi", "Thapa", "Gill",
+    "Sandhu", "Nair", "Menon", "Iyer", "Reddy", "Das", "Bose", "Mehta", "Shah", "Kulkarni",
+]
+RANKS = ["Lieutenant", "Captain", "Major", "Lieutenant Colonel", "Colonel", "Brigadier", "General"]
+POSITIONS = ["Adjutant", "Quartermaster", "Company Commander", "Signal Officer", "Instructor",
+             "Intelligence Officer", "Platoon Commander", "Operations Officer"]
+UNITS = [
+    "1 Signal Group Delhi", "5 Sikh Regiment Punjab", "4 Assam Regiment", "13 JAK Rifles Kashmir",
+    "Ladakh Scouts", "6 Garhwal Rifles Uttarakhand", "3 Grenadiers Rajasthan", "9 Gorkha Rifles Sikkim",
+    "110 Engineer Regiment", "72 Armoured Regiment", "2 Naga Regiment Nagaland", "Madras Regiment Kerala",
+]
+CITIES = ["New Delhi", "Lucknow", "Kolkata", "Dehradun", "Pune", "Jaipur", "Guwahati", "Chandigarh"]
+BLOOD_GROUPS = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+RELATIONS = ["Father", "Mother", "Spouse", "Son", "Daughter"]
+OCCUPATIONS = ["Homemaker", "Teacher", "Doctor", "Engineer", "Student", "Retired Government Servant"]
+DEGREES = ["B.Tech Electronics", "B.Sc Physics", "MA International Relations", "M.Tech Communication",
+           "PG Diploma in Defence Management", "BA History"]
+INSTITUTIONS = ["IMA Dehradun", "NDA Khadakwasla", "Officers Training Academy (OTA)", "NIT Trichy",
+                "Jawaharlal Nehru University (JNU)", "MCTE Mhow"]
+GRADES = ["A+", "A", "B+", "B", "First Class"]
+AWARDS = [
+    ("Sena Medal", "Exceptional devotion to duty"),
+    ("Vishisht Seva Medal", "Distinguished service of a high order"),
+    ("Shaurya Chakra", "Gallantry otherwise than in the face of the enemy"),
+    ("Kirti Chakra", "Conspicuous gallantry away from battlefield"),
+    ("Param Vir Chakra", "Supreme act of valor in the face of the enemy"),
+]
+AWARD_LOCATIONS = ["New Delhi", "Srinagar", "Leh", "Guwahati", "Jammu & Kashmir"]
+
+
+def army_number(index):
+    return f"{ARMY_NUMBER_PREFIX}{index:07d}"
+
+
+def _random_date(rng, start_year, end_year):
+    start = date(start_year, 1, 1)
+    return start + timedelta(days=rng.randrange((date(end_year, 12, 31) - start).days))
+
+
+def _officer(rng, index):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+    dob = _random_date(rng, 1965, 1998)
+    return Officer(
+        army_number=army_number(index),
+        full_name=f"{first} {last}",
+        rank=rng.choice(RANKS),
+        position=rng.choice(POSITIONS),
+        unit=rng.choice(UNITS),
+        dob=dob,
+        enlistment_date=_random_date(rng, dob.year + 19, min(dob.year + 26, 2024)),
+        phone=str(rng.randrange(6000000000, 9999999999)),
+        email=f"{first.lower()}.{last.lower()}{index}@army.example",
+        address=f"{rng.randrange(1, 500)}, Cantt Road, {rng.choice(CITIES)}, India",
+        blood_group=rng.choice(BLOOD_GROUPS),
+    )
+
+
+def _related(rng, officer):
+    family = [
+        Family(
+            officer=officer,
+            name=f"{rng.choice(FIRST_NAMES)} {officer.full_name.split()[-1]}",
+            relation=relation,
+            dob=_random_date(rng, 1940, 2015),
+            occupation=rng.choice(OCCUPATIONS),
+            contact=str(rng.randrange(6000000000, 9999999999)),
+        )
+        for relation in rng.sample(RELATIONS, rng.randint(2, 4))
+    ]
+    educations = [
+        Education(
+            officer=officer,
+            degree=rng.choice(DEGREES),
+            institution=rng.choice(INSTITUTIONS),
+            year_of_passing=rng.randint(officer.dob.year + 20, officer.dob.year + 35),
+            grade=rng.choice(GRADES),
+        )
+        for _ in range(rng.randint(1, 3))
+    ]
+    awards = []
+    for _ in range(rng.choice([0, 0, 1, 1, 2])):
+        name, reason = rng.choice(AWARDS)
+        awards.append(Award(
+            officer=officer,
+            award_name=name,
+            reason=reason,
+            date_awarded=_random_date(rng, max(officer.enlistment_date.year + 1, 2000), 2024),
+            location=rng.choice(AWARD_LOCATIONS),
+        ))
+    return family, educations, awards
+
+
+def generate_corpus(officers, seed=42, chunk_size=2000, start=1, progress=None):
+    """Create `officers` synthetic officers (plus related rows); returns row counts"""
+    rng = random.Random(seed)
+    totals = {'officers': 0, 'family': 0, 'education': 0, 'awards': 0}
+
+    for chunk_start in range(start, start + officers, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, start + officers)
+        batch = [_officer(rng, i) for i in range(chunk_start, chunk_end)]
+        family, educations, awards = [], [], []
+        for officer in batch:
+            f, e, a = _related(rng, officer)
+            family += f
+            educations += e
+            awards += a
+
+        with transaction.atomic():
+            Officer.objects.bulk_create(batch)
+            Family.objects.bulk_create(family)
+            Education.objects.bulk_create(educations)
+            Award.objects.bulk_create(awards)
+
+        totals['officers'] += len(batch)
+        totals['family'] += len(family)
+        totals['education'] += len(educations)
+        totals['awards'] += len(awards)
+        if progress:
+            progress(totals)
+    return totals
+
+
+def clear_corpus():
+    """Delete synthetic officers (related rows cascade)"""
+    return Officer.objects.filter(army_number__startswith=ARMY_NUMBER_PREFIX).delete()
+
+
+# (label, template) pairs; every branch of process_query_v2 is covered at least once
+QUERY_TEMPLATES = [
+    ("complex", "show blood group and phone of officers in {location}"),
+    ("complex", "list officers with rank {rank}"),
+    ("count:location", "how many officers in {location}"),
+    ("count:location", "{location} mein kitne officers hai"),
+    ("count:rank", "total {rank}s"),
+    ("count:year", "how many officers enlisted after {year}"),
+    ("count:year", "kitne officers before {year}"),
+    ("count:award", "how many {award} award"),
+    ("count:award", "total awards"),
+    ("count:blood", "how many officers with blood group {blood}"),
+    ("bulk:location", "list all officers in {location}"),
+    ("bulk:rank", "sabhi {rank} ki list"),
+    ("bulk:award", "all officers with {award} award"),
+    ("bulk:unknown", "sabhi officers dikhao"),
+    ("export:bulk", "list all officers in {location} excel"),
+    ("single:basic", "basic details of {army_number}"),
+    ("single:contact", "{army_number} ka mobile aur email"),
+    ("single:family", "{army_number} ki family ki jankari"),
+    ("single:education", "education of {army_number}"),
+    ("single:award", "{army_number} ke medal"),
+    ("single:default", "{army_number}"),
+    ("export:single", "{army_number} education excel"),
+    ("single:fuzzy", "{full_name} ki personal jankari"),
+    ("single:miss", "file 2015 ka status"),
+    ("fallback", "signal exercise report"),
+]
+
+LOCATIONS = ["delhi", "punjab", "assam", "kashmir", "ladakh", "rajasthan", "sikkim", "kerala"]
+QUERY_RANKS = ["colonel", "major", "brigadier", "lieutenant", "general"]
+
+
+def build_query_mix(count, seed=7, include_exports=True):
+    """Return `count` (label, query) pairs drawn from QUERY_TEMPLATES and the current data"""
+    rng = random.Random(seed)
+    # A slice instead of order_by('?'), which sorts the whole table at 1M rows
+    sample = list(Officer.objects.values('army_number', 'full_name')[:2000])
+    awards = list(Award.objects.values_list('award_name', flat=True).distinct()) or [a for a, _ in AWARDS]
+    if not sample:
+        sample = [{'army_number': army_number(1), 'full_name': 'Aarav Sharma'}]
+
+    templates = [t for t in QUERY_TEMPLATES if include_exports or not t[0].startswith("export")]
+    mix = []
+    for i in range(count):
+        # Walk the templates in order first so small runs still cover every branch
+        label, template = templates[i] if i < len(templates) else rng.choice(templates)
+        officer = rng.choice(sample)
+        mix.append((label, template.format(
+            location=rng.choice(LOCATIONS),
+            rank=rng.choice(QUERY_RANKS),
+            year=rng.randint(1990, 2020),
+            award=rng.choice(awards).lower(),
+            blood=rng.choice(BLOOD_GROUPS).lower(),
+            army_number=officer['army_number'],
+            full_name=officer['full_name'].lower(),
+        )))
+    return mix
@@ -0,0 +1,177 @@
+# main/utils/downloads.py
+"""Serving generated export files.
+
+serve_file() answers a download with:
+
+  * a strong ETag (SHA-1 of the bytes, hashed once per file version and
+    process) and Last-Modified, so If-None-Match / If-Modified-Since get
+    a 304 without sending the file again;
+  * Accept-Ranges / single-range 206 responses (If-Range respected), so a
+    large PDF can be resumed;
+  * for CSV, when the client accepts gzip, a compressed copy written next
+    to the file on first request (file.csv.gz) and reused afterwards;
+  * with EXPORT_SENDFILE set, no body at all: the X-Sendfile (Apache,
+    lighttpd) or X-Accel-Redirect (nginx, under EXPORT_ACCEL_PREFIX)
+    header tells the front-end server to send the file, ranges included,
+    and the worker is free as soon as the headers are built.
+
+    location /protected-exports/ {
+        internal;
+        alias /path/to/media/exports/;
+    }
+"""
+import functools
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags, quote_etag
+
+CHUNK_SIZE = 64 * 1024
+GZIP_TYPES = {"text/csv"}
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@functools.lru_cache(maxsize=1024)
+def _etag(path, size, mtime_ns):
+    # size/mtime in the key: a rewritten file is hashed again
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return quote_etag(digest.hexdigest())
+
+
+def file_etag(path, stat=None):
+    stat = stat or os.stat(path)
+    return _etag(path, stat.st_size, stat.st_mtime_ns)
+
+
+def gzipped_copy(path):
+    """path + '.gz', written once (atomically) and rewritten if the original is newer"""
+    gz_path = path + '.gz'
+    try:
+        if os.stat(gz_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+            return gz_path
+    except FileNotFoundError:
+        pass
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.gz.tmp')
+    try:
+        with open(path, 'rb') as source, os.fdopen(fd, 'wb') as raw, \
+                gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as target:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+        os.replace(tmp_path, gz_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return gz_path
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '').lower()
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range; None to send the whole file;
+    'unsatisfiable' when the range lies outside the file"""
+    match = _RANGE_RE.match(header.strip())
+    # Multiple ranges or other units: sending the full file is always allowed
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or size == 0:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload(path, response):
+    mode = getattr(settings, 'EXPORT_SENDFILE', None)
+    if mode == 'x-sendfile':
+        response['X-Sendfile'] = path
+    elif mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'EXPORT_ACCEL_PREFIX', '/protected-exports/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + os.path.basename(path)
+    else:
+        return False
+    return True
+
+
+def serve_file(request, path, filename, content_type):
+    """Download response for `path`, saved by the browser as `filename`"""
+    encoding = None
+    if content_type in GZIP_TYPES and getattr(settings, 'EXPORT_GZIP_CSV', True) and accepts_gzip(request):
+        path, encoding = gzipped_copy(path), 'gzip'
+
+    stat = os.stat(path)
+    etag = file_etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': f"private, max-age={getattr(settings, 'EXPORT_DOWNLOAD_MAX_AGE', 3600)}",
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, path, stat.st_size, etag, content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if encoding:
+            response['Content-Encoding'] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    if content_type in GZIP_TYPES:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _file_response(request, path, size, etag, content_type):
+    sendfile = HttpResponse(content_type=content_type)
+    if _offload(path, sendfile):
+        # The front-end server handles Range (and Content-Length) itself
+        return sendfile
+
+    byte_range = None
+    if request.method == 'GET' and 'HTTP_RANGE' in request.META:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        # A stale If-Range (or a date, which we don't compare) means: send the whole new file
+        if if_range is None or etag in parse_etags(if_range):
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -3,11 +3,18 @@ import uuid
 from datetime import datetime
 
 from django.conf import settings
+from django.urls import reverse
 import csv
-from docx import Document
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
+
+from . import shared_cache
+from .lazy import lazy_import
+from .tracing import span
+
+# Loaded on the first Word/PDF export, not when the chatbot starts
+docx = lazy_import('docx')
+platypus = lazy_import('reportlab.platypus')
+colors = lazy_import('reportlab.lib.colors')
+reportlab_styles = lazy_import('reportlab.lib.styles')
 
 # Ensure export folder exists
 EXPORT_DIR = os.path.join(settings.MEDIA_ROOT, "exports")
@@ -65,6 +72,19 @@ def export_awards(awards, title, export_type):
 
 # ---------- Core generator ----------
 def _generate_file(headers, rows, title, export_type, filename_base):
+    # The same export asked for again (by any worker) reuses the file already written
+    key = f"{export_type}:{shared_cache.digest(repr((title, headers, rows)))}"
+    url = shared_cache.get('export', key)
+    if url and os.path.exists(os.path.join(EXPORT_DIR, os.path.basename(url))):
+        return url
+
+    with span(f"export.{export_type}"):
+        url = _write_file(headers, rows, title, export_type, filename_base)
+    shared_cache.set('export', key, url, timeout=getattr(settings, 'SHARED_EXPORT_TTL', 3600))
+    return url
+
+
+def _write_file(headers, rows, title, export_type, filename_base):
     # Unique filename with timestamp + random ID
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     unique_id = uuid.uuid4().hex[:6]
@@ -80,7 +100,7 @@ def _generate_file(headers, rows, title, export_type, filename_base):
 
     elif export_type == "word":
         file_path = os.path.join(EXPORT_DIR, f"{filename}.docx")
-        doc = Document()
+        doc = docx.Document()
         doc.add_heading("Army Record System", 0)
         doc.add_heading(title, level=1)
         table = doc.add_table(rows=1, cols=len(headers))
@@ -95,17 +115,17 @@ def _generate_file(headers, rows, title, export_type, filename_base):
 
     elif export_type == "pdf":
         file_path = os.path.join(EXPORT_DIR, f"{filename}.pdf")
-        styles = getSampleStyleSheet()
-        doc = SimpleDocTemplate(file_path)
+        styles = reportlab_styles.getSampleStyleSheet()
+        doc = platypus.SimpleDocTemplate(file_path)
         elements = [
-            Paragraph("Army Record System", styles["Heading1"]),
-            Paragraph(title, styles["Heading2"]),
-            Spacer(1, 12),
+            platypus.Paragraph("Army Record System", styles["Heading1"]),
+            platypus.Paragraph(title, styles["Heading2"]),
+            platypus.Spacer(1, 12),
         ]
         data = [headers] + rows
-        table = Table(data)
+        table = platypus.Table(data)
         table.setStyle(
-            TableStyle(
+            platypus.TableStyle(
                 [
                     ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
                     ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
@@ -120,8 +140,8 @@ def _generate_file(headers, rows, title, export_type, filename_base):
     else:
         raise ValueError("Unsupported export type")
 
-    # ✅ Return public URL for chatbot
-    return settings.MEDIA_URL + "exports/" + os.path.basename(file_path)
+    # ✅ Return download URL for chatbot (served by views.download_export: ETag, Range, sendfile)
+    return reverse("download_export", args=[os.path.basename(file_path)])
 
 
 
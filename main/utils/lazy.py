@@ -0,0 +1,119 @@
+# main/utils/lazy.py
+"""Deferred imports for heavy optional libraries.
+
+    cv2 = lazy_import('cv2')          # nothing imported yet
+    ...
+    cv2.imdecode(...)                 # imported here, on first attribute access
+
+Workers that only serve chat never load OpenCV, Tesseract, ReportLab or
+python-docx. Each deferred import is timed; lazy_import_stats() lists what
+has been loaded so far and how long it took (shown by `manage.py
+import_report`).
+"""
+import importlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Libraries a chat-only worker should never need to load
+HEAVY_MODULES = ('cv2', 'numpy', 'pytesseract', 'tesserocr', 'reportlab', 'docx', 'PIL', 'tkinter')
+
+_lock = threading.Lock()
+_load_times = {}
+
+
+class LazyModule:
+    __slots__ = ('_lazy_name', '_lazy_module')
+
+    def __init__(self, name):
+        object.__setattr__(self, '_lazy_name', name)
+        object.__setattr__(self, '_lazy_module', None)
+
+    def _load(self):
+        module = self._lazy_module
+        if module is None:
+            with _lock:
+                module = self._lazy_module
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._lazy_name)
+                    ms = (time.perf_counter() - start) * 1000
+                    _load_times.setdefault(self._lazy_name, ms)
+                    logger.debug(f"Lazy import of {self._lazy_name} took {ms:.1f}ms")
+                    object.__setattr__(self, '_lazy_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self._lazy_module is not None else 'not loaded'
+        return f"<lazy module {self._lazy_name!r} ({state})>"
+
+
+def lazy_import(name):
+    """A stand-in for `import name` that imports on first use"""
+    return LazyModule(name)
+
+
+def lazy_import_stats():
+    """{module: milliseconds} for the lazy imports done so far in this process"""
+    return dict(_load_times)
+
+
+_PROBE = '''
+import json, os, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+import importlib
+importlib.import_module(sys.argv[1])
+elapsed_ms = (time.perf_counter() - start) * 1000
+try:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    rss_kb = None
+heavy = json.loads(sys.argv[2])
+print(json.dumps({
+    "elapsed_ms": elapsed_ms,
+    "rss_kb": rss_kb,
+    "loaded": sorted(m for m in heavy if m in sys.modules),
+}))
+'''
+
+
+def probe_imports(target='main.urls', importtime=False, cwd=None):
+    """Import `target` (after django.setup()) in a fresh interpreter and report what it cost.
+
+    Returns {"elapsed_ms", "rss_kb", "loaded": heavy modules that got imported,
+    "importtime": [(cumulative_us, self_us, module), ...] when importtime=True}.
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', _PROBE, target, json.dumps(HEAVY_MODULES)]
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot.settings')
+    result = subprocess.run(command, capture_output=True, text=True, cwd=cwd, env=env, check=True)
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    if importtime:
+        rows = []
+        for line in result.stderr.splitlines():
+            # "import time:   self [us] | cumulative | imported package"
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+        report['importtime'] = rows
+    return report
@@ -0,0 +1,251 @@
+# main/utils/ocr_bench.py
+"""OCR benchmark and accuracy harness.
+
+A sample directory holds form images with a JSON file of the expected field
+values next to each one (form_0001.png + form_0001.json).
+generate_samples() writes synthetic forms so the harness runs offline, and
+run_benchmark() pushes every image through the extract_fields stages on a
+worker pool, timing each stage and scoring each field.
+"""
+import functools
+import json
+import os
+import random
+import re
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+FIELDS = ['army_number', 'full_name', 'rank', 'position', 'unit', 'dob', 'enlistment_date',
+          'phone', 'email', 'blood_group', 'address']
+STAGES = ['decode', 'preprocess', 'ocr', 'parse']
+
+# Printed label for each field on the synthetic form
+FORM_LABELS = [
+    ('army_number', 'Army Number'),
+    ('full_name', 'Full Name'),
+    ('rank', 'Rank'),
+    ('position', 'Position'),
+    ('unit', 'Unit'),
+    ('dob', 'Date of Birth'),
+    ('enlistment_date', 'Enlistment Date'),
+    ('phone', 'Phone'),
+    ('email', 'Email'),
+    ('blood_group', 'Blood Group'),
+]
+
+
+def normalize(value):
+    """Compare values case- and punctuation-insensitively (keeps @ . + -)"""
+    return re.sub(r'[^a-z0-9@.+\-]', '', str(value or '').lower())
+
+
+def list_samples(directory):
+    """[(image_path, labels_dict_or_None)] for every image in the directory"""
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        path = os.path.join(directory, name)
+        label_path = os.path.splitext(path)[0] + '.json'
+        labels = None
+        if os.path.exists(label_path):
+            with open(label_path, encoding='utf-8') as f:
+                labels = json.load(f)
+        samples.append((path, labels))
+    return samples
+
+
+# -------------------- synthetic forms -------------------- #
+def _font(size):
+    from PIL import ImageFont
+    for name in ('DejaVuSans.ttf', 'arial.ttf', 'LiberationSans-Regular.ttf'):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def render_form(values, noise=0.0, skew=0.0, shadow=False, seed=0):
+    """Draw an officer registration form as a PIL image"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    width, height = 1700, 2200
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    title_font, font = _font(56), _font(40)
+
+    draw.text((150, 120), "ARMY OFFICER REGISTRATION FORM", fill=0, font=title_font)
+    y = 300
+    for field, label in FORM_LABELS:
+        draw.text((150, y), f"{label}: {values[field]}", fill=0, font=font)
+        y += 110
+    draw.text((150, y), "Address:", fill=0, font=font)
+    for line in values['address'].split(', '):
+        y += 70
+        draw.text((190, y), line, fill=0, font=font)
+
+    if shadow:
+        # Uneven lighting from one side, as with phone photos
+        gradient = Image.linear_gradient('L').rotate(90).resize((width, height))
+        image = Image.composite(image, gradient.point(lambda v: 120 + v // 2), image.point(lambda v: 255 - v))
+    if skew:
+        image = image.rotate(skew, expand=True, fillcolor=255)
+    if noise:
+        pixels = image.load()
+        w, h = image.size
+        for _ in range(int(w * h * noise)):
+            pixels[rng.randrange(w), rng.randrange(h)] = rng.choice((0, 255))
+        image = image.filter(ImageFilter.GaussianBlur(0.6))
+    return image
+
+
+def random_form_values(rng):
+    # Reuse the benchmark corpus vocabularies so forms look like real records
+    from .corpus import BLOOD_GROUPS, CITIES, FIRST_NAMES, POSITIONS, RANKS, SURNAMES, UNITS
+
+    first, last = rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+    return {
+        'army_number': f"IC{rng.randrange(10000, 99999)}",
+        'full_name': f"{first} {last}",
+        'rank': rng.choice(RANKS),
+        'position': rng.choice(POSITIONS),
+        'unit': rng.choice(UNITS),
+        'dob': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1965, 1998)}",
+        'enlistment_date': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1990, 2020)}",
+        'phone': str(rng.randrange(6000000000, 9999999999)),
+        'email': f"{first.lower()}.{last.lower()}@army.example",
+        'blood_group': rng.choice(BLOOD_GROUPS),
+        'address': f"{rng.randrange(1, 500)}, Cantt Road, {rng.choice(CITIES)}, India",
+    }
+
+
+def generate_samples(directory, count, seed=1, noise=0.002, skew=1.5, shadow=True):
+    """Write `count` synthetic forms with label files; returns the image paths"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(1, count + 1):
+        values = random_form_values(rng)
+        image = render_form(
+            values,
+            noise=noise * rng.random(),
+            skew=rng.uniform(-skew, skew),
+            shadow=shadow and rng.random() < 0.5,
+            seed=rng.randrange(1 << 30),
+        )
+        path = os.path.join(directory, f"form_{i:04d}.png")
+        image.save(path)
+        with open(os.path.splitext(path)[0] + '.json', 'w', encoding='utf-8') as f:
+            json.dump(values, f, indent=2)
+        paths.append(path)
+    return paths
+
+
+# -------------------- benchmark -------------------- #
+def process_sample(path, adaptive=None):
+    """Run one image through the extract_fields stages; returns (timings, fields, peak_kb, escalated).
+
+    peak_kb is the peak traced allocation for the image (numpy and OpenCV
+    arrays included; Tesseract's own memory is not traced), or None unless
+    tracemalloc is running.
+    """
+    from main.ocr_utils import load_image, ocr_fields
+
+    measure = tracemalloc.is_tracing()
+    if measure:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+    timings = {}
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        image = load_image(f.read())
+    timings['decode'] = time.perf_counter() - start
+
+    result = ocr_fields(image, adaptive=adaptive, timings=timings)
+    peak_kb = (tracemalloc.get_traced_memory()[1] - baseline) / 1024 if measure else None
+    return timings, result['fields'], peak_kb, result['escalated']
+
+
+def _init_worker(tesseract_cmd, engine=None, memory=False):
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if tesseract_cmd:
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    if engine:
+        from .ocr_engine import set_engine
+        set_engine(engine)
+
+
+def score_fields(expected, extracted):
+    """{field: True/False} for every labelled field"""
+    # Labels hold the printed values; extraction returns them in OfficerForm format
+    from main.ocr_parser import normalize_value
+    return {
+        field: normalize(extracted.get(field)) == normalize(normalize_value(field, expected[field]) or expected[field])
+        for field in FIELDS if field in expected
+    }
+
+
+def run_benchmark(samples, workers=1, tesseract_cmd=None, engine=None, memory=False, adaptive=None):
+    """Process samples on a worker pool and aggregate timing, memory and accuracy"""
+    paths = [path for path, _ in samples]
+    process = functools.partial(process_sample, adaptive=adaptive)
+    start = time.perf_counter()
+    if workers > 1 and engine == 'pool':
+        # The engine already owns the OCR processes; just keep it busy from threads
+        # (with --memory the peak then covers the images being processed concurrently)
+        _init_worker(tesseract_cmd, engine, memory)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(process, paths))
+    elif workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(tesseract_cmd, engine, memory)) as executor:
+            outputs = list(executor.map(process, paths))
+    else:
+        _init_worker(tesseract_cmd, engine, memory)
+        outputs = [process(path) for path in paths]
+    elapsed = time.perf_counter() - start
+    if memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    stage_times = {stage: [] for stage in STAGES}
+    field_hits = {field: [0, 0] for field in FIELDS}
+    peaks = []
+    per_image = []
+    escalations = 0
+    for (path, labels), (timings, fields, peak_kb, escalated) in zip(samples, outputs):
+        escalations += int(escalated)
+        for stage in STAGES:
+            stage_times[stage].append(timings[stage])
+        if peak_kb is not None:
+            peaks.append(peak_kb)
+        scores = score_fields(labels, fields) if labels else {}
+        for field, ok in scores.items():
+            field_hits[field][0] += int(ok)
+            field_hits[field][1] += 1
+        per_image.append({'image': os.path.basename(path), 'timings': timings, 'peak_kb': peak_kb,
+                          'escalated': escalated,
+                          'missed': sorted(f for f, ok in scores.items() if not ok)})
+
+    return {
+        'images': len(paths),
+        'workers': workers,
+        'engine': engine or 'default',
+        'mode': {None: 'default', True: 'adaptive', False: 'full'}[adaptive],
+        'escalation_rate': escalations / len(paths) if paths else 0.0,
+        'elapsed_s': elapsed,
+        'images_per_sec': len(paths) / elapsed if elapsed else 0.0,
+        'stage_times': stage_times,
+        'peak_kb': {'max': max(peaks), 'avg': sum(peaks) / len(peaks)} if peaks else None,
+        'field_accuracy': {f: hits / total for f, (hits, total) in field_hits.items() if total},
+        'per_image': per_image,
+    }
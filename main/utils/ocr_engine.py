@@ -0,0 +1,236 @@
+# main/utils/ocr_engine.py
+"""OCR engines behind one image_to_string() call.
+
+pytesseract starts a tesseract process, writes a temp file and reloads the
+language model for every image. When tesserocr is installed we keep the
+model loaded instead:
+
+  * "tesserocr": one PyTessBaseAPI per thread, in this process.
+  * "pool":      long-lived worker processes, each holding a loaded
+                 PyTessBaseAPI; images are sent to them as in-memory arrays.
+  * "pytesseract": the old behaviour, always available.
+
+image_to_words() also returns Tesseract's per-word confidences (0-100) as
+[(word, confidence)], for scoring extracted fields.
+
+"auto" (the default) picks "pool" when tesserocr imports, else "pytesseract".
+Choose with the OCR_ENGINE environment variable or setting; OCR_POOL_SIZE
+sets the number of worker processes. If a pool worker dies (a Tesseract
+crash, the OOM killer), the pool is replaced and the image retried once;
+an image that breaks the new pool too is read with pytesseract.
+"""
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+def _setting(name, default):
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:  # settings not configured (plain scripts, spawned workers)
+        return default
+
+
+def _to_pil(image):
+    return image if isinstance(image, Image.Image) else Image.fromarray(image)
+
+
+def _data_to_words(data):
+    """Rebuild the page text from pytesseract's image_to_data and pair each word with its confidence"""
+    lines, words = [], []
+    current, previous_block = None, None
+    for i, word in enumerate(data['text']):
+        conf = float(data['conf'][i])
+        if conf < 0 or not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        if key != current:
+            if previous_block is not None and key[0] != previous_block:
+                lines.append([])  # blank line between blocks, like image_to_string
+            lines.append([])
+            current, previous_block = key, key[0]
+        lines[-1].append(word)
+        words.append((word, conf))
+    return "\n".join(" ".join(line) for line in lines), words
+
+
+class PytesseractEngine:
+    name = 'pytesseract'
+
+    def image_to_string(self, image, lang='eng'):
+        return pytesseract.image_to_string(image, lang=lang)
+
+    def image_to_words(self, image, lang='eng'):
+        return _data_to_words(pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT))
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    """Keeps one loaded Tesseract API per thread (the API is not thread-safe)"""
+    name = 'tesserocr'
+
+    def __init__(self):
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+
+    def _api(self, lang):
+        api = getattr(self._local, 'api', None)
+        if api is None or self._local.lang != lang:
+            api = tesserocr.PyTessBaseAPI(lang=lang)
+            self._local.api, self._local.lang = api, lang
+            with self._lock:
+                self._apis.append(api)
+        return api
+
+    def image_to_string(self, image, lang='eng'):
+        api = self._api(lang)
+        api.SetImage(_to_pil(image))
+        return api.GetUTF8Text()
+
+    def image_to_words(self, image, lang='eng'):
+        api = self._api(lang)
+        api.SetImage(_to_pil(image))
+        text = api.GetUTF8Text()
+        # Confidences of the recognition GetUTF8Text just ran
+        return text, api.MapWordConfidences()
+
+    def close(self):
+        with self._lock:
+            for api in self._apis:
+                api.End()
+            self._apis.clear()
+
+
+# -------------------- worker process side -------------------- #
+_worker_engine = None
+
+
+def _init_worker():
+    global _worker_engine
+    _worker_engine = TesserocrEngine() if tesserocr is not None else PytesseractEngine()
+
+
+def _worker_image_to_string(array, lang):
+    return _worker_engine.image_to_string(array, lang)
+
+
+def _worker_image_to_words(array, lang):
+    return _worker_engine.image_to_words(array, lang)
+
+
+_WORKER_CALLS = {
+    'image_to_string': _worker_image_to_string,
+    'image_to_words': _worker_image_to_words,
+}
+
+
+class PooledEngine:
+    """Long-lived OCR worker processes with Tesseract loaded once per worker"""
+    name = 'pool'
+
+    def __init__(self, size):
+        self.size = size
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.size, initializer=_init_worker)
+
+    def _replace(self, broken):
+        with self._lock:
+            # Threads that hit the same broken pool replace it only once
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+
+    def _call(self, method, image, lang):
+        # numpy arrays pickle as raw buffers, so no temp files or re-encoding
+        array = np.asarray(image)
+        for attempt in (1, 2):
+            executor = self._executor
+            try:
+                return executor.submit(_WORKER_CALLS[method], array, lang).result()
+            except BrokenProcessPool:
+                logger.error(f"OCR worker pool broke during {method} (attempt {attempt}); starting a new one")
+                self._replace(executor)
+        # The image broke a fresh pool too: a separate tesseract process can't take this one down
+        return getattr(PytesseractEngine(), method)(array, lang)
+
+    def image_to_string(self, image, lang='eng'):
+        return self._call('image_to_string', image, lang)
+
+    def image_to_words(self, image, lang='eng'):
+        return self._call('image_to_words', image, lang)
+
+    def close(self):
+        with self._lock:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def create_engine(name=None):
+    name = name or _setting('OCR_ENGINE', 'auto')
+    if name == 'auto':
+        name = 'pool' if tesserocr is not None else 'pytesseract'
+    if name in ('tesserocr', 'pool') and tesserocr is None:
+        logger.warning("tesserocr is not installed; falling back to pytesseract")
+        name = 'pytesseract'
+
+    if name == 'pool':
+        return PooledEngine(int(_setting('OCR_POOL_SIZE', 2)))
+    if name == 'tesserocr':
+        return TesserocrEngine()
+    return PytesseractEngine()
+
+
+def get_engine():
+    global _engine
+    engine = _engine
+    # A forked child can't use its parent's worker pool
+    if engine is not None and getattr(engine, 'pid', os.getpid()) == os.getpid():
+        return engine
+    with _engine_lock:
+        if _engine is None or getattr(_engine, 'pid', os.getpid()) != os.getpid():
+            _engine = create_engine()
+        return _engine
+
+
+def set_engine(name):
+    """Switch engines (benchmarks); closes the current one"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+        _engine = create_engine(name)
+        return _engine
+
+
+@atexit.register
+def _shutdown():
+    if _engine is not None:
+        _engine.close()
@@ -0,0 +1,231 @@
+# main/utils/officer_cache.py
+"""Per-process read-through cache for Officer lookups by army number.
+
+* A Bloom filter of all army numbers answers "definitely not an officer" for
+  tokens such as years ("2015") without touching the database.
+* An LRU of recent lookups (including misses) answers repeat questions.
+* Officer save/delete signals (main/signals.py) keep both up to date. The
+  filter only answers "no" while the shared 'officer' version it was built
+  under is still current: once another worker (or a bulk import) bumps it,
+  filter misses go to the database until a background rebuild catches up.
+  Without the shared cache there is no way to see other workers' writes,
+  so the filter is not used at all (nor with OFFICER_BLOOM_REFRESH = None).
+* Behind the LRU sits the cross-worker shared cache (shared_cache.py), so a
+  lookup one worker did is a hit for the others and survives restarts.
+  Local entries remember the shared 'officer' version they were read under
+  and are dropped when another worker bumps it.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from main.models import Officer
+
+from . import shared_cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def normalize(army_number):
+    # MySQL compares army numbers case-insensitively, so key the cache the same way
+    return army_number.strip().upper()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity, fp_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class OfficerCache:
+    def __init__(self, max_size=1024, ttl=300, bloom_refresh=300, bloom_min_interval=5, fp_rate=0.01):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.bloom_refresh = bloom_refresh
+        self.bloom_min_interval = bloom_min_interval
+        self.fp_rate = fp_rate
+
+        self._entries = OrderedDict()   # army_number -> (officer or _MISSING, stored_at, shared version)
+        self._bloom = None
+        self._bloom_version = None      # shared 'officer' version the filter was built under
+        self._bloom_built_at = 0.0
+        self._bloom_started_at = float('-inf')
+        self._bloom_building = False
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'bloom_rejects': 0}
+
+    # -------------------- lookups -------------------- #
+    def lookup(self, army_number):
+        """Cache-only lookup: (True, officer_or_None) on a hit, (False, None) otherwise"""
+        key = normalize(army_number)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, stored_at, version = entry
+            expired = self.ttl is not None and time.monotonic() - stored_at > self.ttl
+            if expired or version != shared_cache.version('officer'):
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            if value is _MISSING:
+                self.stats['negative_hits'] += 1
+                return True, None
+            self.stats['hits'] += 1
+            return True, value
+
+    def get_officer(self, army_number):
+        """Read-through lookup; returns the Officer or None"""
+        hit, officer = self.lookup(army_number)
+        if hit:
+            return officer
+
+        key = normalize(army_number)
+        if not self.might_exist(key):
+            with self._lock:
+                self.stats['bloom_rejects'] += 1
+            return None
+
+        def load():
+            with self._lock:
+                self.stats['misses'] += 1
+            officer = Officer.objects.filter(army_number=key).first()
+            # The shared cache can't tell a stored None from a miss
+            return officer if officer is not None else 'missing'
+
+        # Another worker may already have looked this officer up
+        officer = shared_cache.get_or_set('officer', key, load)
+        if isinstance(officer, str):
+            officer = None
+        if not shared_cache.replica_may_lag('officer'):
+            self.store(key, officer)
+        return officer
+
+    def might_exist(self, army_number):
+        """False only if a current filter (built under today's shared version) lacks the number"""
+        bloom, current = self._get_bloom()
+        return bloom is None or not current or normalize(army_number) in bloom
+
+    # -------------------- updates -------------------- #
+    def store(self, army_number, officer):
+        key = normalize(army_number)
+        with self._lock:
+            self._entries[key] = (officer if officer is not None else _MISSING, time.monotonic(),
+                                  shared_cache.version('officer'))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, army_number, exists=True):
+        key = normalize(army_number)
+        with self._lock:
+            self._entries.pop(key, None)
+            if exists and self._bloom is not None:
+                self._bloom.add(key)
+
+    def changed(self, army_number, exists=True):
+        """The officer's row was written: drop it here now, and in every worker
+        once the change is committed (and so visible to them)"""
+        self.invalidate(army_number, exists=exists)
+        transaction.on_commit(lambda: shared_cache.bump('officer'))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bloom = None
+            self._bloom_version = None
+            self._bloom_built_at = 0.0
+            self._bloom_started_at = float('-inf')
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._entries), max_size=self.max_size)
+
+    # -------------------- bloom filter -------------------- #
+    def _get_bloom(self):
+        """(filter or None, whether it is current); starts a rebuild when it is missing, stale or old"""
+        if self.bloom_refresh is None:
+            return None, False
+        version = shared_cache.version('officer')
+        if version is None:
+            return None, False
+        now = time.monotonic()
+        with self._lock:
+            bloom = self._bloom
+            current = bloom is not None and self._bloom_version == version
+            due = not current or now - self._bloom_built_at >= self.bloom_refresh
+            start = due and not self._bloom_building and now - self._bloom_started_at >= self.bloom_min_interval
+            if start:
+                self._bloom_building = True
+                self._bloom_started_at = now
+        if start:
+            # A full army-number scan: never in the request, and one at a time per process
+            threading.Thread(target=self._rebuild_in_background, args=(version,),
+                             name='officer-bloom', daemon=True).start()
+        return bloom, current
+
+    def _rebuild_in_background(self, version):
+        try:
+            self.rebuild_bloom(version)
+        finally:
+            # This thread's DB connections go back to the pool
+            connections.close_all()
+
+    def rebuild_bloom(self, version=None):
+        """Build the filter now, tagged with `version` (read before the scan, so a change made
+        during it leaves the filter stale rather than wrong)"""
+        version = shared_cache.version('officer') if version is None else version
+        with self._lock:
+            self._bloom_building = True
+            self._bloom_started_at = time.monotonic()
+        bloom = None
+        try:
+            bloom = self._build_bloom()
+        except Exception:
+            # Never let the filter stop a lookup; misses keep going to the database
+            logger.exception("Could not build officer bloom filter")
+        with self._lock:
+            self._bloom_building = False
+            if bloom is not None:
+                self._bloom, self._bloom_version, self._bloom_built_at = bloom, version, time.monotonic()
+        return bloom
+
+    def _build_bloom(self):
+        army_numbers = Officer.objects.values_list('army_number', flat=True)
+        bloom = BloomFilter(capacity=army_numbers.count() * 2 + 1000, fp_rate=self.fp_rate)
+        for army_number in army_numbers.iterator(chunk_size=5000):
+            bloom.add(normalize(army_number))
+        return bloom
+
+
+officer_cache = OfficerCache(
+    max_size=getattr(settings, 'OFFICER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'OFFICER_CACHE_TTL', 300),
+    bloom_refresh=getattr(settings, 'OFFICER_BLOOM_REFRESH', 300),
+    bloom_min_interval=getattr(settings, 'OFFICER_BLOOM_MIN_INTERVAL', 5),
+)
@@ -0,0 +1,197 @@
+# main/utils/shared_cache.py
+"""Cache shared by every worker on the host (the 'shared' alias in CACHES).
+
+Entries live in namespaces whose current version is part of each key:
+
+    officer:1718000000000:IC-12345
+    data:1718000000000:count:<sha1 of the question>
+
+bump(namespace) is one atomic incr, after which every worker misses all of
+the namespace's old entries at once (they age out by TIMEOUT / MAX_ENTRIES).
+main/signals.py bumps 'officer' when an officer changes and 'data' when any
+officer, education, family or award row does, after the transaction
+commits. Versions start from the clock, so a version key that was culled or
+cleared never brings old entries back.
+
+Workers read a namespace's version at most every SHARED_CACHE_VERSION_CHECK
+seconds. A failing cache never fails a request: it just misses.
+
+Values computed from replica reads (main/backends/router.py) are only
+stored once the namespace has gone REPLICA_STICKY_SECONDS without a bump:
+until then the replica may not have the change yet, and its answer would be
+filed under the new version and served to everyone, the writer included.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from main.backends.router import reads_from_replicas
+
+logger = logging.getLogger(__name__)
+
+_MISS = object()
+_lock = threading.Lock()
+_versions = {}   # namespace -> (version, read_at)
+_stats = {}
+
+
+def get_cache():
+    """The shared cache, or None when it is disabled / not configured"""
+    alias = getattr(settings, 'SHARED_CACHE_ALIAS', 'shared')
+    if not getattr(settings, 'SHARED_CACHE_ENABLED', True) or alias not in getattr(settings, 'CACHES', {}):
+        return None
+    return caches[alias]
+
+
+def digest(text):
+    # Cache keys must stay short and free of spaces; questions are neither
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _count(namespace, outcome):
+    with _lock:
+        counts = _stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'errors': 0})
+        counts[outcome] += 1
+
+
+def _fresh_version():
+    return int(time.time() * 1000)
+
+
+def version(namespace, cache=None):
+    """Current version of a namespace (re-read at most every SHARED_CACHE_VERSION_CHECK seconds)"""
+    cache = cache or get_cache()
+    if cache is None:
+        return None
+    now = time.monotonic()
+    with _lock:
+        cached = _versions.get(namespace)
+    if cached is not None and now - cached[1] < getattr(settings, 'SHARED_CACHE_VERSION_CHECK', 1.0):
+        return cached[0]
+
+    key = f"version:{namespace}"
+    try:
+        current = cache.get(key)
+        if current is None:
+            cache.add(key, _fresh_version(), timeout=None)
+            current = cache.get(key)
+    except Exception as e:
+        logger.error(f"Shared cache version read of {namespace} failed: {str(e)}")
+        return cached[0] if cached is not None else None
+    with _lock:
+        _versions[namespace] = (current, now)
+    return current
+
+
+def bump(namespace):
+    """Invalidate every entry of the namespace, in every worker"""
+    cache = get_cache()
+    if cache is None:
+        return None
+    key = f"version:{namespace}"
+    try:
+        try:
+            current = cache.incr(key)
+        except ValueError:
+            current = _fresh_version()
+            cache.set(key, current, timeout=None)
+    except Exception as e:
+        logger.error(f"Shared cache bump of {namespace} failed: {str(e)}")
+        return None
+    try:
+        cache.set(f"bumped:{namespace}", time.time(), timeout=None)
+    except Exception as e:
+        logger.error(f"Shared cache bump of {namespace} failed: {str(e)}")
+    with _lock:
+        _versions[namespace] = (current, time.monotonic())
+    return current
+
+
+def replica_may_lag(namespace, cache=None):
+    """True if reads here go to a replica and the namespace changed too recently for
+    it to be sure to have the change: don't cache what it returns"""
+    if not reads_from_replicas():
+        return False
+    cache = cache or get_cache()
+    if cache is None:
+        return False
+    try:
+        bumped_at = cache.get(f"bumped:{namespace}")
+    except Exception as e:
+        logger.error(f"Shared cache read failed: {str(e)}")
+        return True
+    return bumped_at is not None and time.time() - bumped_at < getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def get(namespace, key, default=None):
+    cache = get_cache()
+    if cache is None:
+        return default
+    try:
+        value = cache.get(f"{namespace}:{version(namespace, cache)}:{key}", _MISS)
+    except Exception as e:
+        logger.error(f"Shared cache read failed: {str(e)}")
+        _count(namespace, 'errors')
+        return default
+    if value is _MISS:
+        _count(namespace, 'misses')
+        return default
+    _count(namespace, 'hits')
+    return value
+
+
+def set(namespace, key, value, timeout=DEFAULT_TIMEOUT):
+    cache = get_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(f"{namespace}:{version(namespace, cache)}:{key}", value, timeout=timeout)
+    except Exception as e:
+        logger.error(f"Shared cache write failed: {str(e)}")
+        _count(namespace, 'errors')
+
+
+def get_or_set(namespace, key, compute, timeout=DEFAULT_TIMEOUT):
+    """Cached value, or compute() stored under the version read *before* computing it
+    (so a result computed from data that changed meanwhile is never filed as current)"""
+    cache = get_cache()
+    if cache is None:
+        return compute()
+    try:
+        full_key = f"{namespace}:{version(namespace, cache)}:{key}"
+        value = cache.get(full_key, _MISS)
+    except Exception as e:
+        logger.error(f"Shared cache read failed: {str(e)}")
+        _count(namespace, 'errors')
+        return compute()
+    if value is not _MISS:
+        _count(namespace, 'hits')
+        return value
+
+    _count(namespace, 'misses')
+    value = compute()
+    if replica_may_lag(namespace, cache):
+        return value
+    try:
+        cache.set(full_key, value, timeout=timeout)
+    except Exception as e:
+        logger.error(f"Shared cache write failed: {str(e)}")
+        _count(namespace, 'errors')
+    return value
+
+
+def stats():
+    """Hit/miss counters of this process per namespace"""
+    with _lock:
+        return {namespace: dict(counts) for namespace, counts in _stats.items()}
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+        _versions.clear()
@@ -0,0 +1,145 @@
+# main/utils/thumbnails.py
+"""Resized derivatives of officer photos.
+
+Uploads stay untouched in photos/; for each one we write smaller JPEG
+variants (PHOTO_VARIANTS) under PHOTO_DERIVATIVES_DIR, named after the
+SHA-1 of the original's bytes:
+
+    photos/derived/3f/3f2a...c9_chat.jpg
+
+Identical uploads share files, a replaced photo gets new names (so the
+files can be cached forever), and existing files are never re-rendered.
+The hash is stored on Officer.photo_hash. Generation runs on a background
+thread after the upload is committed; until it finishes, photo_url()
+falls back to the original.
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# name: (max width, max height, JPEG quality)
+DEFAULT_VARIANTS = {
+    'thumb': (96, 96, 75),
+    'chat': (240, 240, 80),
+    'profile': (640, 640, 82),
+}
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()   # army numbers queued or being generated
+
+
+def variants():
+    return getattr(settings, 'PHOTO_VARIANTS', DEFAULT_VARIANTS)
+
+
+def derivatives_dir():
+    return getattr(settings, 'PHOTO_DERIVATIVES_DIR', 'photos/derived')
+
+
+def derivative_name(photo_hash, variant):
+    return f"{derivatives_dir()}/{photo_hash[:2]}/{photo_hash}_{variant}.jpg"
+
+
+def hash_file(field_file):
+    digest = hashlib.sha1()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def render_variant(data, size, quality):
+    """JPEG bytes of the image scaled to fit `size` (never enlarged)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        # draft() lets the JPEG decoder skip most of the pixels of large photos
+        image.draft('RGB', size)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.thumbnail(size, Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+def generate_derivatives(officer, force=False):
+    """Write any missing variants for the officer's photo; returns the photo hash (or None)"""
+    if not officer.photo:
+        return None
+
+    photo_hash = hash_file(officer.photo)
+    pending = {name: spec for name, spec in variants().items()
+               if force or not default_storage.exists(derivative_name(photo_hash, name))}
+    if pending:
+        officer.photo.open('rb')
+        try:
+            data = officer.photo.read()
+        finally:
+            officer.photo.close()
+        for name, (width, height, quality) in pending.items():
+            path = derivative_name(photo_hash, name)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(render_variant(data, (width, height), quality)))
+
+    if officer.photo_hash != photo_hash:
+        # update() rather than save(): no post_save, so no second round of thumbnailing
+        type(officer).objects.filter(pk=officer.pk).update(photo_hash=photo_hash)
+        officer.photo_hash = photo_hash
+        # Same invalidation as a save: this worker and (via the shared version) all others
+        from .officer_cache import officer_cache
+        officer_cache.changed(officer.pk)
+    return photo_hash
+
+
+def _generate_for(army_number):
+    from main.models import Officer
+
+    try:
+        officer = Officer.objects.filter(pk=army_number).first()
+        if officer is not None:
+            generate_derivatives(officer)
+    except Exception:
+        logger.exception(f"Could not generate photo derivatives for {army_number}")
+    finally:
+        with _lock:
+            _pending.discard(army_number)
+        close_old_connections()
+
+
+def schedule_derivatives(army_number):
+    """Generate derivatives on the background worker (once, however often it is asked)"""
+    global _executor
+    with _lock:
+        if army_number in _pending:
+            return False
+        _pending.add(army_number)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PHOTO_WORKERS', 1),
+                                           thread_name_prefix='photo-worker')
+    _executor.submit(_generate_for, army_number)
+    return True
+
+
+def photo_url(officer, variant='chat'):
+    """URL of the officer's photo at the given size; the original until the variant exists"""
+    if not officer.photo:
+        return None
+    if officer.photo_hash and variant in variants():
+        return default_storage.url(derivative_name(officer.photo_hash, variant))
+    return officer.photo.url
@@ -0,0 +1,230 @@
+# main/utils/tracing.py
+"""Lightweight tracing for the chat pipeline.
+
+    with span("search.whoosh"):
+        ...
+
+Every span feeds a per-process latency histogram (served by the chat
+metrics endpoint). Inside trace_request() the spans of one request, with
+the DB queries run under each of them, are also collected into a Trace
+that chatbot_view can log or return in debug mode.
+
+With CHAT_TRACING = False, span() hands back a shared no-op object, so
+instrumented code pays one settings lookup per span.
+"""
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is +Inf
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current_trace = contextvars.ContextVar('chat_trace', default=None)
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def tracing_enabled():
+    return getattr(settings, 'CHAT_TRACING', True)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+            self.count += 1
+            self.sum_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + (self.max_ms,), self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self):
+        with self._lock:
+            buckets = {f"le_{b}": n for b, n in zip(BUCKETS_MS, self.counts)}
+            buckets["le_inf"] = self.counts[-1]
+            return {
+                'count': self.count,
+                'sum_ms': round(self.sum_ms, 3),
+                'avg_ms': round(self.sum_ms / self.count, 3) if self.count else 0.0,
+                'max_ms': round(self.max_ms, 3),
+                'p50_ms': self.quantile(0.50),
+                'p95_ms': self.quantile(0.95),
+                'p99_ms': self.quantile(0.99),
+                'buckets': buckets,
+            }
+
+
+def observe(name, ms):
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    histogram.observe(ms)
+
+
+def metrics_snapshot():
+    return {name: h.snapshot() for name, h in sorted(_histograms.items())}
+
+
+def reset_metrics():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class Trace:
+    """Spans and DB queries recorded for one chat request"""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.spans = []
+        self.stack = []
+        self.db_queries = 0
+        self.db_ms = 0.0
+
+    def as_dict(self):
+        return {
+            'label': self.label,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_ms, 3),
+            'spans': self.spans,
+        }
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'trace', 'start', 'record')
+
+    def __init__(self, name):
+        self.name = name
+        self.trace = _current_trace.get()
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.trace is not None:
+            self.record = {
+                'name': self.name,
+                'depth': len(self.trace.stack),
+                'start_ms': round((self.start - self.trace.started) * 1000, 3),
+                'db_queries': 0,
+                'db_ms': 0.0,
+            }
+            self.trace.spans.append(self.record)
+            self.trace.stack.append(self.record)
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        ms = (time.perf_counter() - self.start) * 1000
+        observe(self.name, ms)
+        if self.trace is not None:
+            self.trace.stack.pop()
+            self.record['ms'] = round(ms, 3)
+            self.record['db_ms'] = round(self.record['db_ms'], 3)
+            if exc_type is not None:
+                self.record['error'] = exc_type.__name__
+        return False
+
+
+def span(name):
+    if not tracing_enabled():
+        return _NOOP
+    return _Span(name)
+
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        observe('db.query', ms)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.db_queries += 1
+            trace.db_ms += ms
+            if trace.stack:
+                trace.stack[-1]['db_queries'] += 1
+                trace.stack[-1]['db_ms'] += ms
+
+
+@contextmanager
+def db_tracing():
+    """Count DB queries of this thread's connections (every alias, replicas included)
+    into the current trace's spans"""
+    if not tracing_enabled():
+        yield
+        return
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(_db_wrapper))
+        yield
+
+
+@contextmanager
+def trace_request(label='chat', db=True):
+    """Collect a Trace for the enclosed request; yields None when tracing is off.
+
+    Pass db=False from async code, where queries run on other threads'
+    connections (wrap those with db_tracing() instead).
+    """
+    if not tracing_enabled():
+        yield None
+        return
+
+    trace = Trace(label)
+    token = _current_trace.set(trace)
+    try:
+        if db:
+            with db_tracing(), span(f'request.{label}'):
+                yield trace
+        else:
+            with span(f'request.{label}'):
+                yield trace
+    finally:
+        _current_trace.reset(token)
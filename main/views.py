@@ -1,22 +1,42 @@
 # views.py
-from tkinter import Image
 from django.shortcuts import render, redirect
-import pytesseract
 from .models import Officer, Education, Family, Award
 from .forms import OfficerForm, EducationForm, FamilyForm, AwardForm
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse  
-import haystack              
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from haystack.query import SearchQuerySet 
 from django.conf import settings
-from .ocr_utils import extract_fields, preprocess_image
+from django.core.handlers.asgi import ASGIRequest
 import logging
 import os
 import uuid
 from django.views.decorators.csrf import csrf_exempt
 import re
 from .chat_utils import extract_location, process_query_v2
-from thefuzz import fuzz, process
+from .chat_context import ConversationContext
+from .chat_async import process_query_async, stream_in_pool
+from .chat_stream import stream_events
+from .chat_batch import process_batch
+from .dedup import likely_duplicates
+from . import change_log
+from .bulk_records import CONFLICT_MODES, FORMATS, MODEL_ORDER, detect_format, export_lines, import_records, read_rows
+import json
+from .admission import admission_stats, admit, classify_chat_request
+from .backends.pool import pool_stats
+from .backends.router import replica_reads, routing_stats
+from .utils import shared_cache
+from .backends.whoosh import search_stats
+from .utils.downloads import serve_file
+from .utils.officer_cache import officer_cache
+from .utils.thumbnails import photo_url, schedule_derivatives, variants
+from .utils.tracing import metrics_snapshot, trace_request
+from .utils.lazy import lazy_import
+
+# OCR pulls in OpenCV, NumPy and Tesseract; load them on the first upload only
+Image = lazy_import('PIL.Image')
+ocr_utils = lazy_import('main.ocr_utils')
+ocr_document = lazy_import('main.ocr_document')
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -30,15 +50,25 @@ def home(request):
     return render(request, 'main/home.html', context)
 
 def create_officer(request):
+    duplicates = []
     if request.method == 'POST':
         form = OfficerForm(request.POST, request.FILES)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Registered successfully!')
-            return redirect('success')
+            # OCR misreads make new army numbers for known officers; ask before saving those
+            if not request.POST.get('confirm_duplicate'):
+                duplicates = likely_duplicates(form.cleaned_data)
+            if not duplicates:
+                form.save()
+                messages.success(request, 'Registered successfully!')
+                return redirect('success')
     else:
         form = OfficerForm()
-    return render(request, 'main/officer_form.html', {'form': form})
+    # A file input can't be refilled, so the re-rendered form says the photo must be chosen again
+    return render(request, 'main/officer_form.html', {
+        'form': form,
+        'duplicates': duplicates,
+        'photo_dropped': bool(duplicates and request.FILES.get('photo')),
+    })
 
 def add_education(request, army_number):
     try:
@@ -112,6 +142,7 @@ def add_award(request, army_number):
 def success(request):
     return render(request, 'main/success.html')
 
+@replica_reads
 def chat_api(request):
     query = request.GET.get('q', '').strip()
     
@@ -142,22 +173,39 @@ def chat_api(request):
     return JsonResponse({'response': response_text})
 
 def officer_registration(request):
+    duplicates = []
     if request.method == 'POST':
         form = OfficerForm(request.POST, request.FILES)
         if form.is_valid():
-            officer = form.save()
-            return redirect('success')
+            if not request.POST.get('confirm_duplicate'):
+                duplicates = likely_duplicates(form.cleaned_data)
+            if not duplicates:
+                officer = form.save()
+                return redirect('success')
         else:
             logger.error(f"Form errors: {form.errors}")
     else:
         form = OfficerForm()
-    return render(request, 'main/officer_form.html', {'form': form})
+    # A file input can't be refilled, so the re-rendered form says the photo must be chosen again
+    return render(request, 'main/officer_form.html', {
+        'form': form,
+        'duplicates': duplicates,
+        'photo_dropped': bool(duplicates and request.FILES.get('photo')),
+    })
 
+@admit('ocr')
 def extract_officer_data(request):
     if request.method == 'POST' and request.FILES.get('photo'):
         try:
-            file = request.FILES['photo']
-            extracted_data = extract_fields(file)
+            content = request.FILES['photo'].read()
+            
+            # Multi-page PDF/TIFF (or ?stream=1): per-page OCR, merged by confidence
+            if wants_stream(request):
+                return ndjson_response(ocr_document.stream_document(content), request)
+            if ocr_document.document_kind(content) != 'image':
+                extracted_data = ocr_document.extract_document(content)
+            else:
+                extracted_data = ocr_utils.extract_fields(content)
             
             # Handle case where extraction fails completely
             if extracted_data is None:
@@ -172,6 +220,11 @@ def extract_officer_data(request):
                     'success': False,
                     'error': extracted_data['error']
                 })
+
+            extracted_data['possible_duplicates'] = [
+                {'army_number': officer.army_number, 'full_name': officer.full_name, 'score': round(score, 3)}
+                for officer, score in likely_duplicates(extracted_data)
+            ]
                 
             return JsonResponse({
                 'success': True,
@@ -189,6 +242,7 @@ def extract_officer_data(request):
         'error': 'No file provided'
     })
 
+@admit('ocr')
 def test_ocr(request):
     if request.method == 'POST' and request.FILES.get('test_image'):
         try:
@@ -199,14 +253,14 @@ def test_ocr(request):
             image.save(original_path)
             
             # Process image
-            processed = preprocess_image(image)
+            processed = ocr_utils.preprocess_image(image)
             
             # Save processed image
             processed_path = os.path.join(settings.MEDIA_ROOT, 'test_processed.png')
             Image.fromarray(processed).save(processed_path)
             
             # Perform OCR
-            text = pytesseract.image_to_string(processed, lang='eng')
+            text = ocr_utils.ocr_text(processed)
             
             return render(request, 'test_ocr.html', {
                 'original': os.path.join(settings.MEDIA_URL, 'test_original.png'),
@@ -217,32 +271,211 @@ def test_ocr(request):
             return HttpResponse(f"Error: {str(e)}")
     return render(request, 'test_ocr.html')
 
+def chat_payload(response, trace):
+    payload = {"response": response}
+    if trace is not None and getattr(settings, 'CHAT_TRACE_RESPONSES', False):
+        payload["trace"] = trace.as_dict()
+        logger.debug("Chat trace: %s", payload["trace"])
+    return payload
+
+def wants_stream(request):
+    return request.POST.get("stream") == "1" or "application/x-ndjson" in request.headers.get("Accept", "")
+
+def ndjson_response(events, request=None):
+    if isinstance(request, ASGIRequest):
+        # ASGI reads a sync body to the end before sending it: stream it from the pool instead
+        events = stream_in_pool(events)
+    response = StreamingHttpResponse(events, content_type="application/x-ndjson")
+    # Don't let the front-end proxy buffer the stream
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+def traced_stream(events, label):
+    """A streamed body is generated after the view returned: trace it while it runs"""
+    with trace_request(label) as trace:
+        yield from events
+    if trace is not None and getattr(settings, 'CHAT_TRACE_RESPONSES', False):
+        yield json.dumps({"event": "trace", "trace": trace.as_dict()}) + "\n"
+
+def chat_stream_response(request, user_input, context=None, label="chat_stream"):
+    return ndjson_response(traced_stream(stream_events(user_input, context), label), request)
+
 @csrf_exempt
+@admit(classify_chat_request)
+@replica_reads
 def chatbot_view(request):
     if request.method == "POST":
         user_input = request.POST.get("message", "").strip()
         if not user_input:
             return JsonResponse({"response": "Please enter a valid query."})
         
-        try:
-            response = process_query_v2(user_input)
-        except Exception as e:
-            logger.error(f"Query processing error: {str(e)}")
-            response = "Error processing your request. Please try again."
+        context = ConversationContext(request.session)
+        if wants_stream(request):
+            # The body (and the context update) comes after the session middleware ran
+            context.reserve()
+            return chat_stream_response(request, user_input, context)
+        
+        with trace_request("chat") as trace:
+            try:
+                response = process_query_v2(user_input, context=context)
+                context.save()
+            except Exception as e:
+                logger.error(f"Query processing error: {str(e)}")
+                response = "Error processing your request. Please try again."
+        
+        return JsonResponse(chat_payload(response, trace))
+    
+    return JsonResponse({"response": "Please enter a valid query."})
+
+@admit(classify_chat_request)
+@replica_reads
+async def chatbot_async_view(request):
+    """Same contract as chatbot_view, served natively under ASGI"""
+    if request.method == "POST":
+        user_input = request.POST.get("message", "").strip()
+        if not user_input:
+            return JsonResponse({"response": "Please enter a valid query."})
         
-        return JsonResponse({"response": response})
+        # Reading the session hits the session store, which is sync only
+        context = await sync_to_async(ConversationContext)(request.session)
+        if wants_stream(request):
+            context.reserve()
+            return chat_stream_response(request, user_input, context, label="chat_async_stream")
+        
+        with trace_request("chat_async", db=False) as trace:
+            try:
+                response = await process_query_async(user_input, context=context)
+                context.save()
+            except Exception as e:
+                logger.error(f"Query processing error: {str(e)}")
+                response = "Error processing your request. Please try again."
+        
+        return JsonResponse(chat_payload(response, trace))
     
     return JsonResponse({"response": "Please enter a valid query."})
 
+# Not @csrf_exempt: on Django 4.2 it returns a sync wrapper, which would hide the coroutine
+chatbot_async_view.csrf_exempt = True
+
+@csrf_exempt
+@admit('heavy_chat')
+@replica_reads
+def chatbot_batch_view(request):
+    """POST {"queries": ["...", ...]} -> {"responses": [{"query", "response"}, ...]}"""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST a JSON body with a 'queries' list."}, status=405)
+    
+    try:
+        queries = json.loads(request.body or b"{}").get("queries")
+    except (ValueError, AttributeError):
+        queries = None
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return JsonResponse({"error": "'queries' must be a list of strings."}, status=400)
+    
+    max_queries = getattr(settings, 'CHAT_BATCH_MAX_QUERIES', 100)
+    if len(queries) > max_queries:
+        return JsonResponse({"error": f"At most {max_queries} queries per batch."}, status=400)
+    
+    queries = [q.strip() for q in queries]
+    answers = process_batch([q for q in queries if q])
+    answers.reverse()
+    responses = [
+        {"query": q, "response": answers.pop() if q else "Please enter a valid query."}
+        for q in queries
+    ]
+    return JsonResponse({"responses": responses})
+
+@admit('export')
+def import_records_view(request):
+    """POST a CSV/JSON Lines "file" (+ model, format, on_conflict, dry_run) -> import report"""
+    if request.method != "POST" or not request.FILES.get('file'):
+        return JsonResponse({"error": "POST a CSV or JSON Lines 'file'."}, status=405 if request.method != "POST" else 400)
+    
+    upload = request.FILES['file']
+    model = request.POST.get('model') or None
+    fmt = request.POST.get('format') or detect_format(upload.name)
+    on_conflict = request.POST.get('on_conflict', 'skip')
+    if model is not None and model not in MODEL_ORDER:
+        return JsonResponse({"error": f"'model' must be one of {', '.join(MODEL_ORDER)}."}, status=400)
+    if fmt not in FORMATS or on_conflict not in CONFLICT_MODES:
+        return JsonResponse({"error": "Unsupported 'format' or 'on_conflict'."}, status=400)
+    
+    try:
+        report = import_records(read_rows(upload, fmt), model=model, on_conflict=on_conflict,
+                                dry_run=request.POST.get('dry_run') == '1')
+    except Exception as e:
+        logger.exception("Bulk import failed")
+        return JsonResponse({"error": str(e)}, status=500)
+    return JsonResponse(report)
+
+@admit('export')
+@replica_reads
+def export_records_view(request, model):
+    if model not in MODEL_ORDER:
+        return JsonResponse({"error": f"Unknown model '{model}'."}, status=404)
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({"error": "'format' must be csv or jsonl."}, status=400)
+    
+    since = request.GET.get('since')
+    if since is not None and not since.isdigit():
+        return JsonResponse({"error": "'since' must be a cursor returned by an earlier export."}, status=400)
+    
+    if since is not None:
+        try:
+            change_log.check_cursor(int(since))
+        except change_log.CursorExpired as e:
+            # 410: this cursor will never work again, the client has to re-sync from a full export
+            return JsonResponse({"error": str(e), "full_export_required": True}, status=410)
+    
+    # Taken before reading any rows: changes made during the export are sent again next time
+    cursor = change_log.current_cursor()
+    if since is None:
+        lines, filename = export_lines(model, fmt), f"{model}s.{fmt}"
+    else:
+        lines, filename = change_log.delta_lines(model, int(since), cursor, fmt), f"{model}s_{since}_{cursor}.{fmt}"
+    content_type = "text/csv" if fmt == 'csv' else "application/x-ndjson"
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["X-Next-Cursor"] = str(cursor)
+    return response
+
+def officer_photo(request, army_number, variant='profile'):
+    """Redirect to the officer's photo at the size for this context (thumb, chat, profile)"""
+    officer = officer_cache.get_officer(army_number)
+    if officer is None or not officer.photo or variant not in variants():
+        return HttpResponse(status=404)
+    if not officer.photo_hash:
+        # Not generated yet (e.g. uploaded before thumbnails existed): queue it, serve the original
+        schedule_derivatives(officer.army_number)
+    response = redirect(photo_url(officer, variant))
+    # The target name changes with the photo, the redirect only briefly
+    response["Cache-Control"] = "private, max-age=300"
+    return response
 
+def db_pool_metrics(request):
+    return JsonResponse({"pools": pool_stats(), "routing": routing_stats()})
 
-from django.http import FileResponse, Http404
+def chat_metrics(request):
+    return JsonResponse({
+        "spans": metrics_snapshot(),
+        "officer_cache": officer_cache.snapshot(),
+        "db_pools": pool_stats(),
+        "search": search_stats(),
+        "shared_cache": shared_cache.stats(),
+        "admission": admission_stats(),
+    })
+
+
+
+from django.http import Http404
 import os
 from django.conf import settings
 
 def download_export(request, filename):
     file_path = os.path.join(settings.MEDIA_ROOT, "exports", filename)
-    if not os.path.exists(file_path):
+    if not os.path.isfile(file_path):
         raise Http404("File not found")
 
     ext = os.path.splitext(filename)[1]
@@ -252,6 +485,5 @@ def download_export(request, filename):
         ".csv": "text/csv",
     }.get(ext, "application/octet-stream")
 
-    response = FileResponse(open(file_path, "rb"), content_type=content_type)
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
\ No newline at end of file
+    # ETag/304, Range, gzip for CSV and X-Sendfile/X-Accel-Redirect offload
+    return serve_file(request, file_path, filename, content_type)